@@ -9,11 +9,13 @@ of educational and reference materials in agriculture.
 """
 
 from generate_image import SDTurboGenerator
+from result_cache import ResultCache
+from dataset_runner import run_dataset
+from worker_pool import create_generator
 from pathlib import Path
-import time
 
 
-def generate_agriculture_dataset():
+def generate_agriculture_dataset(workers: int = 1):
     """
     Generate a dataset of crop images for agricultural education.
     
@@ -21,6 +23,9 @@ def generate_agriculture_dataset():
     - Fast generation allows real-time visual aids during training
     - No internet required - works in remote farming areas
     - Free and open-source - accessible to all farmers
+    
+    Args:
+        workers: Inference processes to spread batches over (>1 on many-core CPUs)
     """
     
     print("=" * 70)
@@ -28,8 +33,8 @@ def generate_agriculture_dataset():
     print("=" * 70)
     print("\nInitializing SD-Turbo generator...")
     
-    # Initialize generator
-    generator = SDTurboGenerator()
+    # Initialize generator (seeded images are reused from the result cache)
+    generator = create_generator(workers, result_cache=ResultCache())
     
     # Create output directory
     output_dir = Path("agriculture_outputs")
@@ -50,26 +55,18 @@ def generate_agriculture_dataset():
     print(f"\n📊 Generating {len(agriculture_prompts)} reference images...")
     print("Use: Educational material for farmer training programs\n")
     
-    start_time = time.time()
-    
-    for i, (category, prompt) in enumerate(agriculture_prompts.items(), 1):
-        print(f"[{i}/{len(agriculture_prompts)}] Category: {category}")
-        print(f"    Prompt: {prompt}")
-        
-        # Generate image with 2 steps for better quality (still very fast)
-        image = generator.generate(
-            prompt=prompt,
-            num_inference_steps=2,  # 2 steps for better quality
-            seed=100 + i,
-        )
-        
-        # Save with descriptive filename
-        output_path = output_dir / f"{category}.png"
-        image.save(output_path)
-        print(f"    ✓ Saved: {output_path}\n")
+    # Generate in memory-budgeted batches with 2 steps for better quality
+    # (still very fast), saving each image under its category name
+    summary = run_dataset(
+        generator,
+        agriculture_prompts,
+        output_dir,
+        seeds={category: 100 + i for i, category in enumerate(agriculture_prompts, 1)},
+        num_inference_steps=2,  # 2 steps for better quality
+    )
     
-    total_time = time.time() - start_time
-    avg_time = total_time / len(agriculture_prompts)
+    total_time = summary['total_time']
+    avg_time = summary['avg_time']
     
     print("=" * 70)
     print("✓ DATASET GENERATION COMPLETE")
@@ -12,11 +12,14 @@ allowing artists to rapidly prototype ideas and generate reference materials.
 """
 
 from generate_image import SDTurboGenerator
+from result_cache import ResultCache
+from dataset_runner import run_dataset
+from grid import run_grid
+from worker_pool import create_generator
 from pathlib import Path
-import time
 
 
-def generate_anime_assets():
+def generate_anime_assets(workers: int = 1):
     """
     Generate a diverse set of anime-style visual assets.
     
@@ -25,6 +28,9 @@ def generate_anime_assets():
     - No internet required - works in offline studios
     - Free - eliminates concept art licensing costs
     - Consistent style - helps maintain visual coherence
+    
+    Args:
+        workers: Inference processes to spread batches over (>1 on many-core CPUs)
     """
     
     print("=" * 70)
@@ -32,8 +38,8 @@ def generate_anime_assets():
     print("=" * 70)
     print("\nInitializing SD-Turbo generator...")
     
-    # Initialize generator
-    generator = SDTurboGenerator()
+    # Initialize generator (seeded assets are reused from the result cache)
+    generator = create_generator(workers, result_cache=ResultCache())
     
     # Create output directory
     output_dir = Path("anime_outputs")
@@ -67,26 +73,18 @@ def generate_anime_assets():
     print(f"\n🎬 Generating {len(anime_prompts)} anime-style assets...")
     print("Use: Concept art, character design, game development, animation reference\n")
     
-    start_time = time.time()
-    
-    for i, (category, prompt) in enumerate(anime_prompts.items(), 1):
-        print(f"[{i}/{len(anime_prompts)}] Category: {category}")
-        print(f"    Prompt: {prompt}")
-        
-        # Generate image with 2 steps for better quality
-        image = generator.generate(
-            prompt=prompt,
-            num_inference_steps=2,  # Balance speed and quality
-            seed=200 + i,
-        )
-        
-        # Save with descriptive filename
-        output_path = output_dir / f"{category}.png"
-        image.save(output_path)
-        print(f"    ✓ Saved: {output_path}\n")
+    # Generate in memory-budgeted batches with 2 steps for better quality,
+    # saving each asset under its category name
+    summary = run_dataset(
+        generator,
+        anime_prompts,
+        output_dir,
+        seeds={category: 200 + i for i, category in enumerate(anime_prompts, 1)},
+        num_inference_steps=2,  # Balance speed and quality
+    )
     
-    total_time = time.time() - start_time
-    avg_time = total_time / len(anime_prompts)
+    total_time = summary['total_time']
+    avg_time = summary['avg_time']
     
     print("=" * 70)
     print("✓ ASSET GENERATION COMPLETE")
@@ -105,7 +103,18 @@ def generate_anime_assets():
     print("=" * 70)
 
 
-def character_variations():
+# Base character concept and its style variations
+CHARACTER_CONCEPT = "anime warrior character"
+CHARACTER_STYLES = {
+    "classic": f"{CHARACTER_CONCEPT}, traditional anime style, clean lines",
+    "cyberpunk": f"{CHARACTER_CONCEPT}, cyberpunk aesthetic, neon accents, futuristic",
+    "fantasy": f"{CHARACTER_CONCEPT}, fantasy RPG style, magical armor, ethereal",
+    "dark": f"{CHARACTER_CONCEPT}, dark fantasy, gothic aesthetic, dramatic shadows",
+    "cute": f"{CHARACTER_CONCEPT}, chibi cute style, soft colors, friendly",
+}
+
+
+def character_variations(workers: int = 1):
     """
     Generate variations of a single character concept.
     Useful for exploring different designs quickly.
@@ -114,30 +123,21 @@ def character_variations():
     print("🎭 CHARACTER VARIATION GENERATOR")
     print("=" * 70)
     
-    generator = SDTurboGenerator()
+    generator = create_generator(workers, result_cache=ResultCache())
     output_dir = Path("anime_outputs/character_variations")
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Base character concept
-    base_concept = "anime warrior character"
+    print(f"\n🎨 Generating {len(CHARACTER_STYLES)} variations of: '{CHARACTER_CONCEPT}'\n")
     
-    # Different style variations
-    variations = {
-        "classic": f"{base_concept}, traditional anime style, clean lines",
-        "cyberpunk": f"{base_concept}, cyberpunk aesthetic, neon accents, futuristic",
-        "fantasy": f"{base_concept}, fantasy RPG style, magical armor, ethereal",
-        "dark": f"{base_concept}, dark fantasy, gothic aesthetic, dramatic shadows",
-        "cute": f"{base_concept}, chibi cute style, soft colors, friendly",
-    }
-    
-    print(f"\n🎨 Generating {len(variations)} variations of: '{base_concept}'\n")
-    
-    for style, prompt in variations.items():
-        print(f"Style: {style}")
-        image = generator.generate(prompt, num_inference_steps=2, seed=300)
-        output_path = output_dir / f"warrior_{style}.png"
-        image.save(output_path)
-        print(f"✓ Saved: {output_path}\n")
+    # Same seed for every style so only the prompt changes
+    run_dataset(
+        generator,
+        CHARACTER_STYLES,
+        output_dir,
+        seeds={style: 300 for style in CHARACTER_STYLES},
+        num_inference_steps=2,
+        filename="warrior_{name}.png",
+    )
     
     print("=" * 70)
     print("✓ VARIATIONS COMPLETE")
@@ -145,6 +145,41 @@ def character_variations():
     print("=" * 70)
 
 
+def character_grid(seeds: tuple[int, ...] = (300, 301, 302, 303), workers: int = 1):
+    """
+    Explore the character styles across several seeds.
+    Each column of the contact sheet shares a seed, so it shows only the
+    style change.
+    
+    Args:
+        seeds: Column seeds
+        workers: Inference processes to spread batches over (>1 on many-core CPUs)
+    """
+    print("\n" + "=" * 70)
+    print("🎭 CHARACTER STYLE x SEED GRID")
+    print("=" * 70)
+    
+    generator = create_generator(workers, result_cache=ResultCache())
+    output_dir = Path("anime_outputs/character_grid")
+    
+    print(f"\n🎨 Exploring '{CHARACTER_CONCEPT}': {len(CHARACTER_STYLES)} styles x {len(seeds)} seeds\n")
+    
+    # One batch for the whole style x seed grid, plus a contact sheet
+    run_grid(
+        generator,
+        CHARACTER_STYLES,
+        seeds,
+        output_dir,
+        num_inference_steps=2,
+        filename="warrior_{name}_seed{seed}.png",
+    )
+    
+    print("=" * 70)
+    print("✓ GRID COMPLETE")
+    print(f"📁 Check: {output_dir}/ (contact_sheet.png compares all of them)")
+    print("=" * 70)
+
+
 def interactive_anime_mode():
     """
     Interactive mode for anime creators to generate custom concepts.
@@ -195,7 +230,7 @@ def interactive_anime_mode():
         counter += 1
 
 
-def batch_thumbnail_generation():
+def batch_thumbnail_generation(workers: int = 1):
     """
     Generate anime-style thumbnails for content creators.
     Perfect for YouTube, Twitch, social media.
@@ -204,7 +239,7 @@ def batch_thumbnail_generation():
     print("🖼️ ANIME THUMBNAIL GENERATOR")
     print("=" * 70)
     
-    generator = SDTurboGenerator()
+    generator = create_generator(workers)
     output_dir = Path("anime_outputs/thumbnails")
     output_dir.mkdir(parents=True, exist_ok=True)
     
@@ -218,12 +253,13 @@ def batch_thumbnail_generation():
     
     print("\n🎬 Generating content creator thumbnails...\n")
     
-    for content_type, prompt in thumbnails.items():
-        print(f"Type: {content_type}")
-        image = generator.generate(prompt, num_inference_steps=2)
-        output_path = output_dir / f"thumbnail_{content_type}.png"
-        image.save(output_path)
-        print(f"✓ Saved: {output_path}\n")
+    run_dataset(
+        generator,
+        thumbnails,
+        output_dir,
+        num_inference_steps=2,
+        filename="thumbnail_{name}.png",
+    )
     
     print("=" * 70)
     print("✓ THUMBNAILS READY")
@@ -237,5 +273,6 @@ if __name__ == "__main__":
     
     # Optional: Uncomment to explore additional features
     # character_variations()
+    # character_grid()
     # batch_thumbnail_generation()
     # interactive_anime_mode()
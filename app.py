@@ -8,23 +8,178 @@ Features:
 - Image gallery display
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from generate_image import SDTurboGenerator
+from flask import (
+    Flask, Response, g, render_template, request, jsonify, send_file, send_from_directory,
+    stream_with_context,
+)
+from worker_pool import create_generator
+from model_loader import ModelLoader
+from model_registry import ModelRegistry
+from batching import PRIORITIES, MicroBatcher, QueueFull, QueueTimeout
+from result_cache import ResultCache
+from jobs import JobManager, TERMINAL_STATES
+from image_codec import IMAGE_FORMATS, DEFAULT_QUALITY, encode_image, extension_for
+from output_store import OutputStore
+from metrics import REGISTRY, CallbackMetric, Counter, Gauge, Histogram, span
+from memory import InsufficientMemory, MemoryAdmission, MemoryBusy, MemoryEstimator
+from prompt_classifier import PromptClassifier
 from pathlib import Path
+from PIL import Image, UnidentifiedImageError
+from werkzeug.utils import safe_join
 import base64
-from io import BytesIO
-import re
+import binascii
+import io
+import json
+import math
+import random
+import time
 
 app = Flask(__name__)
 
-# Initialize generator (loads model once)
-print("Loading SD-Turbo model...")
-generator = SDTurboGenerator()
-print("Model ready!\n")
+# Persistent cache of seeded results, shared by every server process
+RESULT_CACHE_DIR = Path("result_cache")
+RESULT_CACHE_BYTES = 2 * 1024 ** 3
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_BYTES)
 
-# Output directory
-OUTPUT_DIR = Path("web_outputs")
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Inference processes: 1 = in-process generator, >1 = WorkerPool with
+# one pipeline per process, each pinned to its own set of CPU cores
+INFERENCE_WORKERS = 1
+
+# Model weights: a Hub id, or a local directory written by
+# `python model_loader.py export <dir>` (loaded with no Hub lookups)
+MODEL_ID = "stabilityai/sd-turbo"
+
+# Extra checkpoints selectable with the `model` field of /generate and /jobs
+# (name -> Hub id or local directory); requests without it use MODEL_ID.
+# Extra models load on first use and share identical components (text
+# encoder, VAE) with loaded ones; beyond these limits the least recently
+# used extra model is evicted.
+MODELS = {}
+MODEL_MEMORY_BYTES = None
+MAX_LOADED_MODELS = 2
+
+# CPU performance profile: "baseline", "fast-cpu" or "max-cpu" (see cpu_profiles.py)
+PERF_PROFILE = "baseline"
+
+# One throwaway generation at the default request settings before the
+# server reports ready (None disables it)
+WARMUP = {'num_inference_steps': 2, 'width': 512, 'height': 512}
+
+# Memory admission: activations may use this share of the memory available
+# at dispatch time (optionally capped at MEMORY_LIMIT_BYTES). Requests that
+# could never fit get 413; batches wait up to MEMORY_WAIT seconds for memory
+# held by running batches, then fail with 503.
+MEMORY_BUDGET_FRACTION = 0.8
+MEMORY_LIMIT_BYTES = None
+MEMORY_WAIT = 30.0
+
+# Peak memory model, calibrated by the in-process generator's pipeline calls
+# (WorkerPool workers calibrate their own copies; this one keeps the
+# conservative defaults)
+memory_estimator = MemoryEstimator()
+admission = MemoryAdmission(
+    memory_estimator,
+    budget_fraction=MEMORY_BUDGET_FRACTION,
+    max_bytes=MEMORY_LIMIT_BYTES,
+    timeout=MEMORY_WAIT,
+)
+
+# The generator loads lazily on a background thread: importing this module
+# costs nothing, and the loader stands in for the generator (attribute
+# access blocks until it is ready). Check GET /ready for progress.
+generator = ModelLoader(
+    lambda: ModelRegistry(
+        lambda model_id: create_generator(
+            INFERENCE_WORKERS,
+            model_id=model_id,
+            perf_profile=PERF_PROFILE,
+            result_cache=result_cache,
+            memory_estimator=memory_estimator,
+        ),
+        default_model=MODEL_ID,
+        max_bytes=MODEL_MEMORY_BYTES,
+        max_models=MAX_LOADED_MODELS,
+    ),
+    warmup=WARMUP,
+)
+
+# Micro-batching: concurrent /generate requests with the same settings
+# are collected for BATCH_WINDOW seconds and run as one generate_batch call
+MAX_BATCH_SIZE = 4
+BATCH_WINDOW = 0.05
+MAX_QUEUE_WAIT = 30.0
+
+# Admission queue: requests are "interactive" (the web UI sends this) or
+# "bulk" (API clients, the default); queued interactive requests always run
+# first. Each class has its own queue bound, beyond which requests get 429
+# with Retry-After, and a deadline after which queued work is dropped
+# without running. Clients can shorten it with the `timeout` field (seconds).
+DEFAULT_PRIORITY = "bulk"
+MAX_QUEUED = {'interactive': 16, 'bulk': 64}
+REQUEST_DEADLINES = {'interactive': 30.0, 'bulk': 300.0}
+
+batcher = MicroBatcher(
+    generator,
+    max_batch_size=MAX_BATCH_SIZE,
+    batch_window=BATCH_WINDOW,
+    max_wait=MAX_QUEUE_WAIT,
+    workers=INFERENCE_WORKERS,
+    admission=admission,
+    max_queue=MAX_QUEUED,
+)
+
+# Output directory: sharded image files plus a SQLite metadata index.
+# Thumbnails for the gallery are written in the background as images are saved.
+OUTPUT_DIR = Path(app.root_path) / "web_outputs"
+output_store = OutputStore(OUTPUT_DIR)
+
+# Stored outputs never change, so browsers and proxies may cache them for
+# a year without revalidating (strong content-hash ETags cover the rest)
+OUTPUT_MAX_AGE = 365 * 24 * 3600
+
+# Page sizes of GET /gallery
+GALLERY_PAGE_SIZE = 60
+MAX_GALLERY_PAGE_SIZE = 200
+
+
+@app.before_request
+def start_model_loading():
+    """Begin loading the model with the first request (no-op afterwards)."""
+    generator.start()
+
+
+# Domain keywords, compiled into one word-boundary matcher (prompt_classifier.py)
+# Keywords that indicate anime/animation domain
+ANIME_KEYWORDS = [
+    'anime', 'manga', 'cartoon', 'animated', 'chibi', 'kawaii',
+    'character', 'hero', 'villain', 'magical girl', 'mecha',
+    'fantasy', 'elf', 'dragon', 'spirit', 'creature',
+    'cel shaded', 'illustrated', 'comic', 'stylized'
+]
+
+# Keywords that indicate out-of-domain (realistic/photographic)
+REALISTIC_KEYWORDS = [
+    'photograph', 'photography', 'photo', 'realistic', 'photorealistic',
+    'real life', 'photographic', 'portrait photo', 'candid', 'documentary',
+    'street photography', 'professional photo', 'hdr photo', 'dslr', 'camera'
+]
+
+# Out-of-domain unless the prompt also has an anime keyword
+NON_ANIME_INDICATORS = ['real', 'actual', 'lifelike']
+
+domain_classifier = PromptClassifier(ANIME_KEYWORDS, REALISTIC_KEYWORDS, NON_ANIME_INDICATORS)
+
+# Accepted generation settings; anything outside these is a 400. Sizes
+# must be multiples of the VAE's 8x downsampling, and seeds fit SQLite's
+# signed 64-bit integers (they are stored in the output index).
+MAX_INFERENCE_STEPS = 50
+MIN_IMAGE_SIZE = 64
+MAX_IMAGE_SIZE = 2048
+IMAGE_SIZE_MULTIPLE = 8
+MAX_SEED = 2 ** 63 - 1
+
+# Upper bound on prompts per /validate_bulk call
+MAX_BULK_PROMPTS = 10000
 
 
 def is_anime_domain(prompt: str) -> tuple[bool, str]:
@@ -35,51 +190,7 @@ def is_anime_domain(prompt: str) -> tuple[bool, str]:
         (is_valid, suggestion) - is_valid=True if anime-related, 
                                  suggestion provides anime alternative
     """
-    prompt_lower = prompt.lower()
-    
-    # Keywords that indicate anime/animation domain
-    anime_keywords = [
-        'anime', 'manga', 'cartoon', 'animated', 'chibi', 'kawaii',
-        'character', 'hero', 'villain', 'magical girl', 'mecha',
-        'fantasy', 'elf', 'dragon', 'spirit', 'creature',
-        'cel shaded', 'illustrated', 'comic', 'stylized'
-    ]
-    
-    # Keywords that indicate out-of-domain (realistic/photographic)
-    realistic_keywords = [
-        'photograph', 'photo', 'realistic', 'real life', 'photographic',
-        'portrait photo', 'candid', 'documentary', 'street photography',
-        'professional photo', 'hdr photo', 'dslr', 'camera'
-    ]
-    
-    # Check for explicit realistic requests
-    for keyword in realistic_keywords:
-        if keyword in prompt_lower:
-            # Generate anime alternative suggestion
-            anime_version = prompt.replace(keyword, '').strip()
-            if not anime_version:
-                anime_version = "an anime scene"
-            suggestion = f"anime style, {anime_version}"
-            return False, suggestion
-    
-    # Check if explicitly anime-themed
-    has_anime_keyword = any(keyword in prompt_lower for keyword in anime_keywords)
-    
-    # If no anime keywords and contains specific non-anime terms
-    non_anime_indicators = ['real', 'actual', 'photorealistic', 'lifelike']
-    has_non_anime = any(indicator in prompt_lower for indicator in non_anime_indicators)
-    
-    if has_non_anime and not has_anime_keyword:
-        suggestion = f"anime style, {prompt}"
-        return False, suggestion
-    
-    # If neutral prompt (no clear indication), allow but suggest anime enhancement
-    if not has_anime_keyword:
-        suggestion = f"anime style, {prompt}"
-        return True, suggestion  # Allow but provide suggestion
-    
-    # Valid anime prompt
-    return True, prompt
+    return domain_classifier.classify(prompt)
 
 
 @app.route('/')
@@ -88,63 +199,354 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/generate', methods=['POST'])
-def generate():
+def read_int(data: dict, name: str, default, low: int, high: int, multiple: int = 1):
     """
-    Generate anime image from prompt.
-    Validates domain and returns appropriate response.
+    Read an integer field from a request body and range-check it.
+    
+    Returns:
+        (value, None), or (None, message) if the field is invalid
     """
-    data = request.json
+    value = data.get(name)
+    if value in (None, ''):
+        value = default
+    if value is None:
+        return None, None
+    message = f'{name} must be an integer from {low} to {high}'
+    if multiple > 1:
+        message += f' and a multiple of {multiple}'
+    # Whole numbers or their string form only (no floats, no booleans)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None, message
+    try:
+        number = int(value)
+    except ValueError:
+        return None, message
+    if not low <= number <= high or number % multiple:
+        return None, message
+    return number, None
+
+
+def parse_generation_request(data: dict):
+    """
+    Read generation settings from a request body and validate the prompt.
+    The WebP/JPEG `quality` is not a generation setting; it is validated
+    here too and left in `g.quality` for the encoder.
+    
+    Returns:
+        (params, None) with keyword arguments for the batcher, or
+        (None, error_response) to be returned to the client as-is
+    """
+    data = data or {}
     prompt = data.get('prompt', '').strip()
-    steps = int(data.get('steps', 2))
+    model = data.get('model') or None
+    priority = data.get('priority') or request.headers.get('X-Priority') or DEFAULT_PRIORITY
     
     if not prompt:
-        return jsonify({
+        return None, (jsonify({
             'error': True,
             'message': 'Please enter a prompt!'
-        }), 400
+        }), 400)
+    
+    if model is not None and model not in MODELS:
+        return None, (jsonify({
+            'error': True,
+            'message': f'Unknown model: {model}',
+            'models': sorted(MODELS)
+        }), 400)
+    
+    if priority not in PRIORITIES:
+        return None, (jsonify({
+            'error': True,
+            'message': f'Unknown priority: {priority}',
+            'priorities': list(PRIORITIES)
+        }), 400)
+    
+    # The client's own timeout can only shorten the class deadline
+    deadline_s = REQUEST_DEADLINES[priority]
+    if data.get('timeout') not in (None, ''):
+        try:
+            timeout = float(data['timeout'])
+        except (TypeError, ValueError):
+            timeout = None
+        if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+            return None, (jsonify({
+                'error': True,
+                'message': 'timeout must be a positive number of seconds'
+            }), 400)
+        deadline_s = min(deadline_s, timeout)
+    
+    settings = {}
+    for name, default, low, high, multiple in (
+        ('steps', 2, 1, MAX_INFERENCE_STEPS, 1),
+        ('width', 512, MIN_IMAGE_SIZE, MAX_IMAGE_SIZE, IMAGE_SIZE_MULTIPLE),
+        ('height', 512, MIN_IMAGE_SIZE, MAX_IMAGE_SIZE, IMAGE_SIZE_MULTIPLE),
+        ('seed', None, 0, MAX_SEED, 1),
+        ('quality', DEFAULT_QUALITY, 1, 100, 1),
+    ):
+        settings[name], message = read_int(data, name, default, low, high, multiple)
+        if message:
+            return None, (jsonify({
+                'error': True,
+                'message': message
+            }), 400)
+    
+    g.quality = settings.pop('quality')
     
     # Domain validation
     is_valid, suggestion = is_anime_domain(prompt)
     
     if not is_valid:
-        return jsonify({
+        return None, (jsonify({
             'error': True,
             'out_of_domain': True,
             'message': 'WARNING: Out of Domain Detected!',
             'details': 'This system is specialized for <strong>anime and animated content</strong>. Your prompt appears to request realistic/photographic imagery.',
             'suggestion': suggestion,
             'original_prompt': prompt
-        }), 400
+        }), 400)
+    
+    params = {
+        'prompt': prompt,
+        'num_inference_steps': settings['steps'],
+        'width': settings['width'],
+        'height': settings['height'],
+        'seed': settings['seed'],
+        'model': MODELS[model] if model is not None else None,
+        'priority': priority,
+        'deadline': time.monotonic() + deadline_s,
+    }
+    
+    # Reject sizes that cannot fit in memory even with nothing else running
+    if not admission.fits(params['width'], params['height']):
+        return None, too_large(params['width'], params['height'])
+    
+    return params, None
+
+
+def too_large(width: int, height: int):
+    """413 response for sizes that cannot fit in memory."""
+    admission.reject()
+    needed = memory_estimator.estimate(width, height)
+    return jsonify({
+        'error': True,
+        'message': f"{width}x{height} is too large for this server's memory, please choose a smaller size",
+        'required_mb': round(needed / 1024 ** 2),
+        'available_mb': round(admission.capacity() / 1024 ** 2)
+    }), 413
+
+
+def save_output(
+    data: bytes,
+    params: dict,
+    mimetype: str = 'image/png',
+    timings: dict = None,
+) -> dict:
+    """Store already-encoded image bytes and return their index record."""
+    with span("disk_write"):
+        record = output_store.save(
+            data,
+            extension=extension_for(mimetype),
+            mimetype=mimetype,
+            prompt=params['prompt'],
+            seed=params['seed'],
+            steps=params['num_inference_steps'],
+            width=params['width'],
+            height=params['height'],
+            timings=timings,
+        )
+    return record
+
+
+def store_job_result(image, job) -> dict:
+    """Save a finished job's image and describe where to fetch it."""
+    encode_start = time.perf_counter()
+    with span("image_encode"):
+        data = encode_image(image)
+    timings = {
+        'total_ms': round((time.time() - job.created_at) * 1000, 1),
+        'encode_ms': round((time.perf_counter() - encode_start) * 1000, 1),
+    }
+    record = save_output(data, job.params, timings=timings)
+    return {
+        'filename': record['filename'],
+        'url': f"/outputs/{record['filename']}",
+        'thumbnail_url': f"/outputs/{record['thumbnail']}"
+    }
+
+
+# Asynchronous jobs (POST /jobs) run on the batcher's inference worker
+JOB_TTL = 3600.0
+jobs = JobManager(batcher, save_result=store_job_result, job_ttl=JOB_TTL)
+
+# Comment line sent on idle event streams so proxies keep them open
+SSE_KEEPALIVE = 15.0
+
+# Prometheus metrics (GET /metrics). Stage timings are recorded by
+# `metrics.span()` and the generator's pipeline hooks; the gauges below
+# read live values at scrape time.
+REQUEST_SECONDS = Histogram(
+    "sdturbo_request_seconds", "HTTP request latency", labels=("endpoint",)
+)
+REQUESTS = Counter(
+    "sdturbo_requests_total", "HTTP requests handled", labels=("endpoint", "status")
+)
+IN_FLIGHT = Gauge("sdturbo_requests_in_flight", "HTTP requests being handled")
+
+
+def cache_counts(attribute: str) -> dict:
+    """Hit or miss counter of each cache in this process."""
+    counts = {('result',): getattr(result_cache, attribute)}
+    if generator.ready and hasattr(generator, 'prompt_cache'):
+        counts[('prompt',)] = getattr(generator.prompt_cache, attribute)
+    return counts
+
+
+CallbackMetric(
+    "sdturbo_queue_depth", "Requests waiting in the micro-batcher",
+    lambda: {(priority,): batcher.queue_depth(priority) for priority in PRIORITIES},
+    labels=("priority",),
+)
+CallbackMetric(
+    "sdturbo_queue_rejections_total", "Requests refused by the micro-batcher queue",
+    lambda: {('queue_full',): batcher.requests_rejected, ('deadline',): batcher.requests_expired},
+    kind="counter", labels=("reason",),
+)
+CallbackMetric(
+    "sdturbo_batches_total", "Batches run by the micro-batcher",
+    lambda: batcher.batches_run, kind="counter",
+)
+CallbackMetric(
+    "sdturbo_jobs", "Tracked jobs by status",
+    lambda: {(status,): count for status, count in jobs.counts().items()}, labels=("status",),
+)
+CallbackMetric(
+    "sdturbo_cache_hits_total", "Cache hits",
+    lambda: cache_counts('hits'), kind="counter", labels=("cache",),
+)
+CallbackMetric(
+    "sdturbo_cache_misses_total", "Cache misses",
+    lambda: cache_counts('misses'), kind="counter", labels=("cache",),
+)
+CallbackMetric("sdturbo_model_ready", "1 once the model is loaded and warmed up",
+               lambda: int(generator.ready))
+CallbackMetric("sdturbo_models_loaded", "Pipelines loaded in the model registry",
+               lambda: len(generator.loaded()) if generator.ready else None)
+CallbackMetric(
+    "sdturbo_model_evictions_total", "Pipelines evicted from the model registry",
+    lambda: generator.evictions if generator.ready else None, kind="counter",
+)
+CallbackMetric("sdturbo_memory_reserved_bytes", "Estimated peak memory of running batches",
+               lambda: admission.reserved)
+CallbackMetric("sdturbo_memory_capacity_bytes", "Memory activations may use with nothing running",
+               admission.capacity)
+CallbackMetric(
+    "sdturbo_memory_rejections_total", "Requests refused for memory",
+    lambda: {('too_large',): admission.rejected, ('timeout',): admission.timeouts},
+    kind="counter", labels=("reason",),
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+@app.after_request
+def record_request(response):
+    """Count and time every request (streams are timed to their first byte)."""
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request(error=None):
+    if 'request_start' in g:
+        IN_FLIGHT.dec()
+
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    """
+    Generate anime image from prompt.
+    Validates domain and returns appropriate response.
+    
+    By default responds with JSON holding the URL of the saved image. A
+    client whose Accept header prefers image/png, image/webp or image/jpeg
+    gets the encoded image bytes directly (`quality` sets WebP/JPEG quality).
+    """
+    params, error_response = parse_generation_request(request.json)
+    if error_response:
+        return error_response
+    
+    mimetype = request.accept_mimetypes.best_match(
+        ['application/json'] + list(IMAGE_FORMATS)
+    ) or 'application/json'
+    
+    if not generator.ready:
+        return model_not_ready()
     
     try:
-        # Generate image
-        image = generator.generate(
-            prompt=prompt,
-            num_inference_steps=steps,
+        start = time.perf_counter()
+        
+        # Repeat seeded requests are answered straight from the result cache
+        image = generator.cached_result(
+            params['prompt'],
+            num_inference_steps=params['num_inference_steps'],
+            width=params['width'],
+            height=params['height'],
+            seed=params['seed'],
+            model=params['model'],
         )
         
-        # Save to disk first (more reliable on Windows)
-        filename = f"anime_{len(list(OUTPUT_DIR.glob('*.png'))) + 1}.png"
-        filepath = OUTPUT_DIR / filename
+        # Generate image (batched with concurrent compatible requests)
+        if image is None:
+            image = batcher.generate(**params)
         
-        # Save using string path for Windows compatibility
-        image.save(str(filepath), format="PNG")
+        # Encode once; the same bytes go to disk and (optionally) the client
+        generated = time.perf_counter()
+        image_type = mimetype if mimetype in IMAGE_FORMATS else 'image/png'
+        with span("image_encode"):
+            data = encode_image(image, image_type, quality=g.quality)
+        timings = {
+            'generate_ms': round((generated - start) * 1000, 1),
+            'encode_ms': round((time.perf_counter() - generated) * 1000, 1),
+        }
+        record = save_output(data, params, image_type, timings)
+        filename = record['filename']
+        generator.record_request(timings['generate_ms'])
         
-        # Convert to base64 for web display
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        buffered.seek(0)  # Ensure we're at the start of the buffer
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        if mimetype in IMAGE_FORMATS:
+            response = Response(data, mimetype=image_type)
+            response.headers['Content-Location'] = f'/outputs/{filename}'
+            response.headers['Vary'] = 'Accept'
+            return response
         
         return jsonify({
             'success': True,
-            'image': f'data:image/png;base64,{img_str}',
-            'prompt': prompt,
-            'steps': steps,
+            'url': f'/outputs/{filename}',
+            'thumbnail_url': f"/outputs/{record['thumbnail']}",
+            'prompt': params['prompt'],
+            'steps': params['num_inference_steps'],
+            'seed': params['seed'],
+            'model': params['model'] or MODEL_ID,
             'filename': filename
         })
     
+    except QueueFull as e:
+        return queue_full(e)
+    
+    except QueueTimeout as e:
+        return jsonify({
+            'error': True,
+            'message': f'Server busy: {str(e)}'
+        }), 503
+    
+    except (MemoryBusy, InsufficientMemory) as e:
+        return memory_busy(e)
+    
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -155,6 +557,352 @@ def generate():
         }), 500
 
 
+# Upper bound on images per /variations call
+MAX_VARIATIONS = 8
+
+
+def load_source_image(data: dict):
+    """
+    Source image of a /variations request: `source` names a stored output
+    (as in its URL), `image` carries base64 image bytes or a data: URL.
+    
+    Returns:
+        (image, None), (None, None) without a source, or
+        (None, error_response) to be returned to the client as-is
+    """
+    source = data.get('source')
+    encoded = data.get('image')
+    if not source and not encoded:
+        return None, None
+    
+    try:
+        if source:
+            path = safe_join(str(OUTPUT_DIR), source.removeprefix('/outputs/'))
+            if path is None or not Path(path).is_file():
+                return None, (jsonify({
+                    'error': True,
+                    'message': f'Unknown source image: {source}'
+                }), 404)
+            image = Image.open(path)
+        else:
+            encoded = encoded.split(',', 1)[1] if encoded.startswith('data:') else encoded
+            image = Image.open(io.BytesIO(base64.b64decode(encoded, validate=True)))
+        image.load()
+    except (binascii.Error, OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        return None, (jsonify({
+            'error': True,
+            'message': f'Could not read the source image: {e}'
+        }), 400)
+    
+    return image.convert('RGB'), None
+
+
+@app.route('/variations', methods=['POST'])
+def variations():
+    """
+    Variations of an image or of a seeded prompt, run on the loaded
+    pipeline (no extra weights).
+    
+    With `source` or `image`: image-to-image of that image, one result
+    per seed `seed + k`; `strength` (default 0.5) sets how much changes,
+    and only strength * steps denoising steps run. The output keeps the
+    source size unless `width`/`height` are given.
+    
+    Without: seed variations of `prompt` at `seed` (random if not given),
+    keeping its composition; `variation_strength` (default 0.15) sets
+    how far each variation moves from the base noise.
+    """
+    data = request.json or {}
+    params, error_response = parse_generation_request(data)
+    if error_response:
+        return error_response
+    
+    image, error_response = load_source_image(data)
+    if error_response:
+        return error_response
+    
+    # Variation k uses seed + k + 1, which has to stay a valid seed
+    count, message = read_int(data, 'count', 4, 1, MAX_VARIATIONS)
+    if not message:
+        _, message = read_int(data, 'seed', None, 0, MAX_SEED - MAX_VARIATIONS)
+    if message:
+        return jsonify({
+            'error': True,
+            'message': message
+        }), 400
+    try:
+        strength = float(data.get('strength', 0.5))
+        variation_strength = float(data.get('variation_strength', 0.15))
+    except (TypeError, ValueError):
+        return jsonify({
+            'error': True,
+            'message': 'strength and variation_strength must be numbers'
+        }), 400
+    if not (0.0 < strength <= 1.0 and 0.0 <= variation_strength <= 1.0):
+        return jsonify({
+            'error': True,
+            'message': 'strength must be in (0, 1] and variation_strength in [0, 1]'
+        }), 400
+    
+    # Image-to-image keeps the source size unless one was asked for
+    if image is not None and 'width' not in data and 'height' not in data:
+        params['width'] = max(8, round(image.width / 8) * 8)
+        params['height'] = max(8, round(image.height / 8) * 8)
+        if not admission.fits(params['width'], params['height']):
+            return too_large(params['width'], params['height'])
+    
+    if params['seed'] is None:
+        params['seed'] = random.getrandbits(31)
+    base_seed = params['seed']
+    
+    if not generator.ready:
+        return model_not_ready()
+    
+    try:
+        start = time.perf_counter()
+        images = batcher.submit_call(
+            'variations',
+            width=params['width'],
+            height=params['height'],
+            batch_size=count,
+            prompt=params['prompt'],
+            seed=base_seed,
+            num_images=count,
+            image=image,
+            strength=strength,
+            variation_strength=variation_strength,
+            num_inference_steps=params['num_inference_steps'],
+            model=params['model'],
+            priority=params['priority'],
+            deadline=params['deadline'],
+        ).result()
+        generate_ms = round((time.perf_counter() - start) * 1000, 1)
+        
+        results = []
+        for k, variation in enumerate(images):
+            # Image-to-image result k used seed + k; seed variation k moved
+            # the base seed's noise towards the noise of seed + k + 1
+            seed = base_seed + k if image is not None else base_seed
+            with span("image_encode"):
+                encoded = encode_image(variation)
+            record = save_output(
+                encoded, dict(params, seed=seed), timings={'generate_ms': generate_ms}
+            )
+            result = {
+                'url': f"/outputs/{record['filename']}",
+                'thumbnail_url': f"/outputs/{record['thumbnail']}",
+                'filename': record['filename'],
+                'seed': seed,
+            }
+            if image is None:
+                result['variation_seed'] = base_seed + k + 1
+            results.append(result)
+        
+        return jsonify({
+            'success': True,
+            'mode': 'img2img' if image is not None else 'seed',
+            'prompt': params['prompt'],
+            'steps': params['num_inference_steps'],
+            'seed': base_seed,
+            'strength': strength if image is not None else None,
+            'variation_strength': variation_strength if image is None else None,
+            'model': params['model'] or MODEL_ID,
+            'images': results,
+            'generate_ms': generate_ms
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 400
+    
+    except QueueFull as e:
+        return queue_full(e)
+    
+    except QueueTimeout as e:
+        return jsonify({
+            'error': True,
+            'message': f'Server busy: {str(e)}'
+        }), 503
+    
+    except (MemoryBusy, InsufficientMemory) as e:
+        return memory_busy(e)
+    
+    except Exception as e:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"ERROR in variations: {error_details}")
+        return jsonify({
+            'error': True,
+            'message': f'Variation failed: {str(e)}'
+        }), 500
+
+
+def queue_full(error: QueueFull):
+    """429 response for requests refused because their queue is full."""
+    response = jsonify({
+        'error': True,
+        'message': f'Too many requests queued, please retry in {error.retry_after}s: {error}'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+def memory_busy(error: Exception):
+    """503 response for generations that found no free memory in time."""
+    response = jsonify({
+        'error': True,
+        'message': f'Server out of memory for this request right now, please retry shortly: {error}'
+    })
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+def model_not_ready():
+    """503 response for requests that arrive while the model is loading."""
+    status = generator.status()
+    response = jsonify({
+        'error': True,
+        'message': 'Model failed to load' if 'error' in status else 'Model is still loading, please retry shortly',
+        'model': status
+    })
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up."""
+    status = generator.status()
+    status['memory'] = admission.stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.route('/models')
+def list_models():
+    """Selectable models, plus what is loaded once the default model is ready."""
+    response = {
+        'default': MODEL_ID,
+        'models': {name: model_id for name, model_id in sorted(MODELS.items())},
+    }
+    if generator.ready:
+        response['registry'] = generator.stats()
+    return jsonify(response)
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Queue a generation job and return its id immediately.
+    Poll GET /jobs/<job_id> for the result.
+    """
+    params, error_response = parse_generation_request(request.json)
+    if error_response:
+        return error_response
+    
+    previews = bool((request.json or {}).get('previews', False))
+    try:
+        job = jobs.submit(previews=previews, **params)
+    except QueueFull as e:
+        return queue_full(e)
+    
+    response = jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.current_status(),
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events'
+    })
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a job's status, plus the result URL once it has succeeded."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': True,
+            'message': 'Unknown or expired job'
+        }), 404
+    
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Stream a job's progress as Server-Sent Events.
+    
+    Sends a `progress` event after every denoising step (with a latent
+    preview if the job was created with previews enabled) and a final
+    `done` event carrying the same payload as GET /jobs/<job_id>.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': True,
+            'message': 'Unknown or expired job'
+        }), 404
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    def stream():
+        version = -1
+        while True:
+            new_version = job.wait_for_update(version, timeout=SSE_KEEPALIVE)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            
+            status = job.current_status()
+            if status in TERMINAL_STATES:
+                yield sse('done', job.to_dict())
+                return
+            
+            yield sse('progress', {
+                'status': status,
+                'progress': job.progress,
+                'preview': job.preview
+            })
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': True,
+            'message': 'Unknown or expired job'
+        }), 404
+    
+    if not jobs.cancel(job_id):
+        return jsonify({
+            'error': True,
+            'message': f'Job already {job.status}',
+            'status': job.status
+        }), 409
+    
+    return jsonify(job.to_dict()), 202
+
+
 @app.route('/suggest', methods=['POST'])
 def suggest_anime_prompt():
     """Convert user's prompt to anime-style suggestion."""
@@ -169,10 +917,100 @@ def suggest_anime_prompt():
     })
 
 
-@app.route('/outputs/<filename>')
+@app.route('/validate_bulk', methods=['POST'])
+def validate_bulk():
+    """
+    Classify many prompts in one call, e.g. to pre-screen a manifest.
+    Body: {"prompts": ["...", ...]}; results keep the input order.
+    """
+    prompts = (request.json or {}).get('prompts')
+    if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+        return jsonify({
+            'error': True,
+            'message': 'Expected {"prompts": [list of strings]}'
+        }), 400
+    
+    if len(prompts) > MAX_BULK_PROMPTS:
+        return jsonify({
+            'error': True,
+            'message': f'Too many prompts: {len(prompts)} (limit {MAX_BULK_PROMPTS} per call)'
+        }), 413
+    
+    start = time.perf_counter()
+    results = domain_classifier.classify_many(prompts)
+    valid = sum(result['is_anime'] for result in results)
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'valid': valid,
+        'blocked': len(results) - valid,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
+@app.route('/gallery')
+def gallery():
+    """
+    Newest-first page of stored images, read from the output index.
+    
+    Query parameters: `limit` (default GALLERY_PAGE_SIZE) and `before`, the
+    `next_cursor` of the previous page. `next_cursor` is null on the last page.
+    """
+    try:
+        limit = min(int(request.args.get('limit', GALLERY_PAGE_SIZE)), MAX_GALLERY_PAGE_SIZE)
+        before = request.args.get('before')
+        before = int(before) if before not in (None, '') else None
+    except ValueError:
+        return jsonify({
+            'error': True,
+            'message': 'limit and before must be integers'
+        }), 400
+    if limit < 1:
+        return jsonify({
+            'error': True,
+            'message': 'limit must be at least 1'
+        }), 400
+    
+    records = output_store.list(limit=limit, before=before)
+    images = [
+        {
+            'id': record['id'],
+            'url': f"/outputs/{record['filename']}",
+            'thumbnail_url': f"/outputs/{record['thumbnail']}",
+            'prompt': record['prompt'],
+            'seed': record['seed'],
+            'steps': record['steps'],
+            'width': record['width'],
+            'height': record['height'],
+            'created_at': record['created_at'],
+        }
+        for record in records
+    ]
+    return jsonify({
+        'images': images,
+        'next_cursor': records[-1]['id'] if len(records) == limit else None
+    })
+
+
+@app.route('/outputs/<path:filename>')
 def serve_image(filename):
-    """Serve generated images."""
-    return send_from_directory(OUTPUT_DIR, filename)
+    """Serve generated images and their thumbnails (cacheable for good)."""
+    stored = output_store.resolve(filename)
+    if stored is None:
+        # Files the index does not know about (e.g. saved by older versions)
+        return send_from_directory(OUTPUT_DIR, filename)
+    
+    response = send_file(
+        stored['path'],
+        mimetype=stored['mimetype'],
+        etag=stored['etag'] or True,
+        max_age=OUTPUT_MAX_AGE,
+        conditional=True,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 if __name__ == '__main__':
@@ -185,7 +1023,8 @@ if __name__ == '__main__':
     print("  - Out-of-domain notifications")
     print("  - Real-time image generation")
     print("  - Beautiful modern UI")
-    print("\nModel: SD-Turbo (loaded and ready)")
+    print(f"\nModel: {MODEL_ID} (loading in the background - see /ready)")
     print("\nPress Ctrl+C to stop\n")
     
+    generator.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,283 @@
+"""
+Resumable Manifest Batch Runner
+-------------------------------
+Command-line bulk generation from a JSONL or CSV prompt manifest.
+
+The manifest is streamed one record at a time, so its size does not
+matter. Each record needs a `prompt`; `id`, `seed` and `filename` are
+optional (the id defaults to the record's index):
+
+    {"id": "hero_001", "prompt": "anime hero, blue hair", "seed": 42}
+
+    id,prompt,seed
+    hero_001,"anime hero, blue hair",42
+
+After every batch is written to disk, its ids are appended to a
+checkpoint log (fsync'd). A restarted run skips everything in the log,
+so a crash only loses the batches still in flight. `--shard K
+--num-shards N` keeps only records whose index % N == K, so several
+machines can split one manifest without coordination.
+
+Usage:
+    python batch_runner.py prompts.jsonl -o bulk_outputs
+    python batch_runner.py prompts.csv -o bulk_outputs --shard 0 --num-shards 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from memory import available_memory_bytes, max_batch_size
+
+
+def read_manifest(path, shard: int = 0, num_shards: int = 1):
+    """
+    Stream records from a JSONL or CSV manifest.
+
+    Args:
+        path: Manifest file (`.csv` is read as CSV, anything else as JSONL)
+        shard: Index of this shard
+        num_shards: Total number of shards
+
+    Yields:
+        Dicts with `index`, `id`, `prompt`, `seed` and `filename`
+    """
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for index, row in enumerate(rows):
+            if index % num_shards != shard:
+                continue
+            if not row.get("prompt"):
+                raise ValueError(f"{path}: record {index} has no prompt")
+            seed = row.get("seed")
+            yield {
+                'index': index,
+                'id': str(row.get("id") or index),
+                'prompt': row["prompt"],
+                'seed': int(seed) if seed not in (None, "") else None,
+                'filename': row.get("filename") or None,
+            }
+
+
+def load_checkpoint(path) -> set[str]:
+    """Ids already recorded as finished (a torn last line is ignored)."""
+    done = set()
+    if not Path(path).exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+
+def output_filename(record: dict) -> str:
+    """Manifest filename, or a filesystem-safe `<id>.png`."""
+    if record['filename']:
+        return record['filename']
+    return re.sub(r"[^A-Za-z0-9._-]", "_", record['id']) + ".png"
+
+
+def _save_atomic(image, path: Path):
+    # Write to a temp file and rename so a crash never leaves a partial image
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format="PNG")
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def run_manifest(
+    generator,
+    manifest,
+    output_dir,
+    checkpoint=None,
+    shard: int = 0,
+    num_shards: int = 1,
+    num_inference_steps: int = 1,
+    width: int = 512,
+    height: int = 512,
+    batch_size: int = None,
+    seed_base: int = None,
+) -> dict:
+    """
+    Generate every pending record of a manifest, checkpointing per batch.
+
+    Args:
+        generator: SDTurboGenerator or WorkerPool
+        manifest: JSONL or CSV manifest path
+        output_dir: Directory for the images
+        checkpoint: Checkpoint log path (default: one per shard in output_dir)
+        shard: Index of this shard
+        num_shards: Total number of shards
+        num_inference_steps: Denoising steps per image
+        width: Output image width
+        height: Output image height
+        batch_size: Images per pipeline call (default: fit the free memory)
+        seed_base: Seed records without one as `seed_base + index`, so a
+            resumed run produces the same images
+
+    Returns:
+        Summary dict with generated / skipped counts and timings
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if checkpoint is None:
+        checkpoint = output_dir / f"checkpoint-{shard}-of-{num_shards}.jsonl"
+
+    done = load_checkpoint(checkpoint)
+    workers = getattr(generator, "num_workers", 1)
+    if batch_size is None:
+        batch_size = max_batch_size(
+            available_memory_bytes() // 2 // workers, width, height, generator.dtype_bytes
+        )
+    print(f"Shard {shard}/{num_shards}, batch size {batch_size}, "
+          f"{len(done)} items already done ({checkpoint})\n")
+
+    skipped = 0
+
+    def pending():
+        nonlocal skipped
+        for record in read_manifest(manifest, shard, num_shards):
+            if record['id'] in done:
+                skipped += 1
+                continue
+            if record['seed'] is None and seed_base is not None:
+                record['seed'] = seed_base + record['index']
+            yield record
+
+    settings = dict(num_inference_steps=num_inference_steps, width=width, height=height)
+
+    def submit(batch):
+        prompts = [record['prompt'] for record in batch]
+        seeds = [record['seed'] for record in batch]
+        if hasattr(generator, "submit_batch"):
+            return generator.submit_batch(prompts, seeds=seeds, **settings)
+        return generator.generate_batch(prompts, seeds=seeds, **settings)
+
+    generated = 0
+    start_time = time.time()
+    log = open(checkpoint, "a", encoding="utf-8")
+
+    def write_batch(batch, images):
+        # One writer thread: batches are checkpointed in order, after their files
+        for record, image in zip(batch, images):
+            _save_atomic(image, output_dir / output_filename(record))
+        for record in batch:
+            log.write(json.dumps({'id': record['id'], 'index': record['index'],
+                                  'file': output_filename(record)}) + "\n")
+        log.flush()
+        os.fsync(log.fileno())
+
+    records = pending()
+    in_flight = deque()
+    # Keep every pool worker busy; in-process calls block, so one at a time
+    window = workers * 2 if hasattr(generator, "submit_batch") else 1
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="manifest-writer") as writer:
+            writes = deque()
+            while True:
+                while len(in_flight) < window:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    in_flight.append((batch, submit(batch)))
+                if not in_flight:
+                    break
+
+                batch, output = in_flight.popleft()
+                images = output.result() if hasattr(output, "result") else output
+                writes.append(writer.submit(write_batch, batch, images))
+                generated += len(batch)
+
+                # Surface write errors early and bound the unsaved backlog
+                while len(writes) > 2 or (writes and writes[0].done()):
+                    writes.popleft().result()
+
+                elapsed = time.time() - start_time
+                print(f"[{generated} done, {skipped} skipped] last: {batch[-1]['id']} "
+                      f"({generated / elapsed:.2f} img/s)")
+
+            for write in writes:
+                write.result()
+    finally:
+        for _, output in in_flight:
+            if hasattr(output, "cancel"):
+                output.cancel()
+        log.close()
+
+    total_time = time.time() - start_time
+    return {
+        'generated': generated,
+        'skipped': skipped,
+        'total_time': total_time,
+        'avg_time': total_time / generated if generated else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch generation from a prompt manifest")
+    parser.add_argument("manifest", help="JSONL or CSV file with a prompt per record")
+    parser.add_argument("-o", "--output-dir", default="bulk_outputs")
+    parser.add_argument("--checkpoint", help="Checkpoint log (default: per shard in the output dir)")
+    parser.add_argument("--shard", type=int, default=0)
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--seed-base", type=int,
+                        help="Seed unseeded records as seed_base + index (reproducible resumes)")
+    parser.add_argument("--model-id", default="stabilityai/sd-turbo")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--profile", default="baseline",
+                        help="CPU performance profile: baseline, fast-cpu or max-cpu")
+    args = parser.parse_args()
+
+    if not 0 <= args.shard < args.num_shards:
+        parser.error("--shard must be in [0, --num-shards)")
+
+    from worker_pool import create_generator
+    generator = create_generator(
+        args.workers, model_id=args.model_id, device=args.device, perf_profile=args.profile
+    )
+
+    summary = run_manifest(
+        generator,
+        args.manifest,
+        args.output_dir,
+        checkpoint=args.checkpoint,
+        shard=args.shard,
+        num_shards=args.num_shards,
+        num_inference_steps=args.steps,
+        width=args.width,
+        height=args.height,
+        batch_size=args.batch_size,
+        seed_base=args.seed_base,
+    )
+    print(f"\n✅ Generated {summary['generated']} images "
+          f"({summary['skipped']} already done) in {summary['total_time']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+Dynamic Micro-Batching for SD-Turbo
+-----------------------------------
+Collects concurrent generation requests that share the same settings
+(steps, guidance, width, height) over a short window and runs them as a
+single `generate_batch` call on one background worker thread.
+
+Under load the UNet processes several prompts per forward pass, so
+throughput grows with the batch size, while the collection window and
+`max_wait` keep per-request latency bounded.
+
+With a `MemoryAdmission` (memory.py) batches are also capped at what
+fits in memory, and each batch waits for memory before it runs.
+
+Other generator calls (`img2img`, `variations`) go through the same
+queue with `submit_call()`, so they never run on the pipeline at the
+same time as a batch.
+
+Admission: each request has a priority class (PRIORITIES, highest
+first) and a deadline. Higher classes are always dispatched first, each
+class has its own queue bound (a full class fails fast with `QueueFull`
+and a retry estimate), and requests whose deadline passes before they
+start are dropped without running, so no work is done for clients that
+have given up.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+
+# Priority classes, highest first
+PRIORITIES = ("interactive", "bulk")
+
+
+class QueueTimeout(Exception):
+    """Raised when a request's deadline passed before it was dispatched."""
+
+
+class QueueFull(Exception):
+    """Raised by submit when a priority class's queue is at its bound."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationCancelled(Exception):
+    """Raised when a request was cancelled after it started running."""
+
+
+@dataclass
+class _Request:
+    """A single queued prompt waiting to be batched."""
+    prompt: str
+    key: tuple
+    future: Future
+    seed: int = None
+    model: str = None
+    cancel_event: threading.Event = None
+    on_step: object = None
+    call: tuple = None  # (method, kwargs, batch_size) for submit_call()
+    priority: str = PRIORITIES[-1]
+    deadline: float = None  # time.monotonic() after which it is not started
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def rank(self) -> tuple:
+        """Dispatch order: priority class, then arrival."""
+        return PRIORITIES.index(self.priority), self.enqueued_at
+
+
+class MicroBatcher:
+    """
+    Batching scheduler in front of an `SDTurboGenerator`.
+
+    Requests are grouped by their generation settings. A batch is
+    dispatched when it reaches `max_batch_size` or when its first request
+    has waited `batch_window` seconds, whichever comes first; the first
+    request is the oldest of the highest waiting priority class. Requests
+    still queued at their deadline (default: `max_wait` seconds) are
+    failed with `QueueTimeout` instead of being run.
+    """
+
+    def __init__(
+        self,
+        generator,
+        max_batch_size: int = 4,
+        batch_window: float = 0.05,
+        max_wait: float = 30.0,
+        workers: int = 1,
+        admission=None,
+        max_queue: dict = None,
+    ):
+        """
+        Start the batching worker.
+
+        Args:
+            generator: Object exposing `generate_batch()` (e.g. SDTurboGenerator)
+            max_batch_size: Largest number of prompts run in one pipeline call
+            batch_window: Seconds to collect compatible requests before dispatch
+            max_wait: Seconds a request may stay queued before it is rejected
+            workers: Batches dispatched concurrently; keep 1 for a single
+                SDTurboGenerator, use the pool size for a WorkerPool
+            admission: Optional MemoryAdmission; batches are capped at the
+                size that fits in memory and wait for memory before running
+                (failing with MemoryBusy if none frees up in time)
+            max_queue: Optional bound on queued requests per priority class
+                (e.g. {"interactive": 16, "bulk": 64}); submit raises
+                QueueFull beyond it. Classes not listed are unbounded.
+        """
+        self.generator = generator
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_wait = max_wait
+        self.admission = admission
+        self.max_queue = dict(max_queue or {})
+
+        self._pending: list[_Request] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.batches_run = 0
+        self.requests_run = 0
+        self.requests_expired = 0
+        self.requests_rejected = 0
+        # Moving average of batch run time, for Retry-After estimates
+        self.batch_seconds = None
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"micro-batcher-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(
+        self,
+        prompt: str,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: int = None,
+        cancel_event: threading.Event = None,
+        on_step=None,
+        model: str = None,
+        priority: str = PRIORITIES[-1],
+        deadline: float = None,
+    ) -> Future:
+        """
+        Queue a prompt for batched generation.
+
+        Seeded and unseeded requests share batches: `generate_batch` draws
+        each item's noise from its own seed, so a seeded result is the same
+        as a standalone `generate()` call (and is picked up by the result
+        cache).
+
+        A queued request is cancelled with `future.cancel()`. Setting
+        `cancel_event` also covers a request that is already running: it
+        fails with `GenerationCancelled`, and the pipeline call is aborted
+        at the next denoising step once every request in the batch is
+        cancelled.
+
+        `on_step(step, total_steps, latents)` is called on the worker
+        thread after each denoising step with this request's own latents.
+
+        `model` selects a checkpoint when the generator is a ModelRegistry
+        (requests for different models never share a batch).
+
+        `priority` is one of PRIORITIES (default: the lowest, so callers
+        that don't say are never ahead of interactive traffic); `deadline`
+        is the time.monotonic() after which the request is dropped if it
+        has not started (default: `max_wait` seconds from now).
+
+        Returns:
+            Future resolving to a PIL Image (or raising the pipeline error)
+
+        Raises:
+            QueueFull: The priority class's queue is at its bound
+        """
+        key = (num_inference_steps, guidance_scale, width, height, model)
+        request = _Request(
+            prompt=prompt, key=key, future=Future(), seed=seed, model=model,
+            cancel_event=cancel_event, on_step=on_step,
+            priority=priority, deadline=deadline,
+        )
+        return self._enqueue(request)
+
+    def submit_call(
+        self,
+        method: str,
+        width: int = 512,
+        height: int = 512,
+        batch_size: int = 1,
+        priority: str = PRIORITIES[-1],
+        deadline: float = None,
+        **kwargs,
+    ) -> Future:
+        """
+        Queue another generator method (e.g. `img2img`, `variations`) on
+        the inference worker, in FIFO order with the batches.
+
+        The call is never batched with other requests. `width`, `height`
+        and `batch_size` size its memory reservation; width and height are
+        passed on to the method with the other keyword arguments (`model`
+        only when it is not None). `priority` and `deadline` work as in
+        `submit()`.
+
+        Returns:
+            Future resolving to the method's return value
+
+        Raises:
+            QueueFull: The priority class's queue is at its bound
+        """
+        future = Future()
+        if kwargs.get('model') is None:
+            kwargs.pop('model', None)
+        request = _Request(
+            prompt=kwargs.get('prompt'),
+            key=('call', method, id(future)),
+            future=future,
+            call=(method, dict(kwargs, width=width, height=height), batch_size),
+            priority=priority,
+            deadline=deadline,
+        )
+        return self._enqueue(request)
+
+    def _enqueue(self, request: _Request) -> Future:
+        """Admit a request to the queue (or refuse it with QueueFull)."""
+        if request.priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {request.priority!r}, expected one of {PRIORITIES}")
+        if request.deadline is None:
+            request.deadline = request.enqueued_at + self.max_wait
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            limit = self.max_queue.get(request.priority)
+            queued = sum(r.priority == request.priority for r in self._pending)
+            if limit is not None and queued >= limit:
+                self.requests_rejected += 1
+                raise QueueFull(
+                    f"{request.priority} queue is full ({limit} requests waiting)",
+                    retry_after=self._retry_after(request.priority),
+                )
+            self._pending.append(request)
+            self._cond.notify()
+
+        return request.future
+
+    def generate(self, prompt: str, **kwargs):
+        """Blocking convenience wrapper around `submit()`."""
+        return self.submit(prompt, **kwargs).result()
+
+    def queue_depth(self, priority: str = None) -> int:
+        """Number of requests waiting to be dispatched (of one class, if given)."""
+        with self._cond:
+            return sum(priority is None or r.priority == priority for r in self._pending)
+
+    def _retry_after(self, priority: str) -> int:
+        """Seconds until the requests ahead of a new `priority` request have run (caller holds the lock)."""
+        rank = PRIORITIES.index(priority)
+        ahead = sum(PRIORITIES.index(r.priority) <= rank for r in self._pending)
+        batches = ahead / (self.max_batch_size * len(self._workers))
+        return max(1, math.ceil(batches * (self.batch_seconds or 1.0)))
+
+    def stats(self) -> dict:
+        """Counters describing how well requests are being batched."""
+        avg = self.requests_run / self.batches_run if self.batches_run else 0.0
+        return {
+            'queue_depth': self.queue_depth(),
+            'batches_run': self.batches_run,
+            'requests_run': self.requests_run,
+            'requests_expired': self.requests_expired,
+            'requests_rejected': self.requests_rejected,
+            'queue_depth_by_priority': {p: self.queue_depth(p) for p in PRIORITIES},
+            'avg_batch_size': round(avg, 2),
+        }
+
+    def close(self, timeout: float = None):
+        """Stop accepting work, drain the queue and join the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self):
+        """Worker loop: form batches and execute them until closed."""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._execute(batch)
+
+    def _next_batch(self):
+        """Block until a batch is ready to dispatch (None once closed and drained)."""
+        with self._cond:
+            while True:
+                self._expire(time.monotonic())
+
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+                    continue
+
+                # The oldest request of the highest waiting class decides
+                # which settings run next; lower classes fill spare slots
+                oldest = min(self._pending, key=_Request.rank)
+                if oldest.call is not None:
+                    self._pending.remove(oldest)
+                    return [oldest]
+                limit = self._batch_limit(oldest.key)
+                batch = [r for r in self._pending if r.key == oldest.key and r.call is None]
+                batch = sorted(batch, key=_Request.rank)[:limit]
+
+                now = time.monotonic()
+                deadline = oldest.enqueued_at + self.batch_window
+                if len(batch) >= limit or now >= deadline or self._closed:
+                    for request in batch:
+                        self._pending.remove(request)
+                    return batch
+
+                self._cond.wait(deadline - now)
+
+    def _batch_limit(self, key: tuple) -> int:
+        """Largest batch to form for these settings."""
+        if self.admission is None:
+            return self.max_batch_size
+        width, height = key[2], key[3]
+        return self.admission.max_batch_size(width, height, limit=self.max_batch_size)
+
+    def _expire(self, now: float):
+        """Fail queued requests whose deadline has passed."""
+        expired = [r for r in self._pending if now > r.deadline]
+        for request in expired:
+            self._pending.remove(request)
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(self._deadline_error(request, now))
+        self.requests_expired += len(expired)
+
+    @staticmethod
+    def _deadline_error(request: _Request, now: float) -> QueueTimeout:
+        return QueueTimeout(
+            f"Deadline passed after {now - request.enqueued_at:.1f}s in queue, request dropped"
+        )
+
+    def _drop_expired(self, batch: list[_Request]) -> list[_Request]:
+        """Fail dispatched requests whose deadline passed before inference started."""
+        now = time.monotonic()
+        expired = [r for r in batch if now > r.deadline]
+        for request in expired:
+            request.future.set_exception(self._deadline_error(request, now))
+        if expired:
+            with self._cond:
+                self.requests_expired += len(expired)
+        return [r for r in batch if now <= r.deadline]
+
+    def _execute(self, batch: list[_Request]):
+        """Run one batch through the generator and resolve its futures."""
+        # Drop requests whose callers cancelled while they were queued
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        for request in [r for r in batch if r.cancelled()]:
+            request.future.set_exception(GenerationCancelled("Cancelled before start"))
+            batch.remove(request)
+        batch = self._drop_expired(batch)
+        if not batch:
+            return
+        if batch[0].call is not None:
+            self._execute_call(batch[0])
+            return
+
+        num_inference_steps, guidance_scale, width, height, model = batch[0].key
+        # Only a ModelRegistry takes `model`; plain generators serve one model
+        model_kwargs = {'model': model} if model is not None else {}
+
+        # Seeded repeats finish straight from the result cache
+        for request in [r for r in batch if r.seed is not None]:
+            image = self.generator.cached_result(
+                request.prompt, num_inference_steps, guidance_scale,
+                width, height, request.seed, **model_kwargs,
+            )
+            if image is not None:
+                request.future.set_result(image)
+                batch.remove(request)
+        if not batch:
+            return
+
+        def step_callback(step, total_steps, latents):
+            # Abort the pipeline once nobody is waiting for this batch
+            if all(r.cancelled() for r in batch):
+                raise GenerationCancelled(f"Cancelled at step {step}/{total_steps}")
+
+            # Rows only line up when nothing was served from the cache
+            if latents.shape[0] != len(batch):
+                return
+
+            for index, request in enumerate(batch):
+                if request.on_step is None or request.cancelled():
+                    continue
+                try:
+                    request.on_step(step, total_steps, latents[index:index + 1])
+                except Exception as e:
+                    # Progress reporting must never fail the generation
+                    print(f"WARNING: step callback failed: {e}")
+
+        reservation = nullcontext()
+        if self.admission is not None:
+            reservation = self.admission.reserve(width, height, len(batch))
+
+        try:
+            with reservation:
+                # Waiting for memory may have outlasted some deadlines
+                batch = self._drop_expired(batch)
+                if not batch:
+                    return
+                seeds = None
+                if any(r.seed is not None for r in batch):
+                    seeds = [r.seed for r in batch]
+                start = time.perf_counter()
+                images = self.generator.generate_batch(
+                    [r.prompt for r in batch],
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    width=width,
+                    height=height,
+                    step_callback=step_callback,
+                    seeds=seeds,
+                    **model_kwargs,
+                )
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self._record_batch(len(batch), time.perf_counter() - start)
+        for request, image in zip(batch, images):
+            if request.cancelled():
+                request.future.set_exception(GenerationCancelled("Cancelled while running"))
+            else:
+                request.future.set_result(image)
+
+    def _execute_call(self, request: _Request):
+        """Run a `submit_call()` request and resolve its future."""
+        method, kwargs, batch_size = request.call
+        reservation = nullcontext()
+        if self.admission is not None:
+            reservation = self.admission.reserve(kwargs['width'], kwargs['height'], batch_size)
+
+        try:
+            with reservation:
+                if not self._drop_expired([request]):
+                    return
+                start = time.perf_counter()
+                result = getattr(self.generator, method)(**kwargs)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+
+        self._record_batch(1, time.perf_counter() - start)
+        request.future.set_result(result)
+
+    def _record_batch(self, size: int, seconds: float):
+        with self._cond:
+            self.batches_run += 1
+            self.requests_run += size
+            if self.batch_seconds is None:
+                self.batch_seconds = seconds
+            else:
+                self.batch_seconds = 0.8 * self.batch_seconds + 0.2 * seconds
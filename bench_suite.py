@@ -0,0 +1,256 @@
+"""
+Offline Benchmark Suite
+-----------------------
+Per-stage timings of the whole generation path, measured against the
+tiny random-weight pipeline (tiny_pipeline.py) so it runs offline in
+seconds and tracks code overhead rather than model size:
+
+    text_encode      CLIP text encoder (prompt cache cleared every run)
+    unet_step_<n>    each UNet forward, one per denoising step
+    vae_decode       VAE decoder
+    png_encode       PNG encoding, per image
+    pipeline_total   the whole generate_batch() call
+    http_request     POST /generate through the Flask test client
+    http_overhead    http_request minus the generate_batch() call inside it
+
+Stages are timed with forward hooks on the pipeline modules, so the
+generator code runs unmodified. Every value is the median over the
+repeats, in milliseconds. Results are written as JSON and two runs can
+be compared; the compare command fails on regressions:
+
+    python benchmark.py suite -o before.json
+    python benchmark.py suite -o after.json
+    python benchmark.py compare before.json after.json --threshold 0.15
+"""
+
+import json
+import platform
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+
+from image_codec import encode_image
+
+DEFAULT_BATCH_SIZES = (1, 2, 4)
+DEFAULT_RESOLUTIONS = (256, 512)
+
+
+class StageTimer:
+    """
+    Records the wall time of every forward call of the timed pipeline
+    modules, via forward pre/post hooks.
+    """
+
+    def __init__(self, pipe):
+        self.calls = defaultdict(list)
+        self._started = {}
+        self._handles = []
+        modules = {
+            'text_encode': pipe.text_encoder,
+            'unet': pipe.unet,
+            'vae_decode': pipe.vae.decoder,
+        }
+        for stage, module in modules.items():
+            self._handles.append(module.register_forward_pre_hook(partial(self._start, stage)))
+            self._handles.append(module.register_forward_hook(partial(self._stop, stage)))
+
+    def _start(self, stage, module, args):
+        self._started[stage] = time.perf_counter()
+
+    def _stop(self, stage, module, args, output):
+        self.calls[stage].append((time.perf_counter() - self._started.pop(stage)) * 1000)
+
+    def reset(self):
+        self.calls = defaultdict(list)
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+
+
+def _median(samples: dict) -> dict:
+    return {stage: round(statistics.median(values), 3) for stage, values in samples.items()}
+
+
+def bench_pipeline(generator, timer, batch_size, size, steps, repeats) -> dict:
+    """Median per-stage timings of one batch size / resolution."""
+    prompts = [f"anime benchmark character {i}" for i in range(batch_size)]
+    settings = dict(num_inference_steps=steps, width=size, height=size)
+    seeds = list(range(batch_size))
+    generator.generate_batch(prompts, seeds=seeds, **settings)  # warm-up
+
+    samples = defaultdict(list)
+    for _ in range(repeats):
+        generator.prompt_cache.clear()
+        timer.reset()
+        start = time.perf_counter()
+        images = generator.generate_batch(prompts, seeds=seeds, **settings)
+        samples['pipeline_total'].append((time.perf_counter() - start) * 1000)
+
+        samples['text_encode'].append(sum(timer.calls['text_encode']))
+        for step, ms in enumerate(timer.calls['unet'], 1):
+            samples[f'unet_step_{step}'].append(ms)
+        samples['vae_decode'].append(sum(timer.calls['vae_decode']))
+
+        start = time.perf_counter()
+        for image in images:
+            encode_image(image, 'image/png')
+        samples['png_encode'].append((time.perf_counter() - start) * 1000 / len(images))
+
+    return _median(samples)
+
+
+def bench_http(model_dir, sizes, steps, repeats) -> dict:
+    """
+    Median POST /generate latency and its non-inference overhead.
+
+    The batch window is set to 0 so the deliberate batching wait is not
+    counted as overhead; outputs go to a temporary store.
+    """
+    import app as web
+    from output_store import OutputStore
+
+    web.MODEL_ID = str(model_dir)
+    web.OUTPUT_DIR = Path(tempfile.mkdtemp(prefix="bench_http_"))
+    web.output_store = OutputStore(web.OUTPUT_DIR)
+    web.batcher.batch_window = 0.0
+    generator = web.generator.wait()
+
+    inner = []
+    generate_batch = generator.generate_batch
+
+    def timed_generate_batch(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return generate_batch(*args, **kwargs)
+        finally:
+            inner.append((time.perf_counter() - start) * 1000)
+
+    generator.generate_batch = timed_generate_batch
+    client = web.app.test_client()
+    results = {}
+    try:
+        for size in sizes:
+            body = {'prompt': "anime benchmark hero", 'steps': steps, 'width': size, 'height': size}
+            client.post('/generate', json=body)  # warm-up
+            samples = defaultdict(list)
+            for i in range(repeats):
+                body['prompt'] = f"anime benchmark hero {i}"
+                start = time.perf_counter()
+                response = client.post('/generate', json=body)
+                total = (time.perf_counter() - start) * 1000
+                if response.status_code != 200:
+                    raise RuntimeError(f"/generate returned {response.status_code}: {response.json}")
+                samples['http_request'].append(total)
+                samples['http_overhead'].append(total - inner[-1])
+            results[f"http_{size}x{size}"] = _median(samples)
+    finally:
+        generator.generate_batch = generate_batch
+    return results
+
+
+def run_suite(
+    model_dir,
+    batch_sizes=DEFAULT_BATCH_SIZES,
+    sizes=DEFAULT_RESOLUTIONS,
+    steps: int = 2,
+    repeats: int = 5,
+    http: bool = True,
+) -> dict:
+    """
+    Run every benchmark configuration.
+
+    Args:
+        model_dir: Pipeline directory (normally the tiny pipeline)
+        batch_sizes: Batch sizes to measure
+        sizes: Square resolutions to measure
+        steps: Denoising steps per image
+        repeats: Timed runs per configuration (median reported)
+        http: Also measure POST /generate through the Flask app
+
+    Returns:
+        {'meta': {...}, 'results': {config: {stage: ms}}}
+    """
+    import diffusers
+    import torch
+    from generate_image import SDTurboGenerator
+
+    generator = SDTurboGenerator(model_id=str(model_dir), device="cpu")
+    timer = StageTimer(generator.pipe)
+    results = {}
+    try:
+        for size in sizes:
+            for batch_size in batch_sizes:
+                config = f"b{batch_size}_{size}x{size}"
+                print(f"{config}...")
+                results[config] = bench_pipeline(generator, timer, batch_size, size, steps, repeats)
+    finally:
+        timer.close()
+
+    if http:
+        print("HTTP /generate...")
+        results.update(bench_http(model_dir, sizes, steps, repeats))
+
+    return {
+        'meta': {
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'model': str(model_dir),
+            'steps': steps,
+            'repeats': repeats,
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'diffusers': diffusers.__version__,
+            'threads': torch.get_num_threads(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def compare_results(
+    baseline: dict,
+    current: dict,
+    threshold: float = 0.15,
+    min_delta_ms: float = 0.5,
+) -> list[dict]:
+    """
+    Compare two suite runs stage by stage and print the changes.
+
+    A stage regresses when it is more than `threshold` (relative) and
+    `min_delta_ms` (absolute, to ignore noise on tiny stages) slower.
+
+    Returns:
+        The regressions (empty if none)
+    """
+    regressions = []
+    print(f"{'config':<16}{'stage':<16}{'baseline':>10}{'current':>10}{'change':>9}")
+    for config, stages in baseline['results'].items():
+        for stage, before in stages.items():
+            after = current['results'].get(config, {}).get(stage)
+            if after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            regressed = change > threshold and after - before > min_delta_ms
+            marker = "  REGRESSION" if regressed else ""
+            print(f"{config:<16}{stage:<16}{before:>10.2f}{after:>10.2f}{change:>+9.1%}{marker}")
+            if regressed:
+                regressions.append({
+                    'config': config, 'stage': stage,
+                    'baseline_ms': before, 'current_ms': after, 'change': round(change, 3),
+                })
+    return regressions
+
+
+def load_results(path) -> dict:
+    """Read a suite JSON file."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results: dict, path):
+    """Write suite results as JSON."""
+    Path(path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {path}")
@@ -0,0 +1,311 @@
+"""
+Performance Benchmarks
+----------------------
+Offline micro-benchmarks for the serving hot path. `pool` and `profile`
+load a model (pass --model-id to point them at a local checkpoint);
+`suite` runs per-stage timings on a tiny random-weight pipeline.
+
+Usage:
+    python benchmark.py response    # /generate response: old vs single-encode path
+    python benchmark.py pool --workers 4
+                                    # WorkerPool vs single process, images/second
+    python benchmark.py profile --profile fast-cpu [--quantize]
+                                    # CPU profile vs baseline: speedup, memory, PSNR
+    python benchmark.py suite -o after.json
+                                    # per-stage timings (offline, see bench_suite.py)
+    python benchmark.py compare before.json after.json
+                                    # exit 1 if any stage regressed
+    python benchmark.py tiled --sizes 512,1024,2048
+                                    # peak memory vs resolution: direct vs tiled
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from bench_suite import (
+    DEFAULT_BATCH_SIZES, DEFAULT_RESOLUTIONS, compare_results, load_results, run_suite,
+    save_results,
+)
+from cpu_profiles import PROFILES, compare_to_baseline, inference_context
+from image_codec import encode_image
+from memory import track_peak
+from tiny_pipeline import TINY_PIPELINE_DIR, build_tiny_pipeline
+from worker_pool import WorkerPool
+
+SAMPLE_IMAGE = Path("test_outputs/test_generation.png")
+
+
+def _cpu_ms(fn, iterations: int) -> float:
+    """Average CPU time of `fn()` in milliseconds."""
+    fn()  # warm-up
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1000
+
+
+def bench_response(args):
+    """Compare the legacy double-PNG + base64 response with the new paths."""
+    image = Image.open(args.image).convert("RGB")
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_response_"))
+    results = {}
+
+    def legacy():
+        # Old /generate: PNG to disk, PNG again to memory, base64 into JSON
+        image.save(str(out_dir / "legacy.png"), format="PNG")
+        buffered = BytesIO()
+        image.save(buffered, format="PNG")
+        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return json.dumps({'success': True, 'image': f'data:image/png;base64,{img_str}'})
+
+    def url_json():
+        data = encode_image(image, 'image/png')
+        (out_dir / "new.png").write_bytes(data)
+        return json.dumps({'success': True, 'url': '/outputs/anime_1.png'})
+
+    def binary(mimetype):
+        def run():
+            data = encode_image(image, mimetype, quality=args.quality)
+            (out_dir / "new.bin").write_bytes(data)
+            return data
+        return run
+
+    cases = {
+        'legacy (2x PNG + base64 JSON)': legacy,
+        'json + url (1x PNG)': url_json,
+        'binary image/png': binary('image/png'),
+        'binary image/webp': binary('image/webp'),
+        'binary image/jpeg': binary('image/jpeg'),
+    }
+
+    print(f"Image: {args.image} {image.size[0]}x{image.size[1]}, "
+          f"{args.iterations} iterations, quality={args.quality}\n")
+    print(f"{'path':<32}{'cpu ms':>10}{'response bytes':>16}")
+    for name, fn in cases.items():
+        cpu = _cpu_ms(fn, args.iterations)
+        size = len(fn())
+        results[name] = {'cpu_ms': round(cpu, 2), 'response_bytes': size}
+        print(f"{name:<32}{cpu:>10.2f}{size:>16,}")
+
+    return results
+
+
+def bench_pool(args):
+    """Aggregate images/second: one process with every core vs a WorkerPool."""
+    from generate_image import SDTurboGenerator
+
+    prompts = [f"anime character concept sheet, variation {i}" for i in range(args.images)]
+    batches = [prompts[i:i + args.batch_size] for i in range(0, len(prompts), args.batch_size)]
+    settings = dict(
+        num_inference_steps=args.steps, width=args.size, height=args.size,
+    )
+    results = {}
+
+    print("Single process baseline...")
+    generator = SDTurboGenerator(model_id=args.model_id, device="cpu")
+    generator.generate_batch(batches[0], **settings)  # warm-up
+    start = time.perf_counter()
+    for batch in batches:
+        generator.generate_batch(batch, **settings)
+    elapsed = time.perf_counter() - start
+    results['single'] = {'seconds': round(elapsed, 2), 'images_per_s': round(len(prompts) / elapsed, 3)}
+    del generator
+
+    print(f"\nWorkerPool with {args.workers} processes...")
+    with WorkerPool(num_workers=args.workers, model_id=args.model_id, device="cpu") as pool:
+        # Warm up every worker before timing
+        for future in [pool.submit_batch(batches[0], **settings) for _ in range(args.workers)]:
+            future.result()
+        start = time.perf_counter()
+        for future in [pool.submit_batch(batch, **settings) for batch in batches]:
+            future.result()
+        elapsed = time.perf_counter() - start
+    results['pool'] = {'seconds': round(elapsed, 2), 'images_per_s': round(len(prompts) / elapsed, 3)}
+
+    speedup = results['pool']['images_per_s'] / results['single']['images_per_s']
+    results['speedup'] = round(speedup, 2)
+
+    print(f"\n{args.images} images, batch {args.batch_size}, {args.steps} steps, {args.size}px")
+    print(f"{'mode':<24}{'seconds':>10}{'images/s':>12}")
+    print(f"{'single process':<24}{results['single']['seconds']:>10.2f}{results['single']['images_per_s']:>12.3f}")
+    print(f"{f'pool x{args.workers}':<24}{results['pool']['seconds']:>10.2f}{results['pool']['images_per_s']:>12.3f}")
+    print(f"Speedup: {speedup:.2f}x")
+    return results
+
+
+def bench_profile(args):
+    """Speedup and correctness of a CPU performance profile vs baseline."""
+    report = compare_to_baseline(
+        args.profile,
+        model_id=args.model_id,
+        num_inference_steps=args.steps,
+        width=args.size,
+        height=args.size,
+        repeats=args.repeats,
+        quantize=args.quantize,
+    )
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def bench_suite(args):
+    """Per-stage timings across batch sizes and resolutions, saved as JSON."""
+    model_dir = args.model_id or build_tiny_pipeline(TINY_PIPELINE_DIR)
+    results = run_suite(
+        model_dir,
+        batch_sizes=[int(b) for b in args.batch_sizes.split(",")],
+        sizes=[int(s) for s in args.sizes.split(",")],
+        steps=args.steps,
+        repeats=args.repeats,
+        http=not args.no_http,
+    )
+    save_results(results, args.output)
+    return results
+
+
+def bench_compare(args):
+    """Fail (exit 1) if any stage regressed beyond the threshold."""
+    regressions = compare_results(
+        load_results(args.baseline),
+        load_results(args.current),
+        threshold=args.threshold,
+        min_delta_ms=args.min_delta_ms,
+    )
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+def _measure_generation(model_id, mode, size, steps, tile_size, tile_overlap) -> dict:
+    """
+    One generation in a fresh process (so earlier runs' allocator caches
+    do not hide its peak): seconds and peak memory above the loaded model.
+    """
+    from generate_image import SDTurboGenerator
+
+    generator = SDTurboGenerator(model_id=model_id, device="cpu")
+    generator.warmup(num_inference_steps=1, width=128, height=128)
+
+    start = time.perf_counter()
+    with track_peak() as peak:
+        if mode == "direct":
+            # The raw pipeline: generate() would refuse sizes that do not fit
+            with inference_context(generator.profile):
+                generator.pipe(
+                    prompt="anime city skyline, detailed", num_inference_steps=steps,
+                    guidance_scale=0.0, width=size, height=size,
+                )
+        else:
+            generator.generate_tiled(
+                "anime city skyline, detailed", width=size, height=size,
+                num_inference_steps=steps, seed=0, tile_size=tile_size, tile_overlap=tile_overlap,
+            )
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': round(seconds, 2),
+        'peak_mib': round(peak.bytes / 1024 ** 2) if peak.bytes is not None else None,
+    }
+
+
+def bench_tiled(args):
+    """Peak memory and time against resolution, direct vs tiled."""
+    model_id = args.model_id or str(build_tiny_pipeline(TINY_PIPELINE_DIR))
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = []
+
+    # One process per measurement, spawned fresh every time
+    ctx = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for mode in ("direct", "tiled"):
+            if mode == "direct" and size > args.max_direct:
+                continue
+            print(f"{mode} {size}x{size}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                result = executor.submit(
+                    _measure_generation,
+                    model_id, mode, size, args.steps, args.tile_size, args.tile_overlap,
+                ).result()
+            results.append({'mode': mode, 'size': size, **result})
+
+    print(f"\n{args.steps} steps, {args.tile_size}px tiles overlapping by {args.tile_overlap}px")
+    print(f"{'mode':<10}{'size':>8}{'seconds':>10}{'peak MiB':>10}")
+    for result in results:
+        peak = result['peak_mib'] if result['peak_mib'] is not None else "n/a"
+        print(f"{result['mode']:<10}{result['size']:>8}{result['seconds']:>10.2f}{peak:>10}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    response = commands.add_parser("response", help="Response encoding cost")
+    response.add_argument("--image", default=str(SAMPLE_IMAGE))
+    response.add_argument("--iterations", type=int, default=20)
+    response.add_argument("--quality", type=int, default=90)
+    response.set_defaults(func=bench_response)
+
+    pool = commands.add_parser("pool", help="Multi-process pool throughput")
+    pool.add_argument("--model-id", default="stabilityai/sd-turbo")
+    pool.add_argument("--workers", type=int, default=2)
+    pool.add_argument("--images", type=int, default=32)
+    pool.add_argument("--batch-size", type=int, default=4)
+    pool.add_argument("--steps", type=int, default=1)
+    pool.add_argument("--size", type=int, default=512)
+    pool.set_defaults(func=bench_pool)
+
+    profile = commands.add_parser("profile", help="CPU performance profile vs baseline")
+    profile.add_argument("--profile", choices=list(PROFILES), default="fast-cpu")
+    profile.add_argument("--model-id", default="stabilityai/sd-turbo")
+    profile.add_argument("--steps", type=int, default=1)
+    profile.add_argument("--size", type=int, default=512)
+    profile.add_argument("--repeats", type=int, default=3)
+    profile.add_argument("--quantize", action="store_true", help="Also use int8 dynamic quantization")
+    profile.set_defaults(func=bench_profile)
+
+    suite = commands.add_parser("suite", help="Per-stage timings on the tiny offline pipeline")
+    suite.add_argument("--model-id", help="Pipeline directory (default: build the tiny pipeline)")
+    suite.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_BATCH_SIZES)))
+    suite.add_argument("--sizes", default=",".join(map(str, DEFAULT_RESOLUTIONS)))
+    suite.add_argument("--steps", type=int, default=2)
+    suite.add_argument("--repeats", type=int, default=5)
+    suite.add_argument("--no-http", action="store_true", help="Skip the /generate measurements")
+    suite.add_argument("-o", "--output", default="bench_results.json")
+    suite.set_defaults(func=bench_suite)
+
+    compare = commands.add_parser("compare", help="Compare two suite results")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.15,
+                         help="Relative slowdown that counts as a regression")
+    compare.add_argument("--min-delta-ms", type=float, default=0.5,
+                         help="Ignore absolute changes smaller than this")
+    compare.set_defaults(func=bench_compare)
+
+    tiled = commands.add_parser("tiled", help="Peak memory vs resolution, direct vs tiled")
+    tiled.add_argument("--model-id", help="Model id or directory (default: the tiny pipeline)")
+    tiled.add_argument("--sizes", default="512,1024,2048")
+    tiled.add_argument("--steps", type=int, default=1)
+    tiled.add_argument("--tile-size", type=int, default=512)
+    tiled.add_argument("--tile-overlap", type=int, default=128)
+    tiled.add_argument("--max-direct", type=int, default=1024,
+                       help="Largest size also generated without tiling")
+    tiled.set_defaults(func=bench_tiled)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Pytest Configuration
+--------------------
+Tests run offline, on stand-in generators or on the tiny random-weight
+pipeline (tiny_pipeline.py), so they need no downloads and no GPU:
+
+    python -m pytest -q
+
+test_system.py is a standalone demo script that downloads SD-Turbo
+(`python test_system.py`), so pytest does not collect it.
+"""
+
+import pytest
+
+collect_ignore = ["test_system.py"]
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """Directory of the tiny pipeline, built once per session."""
+    from tiny_pipeline import build_tiny_pipeline
+
+    return str(build_tiny_pipeline(tmp_path_factory.mktemp("models") / "tiny-sd"))
+
+
+@pytest.fixture(scope="session")
+def tiny_generator(tiny_model):
+    """SDTurboGenerator on the tiny pipeline (CPU)."""
+    from generate_image import SDTurboGenerator
+
+    return SDTurboGenerator(model_id=tiny_model, device="cpu")
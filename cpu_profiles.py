@@ -0,0 +1,219 @@
+"""
+CPU Performance Profiles
+------------------------
+Selectable execution settings for SDTurboGenerator on hosts without CUDA:
+
+    baseline   float32 eager, no_grad (the original behaviour)
+    fast-cpu   bf16 autocast (if the CPU supports it), channels_last,
+               inference_mode
+    max-cpu    fast-cpu + torch.compile of the UNet and VAE decoder
+
+bf16 autocast changes the numerics slightly, so `compare_to_baseline()`
+generates the same seeded images under the baseline and the chosen
+profile, checks they agree (PSNR) and reports the speedup:
+
+    python benchmark.py profile --profile fast-cpu
+"""
+
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class PerfProfile:
+    """Execution settings applied to a pipeline."""
+    name: str
+    bf16_autocast: bool = False
+    channels_last: bool = False
+    compile: bool = False
+    inference_mode: bool = False
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        PerfProfile("baseline"),
+        PerfProfile("fast-cpu", bf16_autocast=True, channels_last=True, inference_mode=True),
+        PerfProfile(
+            "max-cpu", bf16_autocast=True, channels_last=True, compile=True, inference_mode=True
+        ),
+    )
+}
+
+# Minimum PSNR (dB) against the baseline for a profile to pass the check
+MIN_PSNR_FP32 = 40.0
+MIN_PSNR_BF16 = 25.0
+MIN_PSNR_INT8 = 20.0
+
+
+def get_profile(name: str) -> PerfProfile:
+    """Look up a profile by name."""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown profile {name!r} (choose from {', '.join(PROFILES)})") from None
+
+
+def cpu_supports_bf16() -> bool:
+    """True if oneDNN has fast bf16 kernels for this CPU (AVX512-BF16 / AMX)."""
+    import torch
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def apply_profile(pipe, profile: PerfProfile) -> PerfProfile:
+    """
+    Apply a profile's module-level settings to a CPU pipeline.
+
+    Args:
+        pipe: Loaded diffusers pipeline
+        profile: Requested profile
+
+    Returns:
+        The effective profile (bf16 is dropped on CPUs without bf16 support)
+    """
+    import torch
+
+    if profile.bf16_autocast and not cpu_supports_bf16():
+        print("WARNING: CPU has no fast bf16 support, staying in float32")
+        profile = replace(profile, bf16_autocast=False)
+
+    if profile.channels_last:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+
+    if profile.compile:
+        # Fall back to eager instead of failing if inductor cannot build
+        torch._dynamo.config.suppress_errors = True
+        pipe.unet = torch.compile(pipe.unet)
+        pipe.vae.decoder = torch.compile(pipe.vae.decoder)
+
+    enabled = [
+        label for label, on in (
+            ("bf16 autocast", profile.bf16_autocast),
+            ("channels_last", profile.channels_last),
+            ("torch.compile", profile.compile),
+            ("inference_mode", profile.inference_mode),
+        ) if on
+    ]
+    print(f"Performance profile: {profile.name} ({', '.join(enabled) or 'float32 eager'})")
+    return profile
+
+
+@contextmanager
+def inference_context(profile: PerfProfile):
+    """Grad mode and autocast for one pipeline call under `profile`."""
+    import torch
+
+    with ExitStack() as stack:
+        stack.enter_context(torch.inference_mode() if profile.inference_mode else torch.no_grad())
+        if profile.bf16_autocast:
+            stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+        yield
+
+
+def psnr(image_a, image_b) -> float:
+    """Peak signal-to-noise ratio between two same-sized images (dB)."""
+    import numpy as np
+
+    a = np.asarray(image_a.convert("RGB"), dtype=np.float64)
+    b = np.asarray(image_b.convert("RGB"), dtype=np.float64)
+    mse = np.mean((a - b) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def _timed_run(generator, prompts, seeds, settings, repeats):
+    """Warm up, then return (images, best seconds per batch)."""
+    generator.generate_batch(prompts, seeds=seeds, **settings)  # warm-up / compile
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        images = generator.generate_batch(prompts, seeds=seeds, **settings)
+        best = min(best, time.perf_counter() - start)
+    return images, best
+
+
+def compare_to_baseline(
+    profile_name: str,
+    model_id: str = "stabilityai/sd-turbo",
+    prompts: list[str] = None,
+    num_inference_steps: int = 1,
+    width: int = 512,
+    height: int = 512,
+    repeats: int = 3,
+    **generator_kwargs,
+) -> dict:
+    """
+    Correctness check and speedup report for a profile.
+
+    Generates the same seeded batch with the fp32 baseline and the profile
+    (one generator at a time, so peak memory stays at one model).
+
+    Args:
+        profile_name: Profile to evaluate
+        **generator_kwargs: Extra SDTurboGenerator options for the
+            candidate, e.g. quantize=True
+
+    Returns:
+        Dict with timings, speedup, weight memory, per-image PSNR and `passed`
+    """
+    from generate_image import SDTurboGenerator
+    from quantization import module_bytes
+
+    def weights_bytes(generator):
+        pipe = generator.pipe
+        return sum(module_bytes(module) for module in (pipe.unet, pipe.text_encoder, pipe.vae))
+
+    prompts = prompts or [
+        "anime hero character with spiky blue hair",
+        "anime fantasy castle on clouds at sunset",
+    ]
+    seeds = list(range(len(prompts)))
+    settings = dict(num_inference_steps=num_inference_steps, width=width, height=height)
+
+    baseline = SDTurboGenerator(model_id=model_id, device="cpu", perf_profile="baseline")
+    reference, baseline_s = _timed_run(baseline, prompts, seeds, settings, repeats)
+    baseline_bytes = weights_bytes(baseline)
+    del baseline
+
+    generator = SDTurboGenerator(
+        model_id=model_id, device="cpu", perf_profile=profile_name, **generator_kwargs
+    )
+    images, profile_s = _timed_run(generator, prompts, seeds, settings, repeats)
+
+    scores = [psnr(a, b) for a, b in zip(reference, images)]
+    if generator.quantized:
+        threshold = MIN_PSNR_INT8
+    elif generator.profile.bf16_autocast:
+        threshold = MIN_PSNR_BF16
+    else:
+        threshold = MIN_PSNR_FP32
+    profile_bytes = weights_bytes(generator)
+    report = {
+        'profile': generator.profile.name + ("+int8" if generator.quantized else ""),
+        'effective': {
+            'bf16_autocast': generator.profile.bf16_autocast,
+            'channels_last': generator.profile.channels_last,
+            'compile': generator.profile.compile,
+            'inference_mode': generator.profile.inference_mode,
+            'int8': generator.quantized,
+        },
+        'baseline_weights_mb': round(baseline_bytes / 1024 ** 2, 1),
+        'profile_weights_mb': round(profile_bytes / 1024 ** 2, 1),
+        'baseline_s': round(baseline_s, 3),
+        'profile_s': round(profile_s, 3),
+        'speedup': round(baseline_s / profile_s, 2),
+        'psnr_db': [round(score, 1) for score in scores],
+        'min_psnr_db': threshold,
+        'passed': min(scores) >= threshold,
+    }
+
+    print(f"\nProfile {report['profile']}: {report['profile_s']:.3f}s vs baseline "
+          f"{report['baseline_s']:.3f}s per batch of {len(prompts)} -> {report['speedup']:.2f}x")
+    print(f"Weights: {report['profile_weights_mb']:.0f} MiB vs {report['baseline_weights_mb']:.0f} MiB")
+    print(f"PSNR vs baseline: {report['psnr_db']} dB (min {threshold} dB) - "
+          f"{'PASS' if report['passed'] else 'FAIL'}")
+    return report
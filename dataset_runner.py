@@ -0,0 +1,111 @@
+"""
+Batched Dataset Runner
+----------------------
+Shared runner for the use-case scripts: generates a whole dictionary of
+named prompts with `generate_batch`, in batches sized to fit a memory
+budget, while keeping each item's seed and output filename.
+
+Batching lets the UNet process several prompts per forward pass, which
+uses a many-core CPU (or a GPU) far better than one prompt at a time.
+PNG encoding and disk writes overlap with the next batch on a small
+thread pool. With a `WorkerPool`, all batches are queued up front so every
+worker process stays busy, and the memory budget is split between them.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from memory import available_memory_bytes, max_batch_size
+
+
+def run_dataset(
+    generator,
+    prompts: dict[str, str],
+    output_dir,
+    seeds: dict[str, int] = None,
+    num_inference_steps: int = 2,
+    width: int = 512,
+    height: int = 512,
+    filename: str = "{name}.png",
+    memory_budget: int = None,
+    max_batch: int = 8,
+) -> dict:
+    """
+    Generate every prompt in `prompts` and save it as `output_dir/filename`.
+
+    Args:
+        generator: SDTurboGenerator (anything with `generate_batch(seeds=...)`)
+        prompts: Mapping of item name -> prompt, generated in order
+        output_dir: Directory for the images (created if missing)
+        seeds: Optional mapping of item name -> seed (missing = unseeded)
+        num_inference_steps: Denoising steps per image
+        width: Output image width
+        height: Output image height
+        filename: Output filename template, formatted with `name`
+        memory_budget: Bytes available for activations (default: half of
+            the currently free RAM)
+        max_batch: Upper bound on the batch size
+
+    Returns:
+        Summary dict with counts, batch size and timings
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    seeds = seeds or {}
+
+    if memory_budget is None:
+        memory_budget = available_memory_bytes() // 2
+    # Each pool worker runs its own batch at the same time
+    workers = getattr(generator, "num_workers", 1)
+    batch_size = max_batch_size(
+        memory_budget // workers, width, height, generator.dtype_bytes, limit=max_batch
+    )
+
+    names = list(prompts)
+    total = len(names)
+    print(f"Batch size {batch_size} (memory budget {memory_budget / 1024 ** 3:.1f} GiB)\n")
+
+    batches = [names[i:i + batch_size] for i in range(0, total, batch_size)]
+
+    def batch_args(batch):
+        return [prompts[name] for name in batch], dict(
+            num_inference_steps=num_inference_steps,
+            width=width,
+            height=height,
+            seeds=[seeds.get(name) for name in batch],
+        )
+
+    start_time = time.time()
+    if hasattr(generator, "submit_batch"):
+        # Queue every batch up front so all worker processes have work
+        pending = []
+        for batch in batches:
+            batch_prompts, kwargs = batch_args(batch)
+            pending.append(generator.submit_batch(batch_prompts, **kwargs))
+        outputs = (future.result() for future in pending)
+    else:
+        outputs = (
+            generator.generate_batch(batch_prompts, **kwargs)
+            for batch_prompts, kwargs in map(batch_args, batches)
+        )
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="dataset-writer") as writer:
+        saves = []
+        for offset, batch, images in zip(range(0, total, batch_size), batches, outputs):
+            for i, (name, image) in enumerate(zip(batch, images), offset + 1):
+                output_path = output_dir / filename.format(name=name)
+                saves.append(writer.submit(image.save, output_path))
+                print(f"[{i}/{total}] {name}")
+                print(f"    ✓ Saved: {output_path}")
+
+        for save in saves:
+            save.result()
+
+    total_time = time.time() - start_time
+    return {
+        'images': total,
+        'batch_size': batch_size,
+        'total_time': total_time,
+        'avg_time': total_time / total if total else 0.0,
+    }
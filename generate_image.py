@@ -6,14 +6,58 @@ for ultra-fast image generation on local GPU.
 
 Model: stabilityai/sd-turbo
 Optimizations: FP16, xFormers, 1-4 inference steps
+
+torch and diffusers are imported when a generator is created, not when
+this module is imported, so tools that only need the class stay fast.
 """
 
-import torch
-from diffusers import AutoPipelineForText2Image
 from PIL import Image
+import random
 import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from prompt_cache import PromptEmbeddingCache
+from cpu_profiles import apply_profile, get_profile, inference_context
+from quantization import QUANT_CACHE_DIR, load_quantized, quantize_pipeline
+from metrics import instrument_pipeline
+from memory import (
+    DEFAULT_BUDGET_FRACTION, InsufficientMemory, MemoryEstimator, available_memory_bytes,
+    track_peak,
+)
+
+
+def slerp(a: "torch.Tensor", b: "torch.Tensor", t) -> "torch.Tensor":
+    """
+    Spherical interpolation between noise tensors, per batch item.
+
+    Unlike a straight lerp, the result keeps the norm of Gaussian noise,
+    so every point along the way is valid initial noise (a lerp halfway
+    between two seeds gives washed-out images).
+
+    Args:
+        a: (B, ...) start tensors (B may be 1 to broadcast)
+        b: (B, ...) end tensors
+        t: Interpolation weight, a float or a (B,) tensor of weights
+
+    Returns:
+        Interpolated tensors in the dtype of `a`
+    """
+    dims = tuple(range(1, a.dim()))
+    a32, b32 = a.float(), b.float()
+    if hasattr(t, "reshape"):
+        t = t.float().reshape(-1, *[1] * len(dims))
+
+    cos = (a32 * b32).sum(dims, keepdim=True) / (
+        (a32 * a32).sum(dims, keepdim=True) * (b32 * b32).sum(dims, keepdim=True)
+    ).sqrt()
+    omega = cos.clamp(-1, 1).acos()
+    sin_omega = omega.sin()
+    spherical = (((1 - t) * omega).sin() * a32 + (t * omega).sin() * b32) / sin_omega
+    # (Nearly) parallel inputs: fall back to lerp
+    linear = (1 - t) * a32 + t * b32
+    return spherical.where(sin_omega.abs() > 1e-6, linear).to(a.dtype)
+
 
 class SDTurboGenerator:
     """
@@ -23,14 +67,42 @@ class SDTurboGenerator:
     high-quality images in just 1-4 steps (vs 20-50 for standard SD).
     """
     
-    def __init__(self, model_id: str = "stabilityai/sd-turbo", device: str = "cuda"):
+    def __init__(
+        self,
+        model_id: str = "stabilityai/sd-turbo",
+        device: str = "cuda",
+        prompt_cache_size: int = 256,
+        prompt_cache_bytes: int = 64 * 1024 ** 2,
+        result_cache=None,
+        local_files_only: bool = False,
+        perf_profile: str = "baseline",
+        quantize: bool = False,
+        quant_cache_dir=QUANT_CACHE_DIR,
+        memory_estimator: MemoryEstimator = None,
+    ):
         """
         Initialize the SD-Turbo pipeline with optimizations.
         
         Args:
-            model_id: Hugging Face model identifier
+            model_id: Hugging Face model identifier, or a local directory of
+                weights written by `save_weights()` (loaded with no Hub lookups)
             device: Device to run inference on ('cuda' or 'cpu')
+            prompt_cache_size: Max prompts kept in the embedding cache (0 disables)
+            prompt_cache_bytes: Max memory used by cached prompt embeddings
+            result_cache: Optional ResultCache consulted for seeded requests
+            local_files_only: Never contact the Hub; load from the local
+                Hugging Face cache only
+            perf_profile: CPU performance profile - "baseline", "fast-cpu"
+                or "max-cpu" (see cpu_profiles.py; ignored on CUDA)
+            quantize: Use int8 dynamic quantization for the UNet and text
+                encoder (CPU only; see quantization.py)
+            quant_cache_dir: Where quantized components are cached
+            memory_estimator: MemoryEstimator calibrated by this generator's
+                pipeline calls (pass one to share it, e.g. with MemoryAdmission)
         """
+        import torch
+        from diffusers import AutoPipelineForText2Image
+        
         # Auto-detect device if CUDA not available
         if device == "cuda" and not torch.cuda.is_available():
             print("WARNING: CUDA not available, using CPU (slower)")
@@ -42,19 +114,33 @@ class SDTurboGenerator:
         print(f"Loading {model_id}...")
         print(f"Device: {device}")
         
+        # A local directory is already converted: no Hub lookups, no variant
+        local_dir = Path(model_id).is_dir()
+        load_kwargs = {'local_files_only': local_files_only or local_dir}
+        
         # Load pipeline with FP16 precision for faster inference (only on CUDA)
         if device == "cuda":
             self.pipe = AutoPipelineForText2Image.from_pretrained(
                 model_id,
                 torch_dtype=torch.float16,
-                variant="fp16",
+                **({} if local_dir else {'variant': "fp16"}),
+                **load_kwargs,
             )
         else:
-            # CPU mode - use float32
+            # CPU mode - use float32 (cached int8 UNet / text encoder if quantizing)
+            quantized = load_quantized(model_id, quant_cache_dir) if quantize else {}
             self.pipe = AutoPipelineForText2Image.from_pretrained(
                 model_id,
                 torch_dtype=torch.float32,
+                **quantized,
+                **load_kwargs,
             )
+            if quantize and not quantized:
+                quantize_pipeline(self.pipe, model_id, quant_cache_dir)
+        
+        if quantize and device != "cpu":
+            print(f"WARNING: int8 quantization is CPU-only, ignored on {device}")
+        self.quantized = quantize and device == "cpu"
         
         self.pipe = self.pipe.to(device)
         
@@ -69,8 +155,216 @@ class SDTurboGenerator:
         # Disable safety checker for speed (optional - enable in production)
         self.pipe.safety_checker = None
         
+        # CPU speedups: bf16 autocast, channels_last, torch.compile, inference_mode
+        self.profile = get_profile(perf_profile)
+        if device == "cpu":
+            self.profile = apply_profile(self.pipe, self.profile)
+        elif self.profile.name != "baseline":
+            print(f"WARNING: {perf_profile} is a CPU profile, ignored on {device}")
+            self.profile = get_profile("baseline")
+        
+        # Per-stage timings (text encode, denoising steps, VAE decode) for /metrics
+        instrument_pipeline(self.pipe)
+        
+        # bf16 and int8 change the pixels slightly, so they get their own cache entries
+        self.cache_namespace = (
+            model_id
+            + ("+bf16" if self.profile.bf16_autocast else "")
+            + ("+int8" if self.quantized else "")
+        )
+        
+        # Cache CLIP text-encoder outputs for prompts we have seen before
+        self.prompt_cache = PromptEmbeddingCache(
+            max_entries=prompt_cache_size,
+            max_bytes=prompt_cache_bytes,
+        )
+        
+        # On-disk cache of finished images (seeded requests only)
+        self.result_cache = result_cache
+        
+        # Peak activation memory model, calibrated by every pipeline call
+        self.memory_estimator = memory_estimator or MemoryEstimator()
+        self.memory_estimator.dtype_bytes = self.dtype_bytes
+        self.memory_estimator.device = device
+        
+        # Image-to-image pipeline over the same modules, built on first use
+        self._img2img_pipe = None
+        
         print("Model loaded successfully\n")
     
+    def encode_prompts(self, prompts: list[str]) -> "torch.Tensor":
+        """
+        Encode prompts with the CLIP text encoder, using the embedding cache.
+        
+        Each prompt is encoded on its own so a cached embedding is exactly
+        what the pipeline would have computed for that prompt. Repeated
+        prompts are encoded once per call, even with the cache disabled.
+        
+        Args:
+            prompts: List of text prompts
+            
+        Returns:
+            Tensor of prompt embeddings, one row per prompt
+        """
+        import torch
+        
+        encoded = {}
+        for prompt in prompts:
+            if prompt in encoded:
+                continue
+            cached = self.prompt_cache.get(prompt)
+            if cached is None:
+                with inference_context(self.profile):
+                    cached, _ = self.pipe.encode_prompt(
+                        prompt,
+                        device=self.device,
+                        num_images_per_prompt=1,
+                        do_classifier_free_guidance=False,
+                    )
+                self.prompt_cache.put(prompt, cached)
+            encoded[prompt] = cached
+        
+        return torch.cat([encoded[prompt] for prompt in prompts])
+    
+    def _prompt_kwargs(self, prompts: list[str], guidance_scale: float) -> dict:
+        """Pipeline text arguments: cached embeddings, or raw prompts under CFG."""
+        # Classifier-free guidance also needs negative embeddings; leave that
+        # path to the pipeline (SD-Turbo runs with guidance_scale=0.0)
+        if guidance_scale > 1.0:
+            return {'prompt': prompts}
+        return {'prompt_embeds': self.encode_prompts(prompts)}
+    
+    def _seeded_inputs(self, seeds: list, width: int, height: int) -> dict:
+        """
+        Build per-item initial latents and generators for the pipeline.
+        
+        Every item's noise comes from its own generator with shape
+        (1, C, H, W) - exactly what a batch-of-one call draws - so results
+        do not depend on batch composition or position.
+        
+        Args:
+            seeds: Seeds, torch.Generators, or None (fresh random seed)
+            width: Output image width
+            height: Output image height
+            
+        Returns:
+            Keyword arguments `latents` and `generator` for the pipeline
+        """
+        import torch
+        from diffusers.utils.torch_utils import randn_tensor
+        
+        generators = []
+        for seed in seeds:
+            if isinstance(seed, torch.Generator):
+                generators.append(seed)
+            else:
+                if seed is None:
+                    seed = random.getrandbits(63)
+                generators.append(torch.Generator(device=self.device).manual_seed(seed))
+        
+        scale = self.pipe.vae_scale_factor
+        shape = (1, self.pipe.unet.config.in_channels, height // scale, width // scale)
+        latents = torch.cat([
+            randn_tensor(
+                shape,
+                generator=generator,
+                device=torch.device(self.device),
+                dtype=self.pipe.unet.dtype,
+            )
+            for generator in generators
+        ])
+        
+        # The generators are still passed on for schedulers that draw noise
+        # during sampling (ancestral samplers)
+        return {'latents': latents, 'generator': generators}
+    
+    @property
+    def dtype_bytes(self) -> int:
+        """Bytes per element of the UNet activations (4 for fp32)."""
+        import torch
+        if self.profile.bf16_autocast:
+            return 2
+        return torch.finfo(self.pipe.unet.dtype).bits // 8
+    
+    @staticmethod
+    def _callback_kwargs(step_callback, num_inference_steps: int) -> dict:
+        """Adapt a simple step callback to diffusers' `callback_on_step_end`."""
+        if step_callback is None:
+            return {}
+        
+        def on_step_end(pipe, step_index, timestep, callback_kwargs):
+            step_callback(step_index + 1, num_inference_steps, callback_kwargs['latents'])
+            return callback_kwargs
+        
+        return {
+            'callback_on_step_end': on_step_end,
+            'callback_on_step_end_tensor_inputs': ['latents'],
+        }
+    
+    def memory_chunk_size(self, batch_size: int, width: int, height: int) -> int:
+        """
+        Largest part of a batch whose estimated peak fits in the memory
+        that is free right now.
+        
+        Raises:
+            InsufficientMemory: Not even one image fits
+        """
+        budget = int(available_memory_bytes(self.device) * DEFAULT_BUDGET_FRACTION)
+        fits = self.memory_estimator.max_batch_size(budget, width, height, limit=batch_size)
+        if fits == 0:
+            needed = self.memory_estimator.estimate(width, height)
+            raise InsufficientMemory(
+                f"A {width}x{height} image needs ~{needed / 1024 ** 2:.0f} MiB of activation "
+                f"memory, only {budget / 1024 ** 2:.0f} MiB available",
+                required=needed,
+                available=budget,
+            )
+        return fits
+    
+    @contextmanager
+    def _measure_memory(self, width: int, height: int, batch_size: int):
+        """Calibrate the memory estimator with the peak of the enclosed pipeline call."""
+        with track_peak(self.device) as peak:
+            yield
+        if peak.bytes is not None:
+            self.memory_estimator.observe(width, height, batch_size, peak.bytes)
+    
+    def result_key(
+        self,
+        prompt: str,
+        num_inference_steps: int,
+        guidance_scale: float,
+        width: int,
+        height: int,
+        seed: int,
+    ) -> str:
+        """Result-cache key for a fully specified (seeded) request."""
+        return self.result_cache.make_key(
+            self.cache_namespace, prompt, num_inference_steps, guidance_scale,
+            width, height, seed,
+        )
+    
+    def cached_result(
+        self,
+        prompt: str,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: int = None,
+    ):
+        """
+        Return a previously generated image for these settings, if cached.
+        
+        Unseeded requests are never cached and always return None.
+        """
+        if self.result_cache is None or seed is None:
+            return None
+        key = self.result_key(
+            prompt, num_inference_steps, guidance_scale, width, height, seed
+        )
+        return self.result_cache.get(key)
+    
     def generate(
         self,
         prompt: str,
@@ -78,7 +372,8 @@ class SDTurboGenerator:
         guidance_scale: float = 0.0,
         width: int = 512,
         height: int = 512,
-        seed: int = None
+        seed: int = None,
+        step_callback=None,
     ) -> Image.Image:
         """
         Generate an image from a text prompt.
@@ -90,30 +385,52 @@ class SDTurboGenerator:
             width: Output image width (default 512)
             height: Output image height (default 512)
             seed: Random seed for reproducibility
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort generation
             
         Returns:
             PIL Image object
         """
-        # Set random seed if provided
-        generator = None
+        # Seeded requests are deterministic - serve repeats from the cache
+        cached = self.cached_result(
+            prompt, num_inference_steps, guidance_scale, width, height, seed
+        )
+        if cached is not None:
+            print(f"Served from result cache ({num_inference_steps} steps)")
+            return cached
+        
+        # Seeded requests get their initial noise from the same per-item
+        # path as generate_batch, so batched results reproduce this call
+        seed_kwargs = {}
         if seed is not None:
-            generator = torch.Generator(device=self.device).manual_seed(seed)
+            seed_kwargs = self._seeded_inputs([seed], width, height)
+        
+        # Refuse up front rather than get OOM-killed mid-generation
+        self.memory_chunk_size(1, width, height)
         
         start_time = time.time()
         
         # Generate image
-        image = self.pipe(
-            prompt=prompt,
-            num_inference_steps=num_inference_steps,
-            guidance_scale=guidance_scale,
-            width=width,
-            height=height,
-            generator=generator,
-        ).images[0]
+        with self._measure_memory(width, height, 1), inference_context(self.profile):
+            image = self.pipe(
+                **self._prompt_kwargs([prompt], guidance_scale),
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+                width=width,
+                height=height,
+                **seed_kwargs,
+                **self._callback_kwargs(step_callback, num_inference_steps),
+            ).images[0]
         
         elapsed = time.time() - start_time
         print(f"Generated in {elapsed:.2f}s ({num_inference_steps} steps)")
         
+        if self.result_cache is not None and seed is not None:
+            key = self.result_key(
+                prompt, num_inference_steps, guidance_scale, width, height, seed
+            )
+            self.result_cache.put(key, image)
+        
         return image
     
     def generate_batch(
@@ -123,34 +440,547 @@ class SDTurboGenerator:
         guidance_scale: float = 0.0,
         width: int = 512,
         height: int = 512,
+        step_callback=None,
+        seeds: list[int] = None,
     ) -> list[Image.Image]:
         """
         Generate multiple images in parallel (batch processing).
         
+        A batch larger than the free memory allows is run as several
+        pipeline calls (step_callback then sees one call at a time).
+        
         Args:
             prompts: List of text prompts
             num_inference_steps: Number of denoising steps
             guidance_scale: Classifier-free guidance scale
             width: Output image width
             height: Output image height
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort generation
+            seeds: Optional per-prompt seeds or torch.Generators (None
+                entries stay unseeded). Each item's noise is drawn on its own,
+                so image k matches generate(prompts[k], seed=seeds[k]).
+                Items with int seeds are served from the result cache when
+                possible; step_callback latents then only cover the rest.
             
         Returns:
             List of PIL Image objects
+            
+        Raises:
+            InsufficientMemory: Not even one image fits in the free memory
+        """
+        if seeds is None:
+            seeds = [None] * len(prompts)
+        if len(seeds) != len(prompts):
+            raise ValueError(f"Got {len(seeds)} seeds for {len(prompts)} prompts")
+        
+        images = [
+            self.cached_result(prompt, num_inference_steps, guidance_scale, width, height, seed)
+            if isinstance(seed, int) else None
+            for prompt, seed in zip(prompts, seeds)
+        ]
+        todo = [i for i, image in enumerate(images) if image is None]
+        if not todo:
+            print(f"Served {len(images)} images from result cache")
+            return images
+        
+        # Split the batch into pipeline calls that fit in the free memory
+        chunk_size = self.memory_chunk_size(len(todo), width, height)
+        if chunk_size < len(todo):
+            print(f"Splitting {len(todo)} images into batches of {chunk_size} to fit in memory")
+        
+        start_time = time.time()
+        
+        # Encode up front: prompts repeated across chunks are encoded once
+        prompt_kwargs = self._prompt_kwargs([prompts[i] for i in todo], guidance_scale)
+        
+        generated = []
+        for offset in range(0, len(todo), chunk_size):
+            chunk = todo[offset:offset + chunk_size]
+            seed_kwargs = {}
+            if any(seeds[i] is not None for i in chunk):
+                seed_kwargs = self._seeded_inputs([seeds[i] for i in chunk], width, height)
+            
+            with self._measure_memory(width, height, len(chunk)), inference_context(self.profile):
+                generated += self.pipe(
+                    **{name: value[offset:offset + chunk_size] for name, value in prompt_kwargs.items()},
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    width=width,
+                    height=height,
+                    **seed_kwargs,
+                    **self._callback_kwargs(step_callback, num_inference_steps),
+                ).images
+        
+        elapsed = time.time() - start_time
+        print(f"Generated {len(generated)} images in {elapsed:.2f}s")
+        
+        for i, image in zip(todo, generated):
+            images[i] = image
+            if self.result_cache is not None and isinstance(seeds[i], int):
+                key = self.result_key(
+                    prompts[i], num_inference_steps, guidance_scale, width, height, seeds[i]
+                )
+                self.result_cache.put(key, image)
+        
+        return images
+    
+    def warmup(
+        self,
+        num_inference_steps: int = 1,
+        width: int = 512,
+        height: int = 512,
+    ) -> float:
+        """
+        Run one throwaway generation so the first real request does not pay
+        first-call costs (weight paging, kernel selection, allocator growth).
+        Its peak includes those one-off costs, so it does not calibrate the
+        memory estimator.
+        
+        Returns:
+            Warm-up time in milliseconds
+        """
+        start_time = time.perf_counter()
+        with inference_context(self.profile):
+            self.pipe(
+                prompt="warm-up",
+                num_inference_steps=num_inference_steps,
+                guidance_scale=0.0,
+                width=width,
+                height=height,
+            )
+        return (time.perf_counter() - start_time) * 1000
+    
+    def _tiled_inputs(self, prompt: str, guidance_scale: float, seed, width: int, height: int, tile_size: int):
+        """Prompt embeddings and a seeded torch.Generator for the tiled paths."""
+        import torch
+        
+        scale = self.pipe.vae_scale_factor
+        if width % scale or height % scale or tile_size % scale:
+            raise ValueError(f"Width, height and tile size must be multiples of {scale}")
+        
+        # Only one tile is ever in flight: it has to fit, the full image does not
+        self.memory_chunk_size(1, min(width, tile_size), min(height, tile_size))
+        
+        embeds = {'prompt_embeds': self.encode_prompts([prompt])}
+        if guidance_scale > 1.0:
+            with inference_context(self.profile):
+                embeds['prompt_embeds'], embeds['negative_prompt_embeds'] = self.pipe.encode_prompt(
+                    prompt,
+                    device=self.device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=True,
+                )
+        
+        if seed is None:
+            seed = random.getrandbits(63)
+        generator = torch.Generator(device=self.device).manual_seed(seed)
+        return embeds, generator
+    
+    def generate_tiled(
+        self,
+        prompt: str,
+        width: int = 2048,
+        height: int = 2048,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        seed: int = None,
+        tile_size: int = 512,
+        tile_overlap: int = 128,
+        step_callback=None,
+    ) -> Image.Image:
+        """
+        Generate a large image with bounded memory: the UNet and the VAE
+        decoder run on overlapping tiles that are blended together, so
+        peak activation memory depends on `tile_size`, not the output size.
+        
+        Args:
+            prompt: Text description of desired image
+            width: Output image width (multiple of 8)
+            height: Output image height (multiple of 8)
+            num_inference_steps: Number of denoising steps
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            seed: Random seed for reproducibility
+            tile_size: Tile size in pixels (512 is SD-Turbo's native size)
+            tile_overlap: Overlap between neighbouring tiles in pixels
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort generation
+            
+        Returns:
+            PIL Image object
         """
+        import torch
+        from diffusers.utils.torch_utils import randn_tensor
+        from tiling import tiled_denoise, tiled_vae_decode, to_pil
+        
+        embeds, generator = self._tiled_inputs(
+            prompt, guidance_scale, seed, width, height, tile_size
+        )
+        scale = self.pipe.vae_scale_factor
+        scheduler = self.pipe.scheduler
+        scheduler.set_timesteps(num_inference_steps, device=self.device)
+        
         start_time = time.time()
         
-        images = self.pipe(
-            prompt=prompts,
+        with inference_context(self.profile):
+            latents = randn_tensor(
+                (1, self.pipe.unet.config.in_channels, height // scale, width // scale),
+                generator=generator,
+                device=torch.device(self.device),
+                dtype=self.pipe.unet.dtype,
+            ) * scheduler.init_noise_sigma
+            latents = tiled_denoise(
+                self.pipe.unet, scheduler, latents, timesteps=scheduler.timesteps,
+                guidance_scale=guidance_scale, tile=tile_size // scale,
+                overlap=tile_overlap // scale, step_callback=step_callback, **embeds,
+            )
+            pixels = tiled_vae_decode(
+                self.pipe.vae, latents, tile=tile_size // scale, overlap=tile_overlap // scale
+            )
+        image = to_pil(pixels)[0]
+        
+        elapsed = time.time() - start_time
+        print(f"Generated {width}x{height} in {elapsed:.2f}s ({num_inference_steps} steps, tiled)")
+        return image
+    
+    def upscale(
+        self,
+        image: Image.Image,
+        prompt: str,
+        scale: float = 2.0,
+        strength: float = 0.3,
+        num_inference_steps: int = 4,
+        guidance_scale: float = 0.0,
+        seed: int = None,
+        tile_size: int = 512,
+        tile_overlap: int = 128,
+    ) -> Image.Image:
+        """
+        Upscale an image by tiles: resize it (Lanczos), then re-add detail
+        with a light img2img pass whose VAE encode, denoising and VAE
+        decode all run on overlapping tiles.
+        
+        Args:
+            image: Image to upscale
+            prompt: Text description of the image (guides the added detail)
+            scale: Resize factor (output sides are rounded to multiples of 8)
+            strength: How much of the noise schedule to re-run (0-1); higher
+                adds more detail and drifts further from the input
+            num_inference_steps: Schedule length; strength * steps must be >= 1
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            seed: Random seed for reproducibility
+            tile_size: Tile size in pixels
+            tile_overlap: Overlap between neighbouring tiles in pixels
+            
+        Returns:
+            Upscaled PIL Image
+        """
+        import torch
+        from diffusers.utils.torch_utils import randn_tensor
+        from tiling import tiled_denoise, tiled_vae_decode, tiled_vae_encode, to_pil
+        
+        vae_scale = self.pipe.vae_scale_factor
+        width = max(vae_scale, round(image.width * scale / vae_scale) * vae_scale)
+        height = max(vae_scale, round(image.height * scale / vae_scale) * vae_scale)
+        
+        steps_to_run = min(int(num_inference_steps * strength), num_inference_steps)
+        if steps_to_run < 1:
+            raise ValueError(
+                f"strength * num_inference_steps must be at least 1 (got {strength} * {num_inference_steps})"
+            )
+        
+        embeds, generator = self._tiled_inputs(
+            prompt, guidance_scale, seed, width, height, tile_size
+        )
+        scheduler = self.pipe.scheduler
+        scheduler.set_timesteps(num_inference_steps, device=self.device)
+        t_start = (num_inference_steps - steps_to_run) * scheduler.order
+        timesteps = scheduler.timesteps[t_start:]
+        if hasattr(scheduler, "set_begin_index"):
+            scheduler.set_begin_index(t_start)
+        
+        start_time = time.time()
+        
+        resized = image.convert("RGB").resize((width, height), Image.LANCZOS)
+        with inference_context(self.profile):
+            pixels = self.pipe.image_processor.preprocess(resized).to(self.device)
+            latents = tiled_vae_encode(
+                self.pipe.vae, pixels, tile=tile_size // vae_scale, overlap=tile_overlap // vae_scale
+            )
+            noise = randn_tensor(
+                latents.shape, generator=generator, device=torch.device(self.device), dtype=latents.dtype
+            )
+            latents = scheduler.add_noise(latents, noise, timesteps[:1])
+            latents = tiled_denoise(
+                self.pipe.unet, scheduler, latents, timesteps=timesteps,
+                guidance_scale=guidance_scale, tile=tile_size // vae_scale,
+                overlap=tile_overlap // vae_scale, **embeds,
+            )
+            pixels = tiled_vae_decode(
+                self.pipe.vae, latents, tile=tile_size // vae_scale, overlap=tile_overlap // vae_scale
+            )
+        upscaled = to_pil(pixels)[0]
+        
+        elapsed = time.time() - start_time
+        print(f"Upscaled {image.width}x{image.height} -> {width}x{height} in {elapsed:.2f}s "
+              f"({steps_to_run} steps, tiled)")
+        return upscaled
+    
+    @property
+    def img2img_pipe(self):
+        """
+        Image-to-image pipeline built from this pipeline's modules: the
+        UNet, VAE and text encoder are the loaded ones, not a second copy.
+        """
+        if self._img2img_pipe is None:
+            from diffusers import AutoPipelineForImage2Image
+            self._img2img_pipe = AutoPipelineForImage2Image.from_pipe(self.pipe)
+        return self._img2img_pipe
+    
+    def _source_size(self, image: Image.Image, width: int, height: int) -> tuple[int, int]:
+        """Output size of an img2img call: the given size or the image's, in multiples of 8."""
+        scale = self.pipe.vae_scale_factor
+        width = width or image.width
+        height = height or image.height
+        return (
+            max(scale, round(width / scale) * scale),
+            max(scale, round(height / scale) * scale),
+        )
+    
+    def _image_latents(self, image: Image.Image, width: int, height: int) -> "torch.Tensor":
+        """Encode an image into scaled VAE latents (the latent mean, so deterministic)."""
+        vae = self.pipe.vae
+        resized = image.convert("RGB")
+        if resized.size != (width, height):
+            resized = resized.resize((width, height), Image.LANCZOS)
+        pixels = self.pipe.image_processor.preprocess(resized).to(self.device, dtype=vae.dtype)
+        return vae.encode(pixels).latent_dist.mode() * vae.config.scaling_factor
+    
+    def _img2img(
+        self,
+        image: Image.Image,
+        prompt: str,
+        seeds: list,
+        strength: float,
+        num_inference_steps: int,
+        guidance_scale: float,
+        width: int,
+        height: int,
+        step_callback=None,
+    ) -> list[Image.Image]:
+        """Run img2img once per seed; the source image is encoded once."""
+        import torch
+        
+        steps_to_run = min(int(num_inference_steps * strength), num_inference_steps)
+        if steps_to_run < 1:
+            raise ValueError(
+                f"strength * num_inference_steps must be at least 1 (got {strength} * {num_inference_steps})"
+            )
+        
+        width, height = self._source_size(image, width, height)
+        chunk_size = self.memory_chunk_size(len(seeds), width, height)
+        
+        start_time = time.time()
+        
+        with inference_context(self.profile):
+            latents = self._image_latents(image, width, height)
+        
+        images = []
+        for offset in range(0, len(seeds), chunk_size):
+            chunk = seeds[offset:offset + chunk_size]
+            generators = [
+                torch.Generator(device=self.device).manual_seed(
+                    seed if seed is not None else random.getrandbits(63)
+                )
+                for seed in chunk
+            ]
+            # Already-encoded latents skip the pipeline's own VAE encode
+            with self._measure_memory(width, height, len(chunk)), inference_context(self.profile):
+                images += self.img2img_pipe(
+                    **self._prompt_kwargs([prompt] * len(chunk), guidance_scale),
+                    image=latents.repeat(len(chunk), 1, 1, 1),
+                    strength=strength,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    generator=generators,
+                    **self._callback_kwargs(step_callback, steps_to_run),
+                ).images
+        
+        elapsed = time.time() - start_time
+        print(f"Image-to-image: {len(images)} images in {elapsed:.2f}s "
+              f"({steps_to_run} of {num_inference_steps} steps)")
+        return images
+    
+    def img2img(
+        self,
+        image: Image.Image,
+        prompt: str,
+        strength: float = 0.5,
+        num_inference_steps: int = 2,
+        guidance_scale: float = 0.0,
+        seed: int = None,
+        width: int = None,
+        height: int = None,
+        step_callback=None,
+    ) -> Image.Image:
+        """
+        Redraw an image guided by a prompt ("same character, new background").
+        
+        Only the last `strength` of the noise schedule is run, so a
+        low-strength edit costs int(strength * num_inference_steps) UNet
+        passes plus one VAE encode - a fraction of a full generation.
+        
+        Args:
+            image: Source image
+            prompt: Text description of the desired result
+            strength: How much of the noise schedule to re-run (0-1); higher
+                drifts further from the source
+            num_inference_steps: Schedule length; strength * steps must be >= 1
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            seed: Random seed for reproducibility
+            width: Output width (default: the source's, rounded to a multiple of 8)
+            height: Output height (default: the source's, rounded to a multiple of 8)
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort
+        
+        Returns:
+            PIL Image object
+        """
+        return self._img2img(
+            image, prompt, [seed], strength, num_inference_steps, guidance_scale,
+            width, height, step_callback,
+        )[0]
+    
+    def variations(
+        self,
+        prompt: str,
+        seed: int,
+        num_images: int = 4,
+        image: Image.Image = None,
+        strength: float = 0.5,
+        variation_strength: float = 0.15,
+        num_inference_steps: int = 2,
+        guidance_scale: float = 0.0,
+        width: int = None,
+        height: int = None,
+        step_callback=None,
+    ) -> list[Image.Image]:
+        """
+        Close variants of one result, generated as one batch.
+        
+        Without `image` (seed variations): image k starts from the noise of
+        `seed` slerped `variation_strength` of the way towards the noise of
+        `seed + k + 1`, so the composition of generate(prompt, seed=seed)
+        is kept and the details change.
+        
+        With `image`: image k is img2img(image, prompt, seed=seed + k).
+        
+        Args:
+            prompt: Text description of desired image
+            seed: Base seed
+            num_images: Number of variations
+            image: Optional source image (switches to img2img variations)
+            strength: img2img strength (with `image` only)
+            variation_strength: Distance from the base noise, 0-1 (without
+                `image` only; 0 reproduces the base image)
+            num_inference_steps: Number of denoising steps
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            width: Output width (default: 512, or with `image` the source's,
+                rounded to a multiple of 8)
+            height: Output height (default: 512, or with `image` the
+                source's, rounded to a multiple of 8)
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort
+        
+        Returns:
+            List of PIL Image objects
+        """
+        if image is not None:
+            return self._img2img(
+                image, prompt, [seed + k for k in range(num_images)], strength,
+                num_inference_steps, guidance_scale, width, height, step_callback,
+            )
+        
+        width, height = width or 512, height or 512
+        base = self.initial_noise([seed], width, height)
+        targets = self.initial_noise([seed + k + 1 for k in range(num_images)], width, height)
+        embeds = self.encode_prompts([prompt])
+        
+        start_time = time.time()
+        images = self.generate_from_latents(
+            slerp(base, targets, variation_strength),
+            embeds.expand(num_images, -1, -1),
             num_inference_steps=num_inference_steps,
             guidance_scale=guidance_scale,
-            width=width,
-            height=height,
-        ).images
-        
+            step_callback=step_callback,
+        )
         elapsed = time.time() - start_time
-        print(f"Generated {len(images)} images in {elapsed:.2f}s")
+        print(f"Generated {len(images)} variations in {elapsed:.2f}s")
+        return images
+    
+    def initial_noise(self, seeds: list, width: int, height: int) -> "torch.Tensor":
+        """
+        Initial noise for each seed, exactly as generate(seed=...) draws it
+        (unscaled; the pipeline applies init_noise_sigma).
+        """
+        return self._seeded_inputs(seeds, width, height)['latents']
+    
+    def generate_from_latents(
+        self,
+        latents: "torch.Tensor",
+        prompt_embeds: "torch.Tensor",
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        step_callback=None,
+    ) -> list[Image.Image]:
+        """
+        Generate images from explicit initial noise and text embeddings,
+        e.g. interpolated between seeds and prompts. Results are not cached.
         
+        A batch larger than the free memory allows is run as several
+        pipeline calls.
+        
+        Args:
+            latents: (B, C, h, w) initial noise, see initial_noise()
+            prompt_embeds: (B, tokens, dim) text embeddings, see encode_prompts()
+            num_inference_steps: Number of denoising steps
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            step_callback: Optional fn(step, total_steps, latents) run after
+                each denoising step; raise from it to abort generation
+            
+        Returns:
+            List of PIL Image objects
+            
+        Raises:
+            InsufficientMemory: Not even one image fits in the free memory
+        """
+        scale = self.pipe.vae_scale_factor
+        height, width = latents.shape[2] * scale, latents.shape[3] * scale
+        chunk_size = self.memory_chunk_size(len(latents), width, height)
+        
+        images = []
+        for offset in range(0, len(latents), chunk_size):
+            chunk = slice(offset, offset + chunk_size)
+            with self._measure_memory(width, height, len(latents[chunk])), inference_context(self.profile):
+                images += self.pipe(
+                    prompt_embeds=prompt_embeds[chunk],
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    width=width,
+                    height=height,
+                    latents=latents[chunk],
+                    **self._callback_kwargs(step_callback, num_inference_steps),
+                ).images
         return images
+    
+    def save_weights(self, path):
+        """
+        Write the loaded pipeline (in its current dtype) to a local directory
+        as safetensors. Pass that directory as `model_id` to load it later
+        without any Hub lookups or dtype conversion.
+        """
+        self.pipe.save_pretrained(path, safe_serialization=True)
+        print(f"Saved weights to {path}")
 
 
 def main():
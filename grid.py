@@ -0,0 +1,203 @@
+"""
+Prompt x Seed Grids
+-------------------
+Explores several prompts across several seeds in one go: every
+(prompt, seed) cell is generated in a single `generate_batch` call, so
+each prompt is encoded once and the UNet runs once per cell (a 5 x 8
+grid costs 40 UNet passes per step and 5 text encodes). Cell (row, k)
+is the same image as generate(prompt, seed=seeds[k]).
+
+The results are saved as individual files plus a labeled contact sheet
+(one row per prompt, one column per seed) for side-by-side comparison.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Contact sheet layout (pixels)
+CELL_SIZE = 256
+LABEL_WIDTH = 160
+LABEL_HEIGHT = 28
+PADDING = 8
+
+
+def generate_grid(
+    generator,
+    prompts: list[str],
+    seeds: list[int],
+    num_inference_steps: int = 2,
+    guidance_scale: float = 0.0,
+    width: int = 512,
+    height: int = 512,
+) -> list[list[Image.Image]]:
+    """
+    Generate every prompt with every seed.
+
+    Args:
+        generator: SDTurboGenerator or WorkerPool (anything with
+            `generate_batch(seeds=...)`)
+        prompts: Row prompts
+        seeds: Column seeds
+        num_inference_steps: Denoising steps per image
+        guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+        width: Image width
+        height: Image height
+
+    Returns:
+        Rows of images: grid[i][k] is prompts[i] with seeds[k]
+    """
+    seeds = list(seeds)
+    kwargs = dict(
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        width=width,
+        height=height,
+    )
+
+    if hasattr(generator, "submit_batch"):
+        # One row per task, so every worker process has work and each
+        # prompt is still encoded once
+        pending = [
+            generator.submit_batch([prompt] * len(seeds), seeds=seeds, **kwargs)
+            for prompt in prompts
+        ]
+        return [future.result() for future in pending]
+
+    # One call for all cells; generate_batch splits it to fit in memory
+    images = generator.generate_batch(
+        [prompt for prompt in prompts for _ in seeds],
+        seeds=seeds * len(prompts),
+        **kwargs,
+    )
+    return [images[row * len(seeds):(row + 1) * len(seeds)] for row in range(len(prompts))]
+
+
+def _fit_text(draw: ImageDraw.ImageDraw, text: str, font, max_width: int) -> str:
+    """Truncate `text` with an ellipsis until it fits in `max_width` pixels."""
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + "...", font=font) > max_width:
+        text = text[:-1]
+    return text + "..."
+
+
+def contact_sheet(
+    grid: list[list[Image.Image]],
+    row_labels: list[str],
+    column_labels: list[str],
+    cell_size: int = CELL_SIZE,
+) -> Image.Image:
+    """
+    Lay out a grid of images as one labeled sheet.
+
+    Args:
+        grid: Rows of images (all rows the same length)
+        row_labels: One label per row, drawn to the left
+        column_labels: One label per column, drawn on top
+        cell_size: Longest side of each thumbnail
+
+    Returns:
+        RGB contact sheet
+    """
+    rows, columns = len(grid), max((len(row) for row in grid), default=0)
+    sample = grid[0][0] if rows and columns else None
+    scale = cell_size / max(sample.size) if sample else 1.0
+    cell_width = round(sample.width * scale) if sample else cell_size
+    cell_height = round(sample.height * scale) if sample else cell_size
+
+    sheet = Image.new(
+        "RGB",
+        (
+            LABEL_WIDTH + columns * (cell_width + PADDING) + PADDING,
+            LABEL_HEIGHT + rows * (cell_height + PADDING) + PADDING,
+        ),
+        "white",
+    )
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+
+    for k, label in enumerate(column_labels):
+        left = LABEL_WIDTH + k * (cell_width + PADDING) + PADDING
+        draw.text((left, PADDING), _fit_text(draw, label, font, cell_width), fill="black", font=font)
+
+    for row, (label, images) in enumerate(zip(row_labels, grid)):
+        top = LABEL_HEIGHT + row * (cell_height + PADDING) + PADDING
+        text = _fit_text(draw, label, font, LABEL_WIDTH - 2 * PADDING)
+        draw.text((PADDING, top + cell_height // 2), text, fill="black", font=font, anchor="lm")
+        for k, image in enumerate(images):
+            left = LABEL_WIDTH + k * (cell_width + PADDING) + PADDING
+            thumbnail = image.convert("RGB").resize((cell_width, cell_height), Image.LANCZOS)
+            sheet.paste(thumbnail, (left, top))
+
+    return sheet
+
+
+def run_grid(
+    generator,
+    prompts: dict[str, str],
+    seeds: list[int],
+    output_dir,
+    num_inference_steps: int = 2,
+    width: int = 512,
+    height: int = 512,
+    filename: str = "{name}_seed{seed}.png",
+    sheet_filename: str = "contact_sheet.png",
+) -> dict:
+    """
+    Generate a prompt x seed grid and save every cell plus a contact sheet.
+
+    Args:
+        generator: SDTurboGenerator or WorkerPool
+        prompts: Mapping of row name -> prompt (names label the rows)
+        seeds: Column seeds
+        output_dir: Directory for the images (created if missing)
+        num_inference_steps: Denoising steps per image
+        width: Output image width
+        height: Output image height
+        filename: Cell filename template, formatted with `name` and `seed`
+        sheet_filename: Contact sheet filename
+
+    Returns:
+        Summary dict with counts, the sheet path and timings
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    names = list(prompts)
+    seeds = list(seeds)
+    total = len(names) * len(seeds)
+
+    print(f"Grid: {len(names)} prompts x {len(seeds)} seeds = {total} images\n")
+    start_time = time.time()
+    grid = generate_grid(
+        generator, [prompts[name] for name in names], seeds,
+        num_inference_steps=num_inference_steps, width=width, height=height,
+    )
+    generate_time = time.time() - start_time
+
+    # PNG encoding of the cells overlaps with building the sheet
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="grid-writer") as writer:
+        saves = []
+        for name, images in zip(names, grid):
+            for seed, image in zip(seeds, images):
+                output_path = output_dir / filename.format(name=name, seed=seed)
+                saves.append(writer.submit(image.save, output_path))
+            print(f"    ✓ {name}: {len(images)} seeds")
+
+        sheet_path = output_dir / sheet_filename
+        contact_sheet(grid, names, [f"seed {seed}" for seed in seeds]).save(sheet_path)
+        print(f"    ✓ Contact sheet: {sheet_path}")
+
+        for save in saves:
+            save.result()
+
+    total_time = time.time() - start_time
+    return {
+        'images': total,
+        'sheet': sheet_path,
+        'generate_time': generate_time,
+        'total_time': total_time,
+        'avg_time': generate_time / total if total else 0.0,
+    }
@@ -0,0 +1,53 @@
+"""
+Image Encoding Helpers
+----------------------
+Single-pass encoding of generated images to the formats the web API
+serves (PNG, WebP, JPEG).
+
+Images are encoded exactly once per request; the same bytes are written
+to disk and, when a client asks for a binary response, sent back as-is.
+"""
+
+from io import BytesIO
+
+from PIL import Image
+
+# MIME type -> (PIL format name, file extension)
+IMAGE_FORMATS = {
+    'image/png': ('PNG', 'png'),
+    'image/webp': ('WEBP', 'webp'),
+    'image/jpeg': ('JPEG', 'jpg'),
+}
+
+DEFAULT_QUALITY = 90
+
+
+def encode_image(
+    image: Image.Image,
+    mimetype: str = 'image/png',
+    quality: int = DEFAULT_QUALITY,
+) -> bytes:
+    """
+    Encode a PIL image to bytes.
+
+    Args:
+        image: Image to encode
+        mimetype: One of IMAGE_FORMATS
+        quality: Lossy quality for WebP/JPEG (1-100, ignored for PNG)
+
+    Returns:
+        Encoded image bytes
+    """
+    pil_format, _ = IMAGE_FORMATS[mimetype]
+    options = {}
+    if pil_format != 'PNG':
+        options['quality'] = max(1, min(100, int(quality)))
+
+    buffered = BytesIO()
+    image.save(buffered, format=pil_format, **options)
+    return buffered.getvalue()
+
+
+def extension_for(mimetype: str) -> str:
+    """File extension (without dot) used when storing `mimetype`."""
+    return IMAGE_FORMATS[mimetype][1]
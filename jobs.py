@@ -0,0 +1,223 @@
+"""
+Asynchronous Generation Jobs
+----------------------------
+Job-based API on top of the micro-batcher.
+
+Submitting a job returns an id immediately. The prompt is queued on the
+batcher's background inference worker, which owns the single
+`SDTurboGenerator`, so HTTP threads never block on torch. Clients poll
+the job for its status and result (or wait on `wait_for_update()` to
+stream progress), and can cancel it while it is queued or running.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from batching import GenerationCancelled
+from previews import preview_data_uri
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    """State of one asynchronous generation request."""
+    id: str
+    params: dict
+    status: str = QUEUED
+    result: dict = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    future: object = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    progress: dict = None
+    preview: str = None
+    version: int = 0
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    def current_status(self) -> str:
+        """Status, refined with whether the batcher has started the job."""
+        if self.status == QUEUED and self.future is not None and self.future.running():
+            return RUNNING
+        return self.status
+
+    def to_dict(self) -> dict:
+        """JSON-serialisable view for the HTTP API."""
+        data = {
+            'job_id': self.id,
+            'status': self.current_status(),
+            'prompt': self.params.get('prompt'),
+            'steps': self.params.get('num_inference_steps'),
+            'seed': self.params.get('seed'),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+        }
+        if self.result is not None:
+            data.update(self.result)
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+    def update(self, **fields):
+        """Change job fields and wake up anyone waiting for progress."""
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_update(self, version: int, timeout: float = None) -> int:
+        """
+        Block until the job changes past `version` (or the timeout passes).
+
+        Returns:
+            The job's current version
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class JobManager:
+    """
+    Tracks jobs submitted to a `MicroBatcher` and stores their results.
+    """
+
+    def __init__(self, batcher, save_result, job_ttl: float = 3600.0):
+        """
+        Args:
+            batcher: MicroBatcher that runs the generations
+            save_result: fn(image, job) -> dict describing the stored result
+                (e.g. filename and URL); runs off the inference thread
+            job_ttl: Seconds finished jobs are kept before being forgotten
+        """
+        self.batcher = batcher
+        self.save_result = save_result
+        self.job_ttl = job_ttl
+
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        # Saving results (PNG encode + disk write) must not stall inference
+        self._writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="job-writer")
+
+    def submit(self, previews: bool = False, **params) -> Job:
+        """
+        Create a job and queue it for generation.
+
+        Args:
+            previews: Attach a latent preview to every progress update
+            **params: Keyword arguments for `MicroBatcher.submit()`
+
+        Returns:
+            The new Job (status "queued")
+            
+        Raises:
+            QueueFull: The batcher's queue for this priority is full
+        """
+        self._purge()
+
+        job = Job(id=uuid.uuid4().hex, params=params)
+        with self._lock:
+            self._jobs[job.id] = job
+
+        def on_step(step, total_steps, latents):
+            preview = preview_data_uri(latents) if previews else None
+            job.update(progress={'step': step, 'total': total_steps}, preview=preview)
+
+        try:
+            job.future = self.batcher.submit(
+                cancel_event=job.cancel_event, on_step=on_step, **params
+            )
+        except Exception:
+            # Not admitted (e.g. QueueFull): the job never existed
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job
+
+    def get(self, job_id: str):
+        """Return the Job with this id, or None if unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job.
+
+        Returns:
+            False if the job already finished, True otherwise
+        """
+        job = self.get(job_id)
+        if job is None or job.status in TERMINAL_STATES:
+            return False
+
+        job.cancel_event.set()
+        # Queued jobs are pulled from the batcher right away; running ones
+        # finish as cancelled once the worker notices the event
+        job.future.cancel()
+        return True
+
+    def counts(self) -> dict:
+        """Number of tracked jobs per status."""
+        counts = {}
+        with self._lock:
+            for job in self._jobs.values():
+                status = job.current_status()
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def _on_done(self, job: Job, future):
+        """Record the outcome of a finished batcher future."""
+        try:
+            image = future.result()
+        except (CancelledError, GenerationCancelled):
+            self._finish(job, CANCELLED)
+            return
+        except Exception as e:
+            self._finish(job, FAILED, error=str(e))
+            return
+
+        self._writer.submit(self._store, job, image)
+
+    def _store(self, job: Job, image):
+        """Persist a finished image and mark the job as succeeded."""
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        try:
+            result = self.save_result(image, job)
+        except Exception as e:
+            self._finish(job, FAILED, error=f"Saving result failed: {e}")
+            return
+        self._finish(job, SUCCEEDED, result=result)
+
+    def _finish(self, job: Job, status: str, result: dict = None, error: str = None):
+        job.update(
+            result=result,
+            error=error,
+            finished_at=time.time(),
+            status=status,
+        )
+
+    def _purge(self):
+        """Forget finished jobs older than `job_ttl`."""
+        cutoff = time.time() - self.job_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,418 @@
+"""
+Memory Estimation
+-----------------
+Estimates of peak inference memory, used to size batches so a run stays
+inside a memory budget instead of getting OOM-killed.
+
+Peak activation memory of SD-Turbo grows with the number of latent
+pixels, the batch size and the dtype width. The constant below is a
+conservative figure for one 512x512 image in float32 (UNet activations
+plus the VAE decoder, which dominates at high resolutions).
+
+`MemoryEstimator` starts from that figure and calibrates itself from the
+peaks measured around real pipeline calls (`track_peak()`), per
+resolution. `MemoryAdmission` uses it to decide, before anything runs,
+whether a batch fits the memory that is free right now, has to wait for
+running batches to finish, or can never fit:
+
+    admission = MemoryAdmission(estimator)
+    if not admission.fits(768, 768):
+        admission.reject()  # too large for this host; counted in stats()
+    with admission.reserve(768, 768, batch_size=2):
+        images = generator.generate_batch(...)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Peak activation bytes for one 512x512 float32 image
+BYTES_PER_512_IMAGE_FP32 = int(1.5 * 1024 ** 3)
+
+# Share of the currently available memory that activations may use
+DEFAULT_BUDGET_FRACTION = 0.8
+
+# Calibrated estimates are scaled up by this much (allocator slack,
+# peaks between samples)
+SAFETY_MARGIN = 1.2
+
+# Calibration never goes below this share of the uncalibrated estimate:
+# a peak counter that was already high reads as (nearly) nothing
+MIN_FACTOR = 0.1
+
+
+class InsufficientMemory(Exception):
+    """A pipeline call needs more memory than is available."""
+
+    def __init__(self, message: str, required: int = 0, available: int = 0):
+        super().__init__(message)
+        self.required = required
+        self.available = available
+
+    def __reduce__(self):
+        # Keep the sizes when sent back from a worker process
+        return type(self), (str(self), self.required, self.available)
+
+
+class MemoryBusy(Exception):
+    """Memory stayed reserved by running batches for longer than the timeout."""
+
+
+def estimate_batch_bytes(
+    width: int,
+    height: int,
+    batch_size: int = 1,
+    dtype_bytes: int = 4,
+) -> int:
+    """
+    Estimate peak activation memory of one pipeline call.
+
+    Args:
+        width: Output image width
+        height: Output image height
+        batch_size: Images generated in the call
+        dtype_bytes: Bytes per element of the pipeline dtype (4 = fp32)
+
+    Returns:
+        Estimated peak bytes (excluding model weights)
+    """
+    pixels = width * height / (512 * 512)
+    return int(BYTES_PER_512_IMAGE_FP32 * pixels * batch_size * dtype_bytes / 4)
+
+
+def _read_int(path: str):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _cgroup_available_bytes():
+    """Bytes left under this container's memory limit (None if unlimited)."""
+    for limit_path, usage_path in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),  # cgroup v2
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes",
+         "/sys/fs/cgroup/memory/memory.usage_in_bytes"),  # cgroup v1
+    ):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        # v1 reports "no limit" as a huge number, v2 as "max" (not an int)
+        if limit is not None and usage is not None and limit < 1 << 60:
+            return max(0, limit - usage)
+    return None
+
+
+def available_memory_bytes(device: str = "cpu") -> int:
+    """
+    Memory that can be allocated right now (falls back to 4 GiB if unknown).
+
+    On CPU this is MemAvailable (free plus reclaimable page cache), capped
+    by the container's cgroup limit; on CUDA the free device memory.
+    """
+    if device.startswith("cuda"):
+        import torch
+        return torch.cuda.mem_get_info()[0]
+
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    if available is None:
+        try:
+            available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError, AttributeError):
+            return 4 * 1024 ** 3
+
+    cgroup = _cgroup_available_bytes()
+    return available if cgroup is None else min(available, cgroup)
+
+
+def max_batch_size(
+    memory_budget: int,
+    width: int,
+    height: int,
+    dtype_bytes: int = 4,
+    limit: int = 16,
+) -> int:
+    """
+    Largest batch whose estimated peak fits in `memory_budget` (at least 1).
+
+    Args:
+        memory_budget: Bytes available for activations
+        width: Output image width
+        height: Output image height
+        dtype_bytes: Bytes per element of the pipeline dtype
+        limit: Upper bound on the returned batch size
+    """
+    per_image = estimate_batch_bytes(width, height, 1, dtype_bytes)
+    return max(1, min(limit, memory_budget // per_image))
+
+
+def _vm_hwm_bytes() -> int:
+    """Peak resident set size since the last reset (VmHWM)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    raise OSError("VmHWM not reported")
+
+
+class PeakMemory:
+    """Result of `track_peak()`: `bytes` is None if it could not be measured."""
+    bytes = None
+
+
+# Resetting the peak RSS counter is process-wide: one measurement at a time
+_peak_lock = threading.Lock()
+
+
+@contextmanager
+def track_peak(device: str = "cpu"):
+    """
+    Measure the peak memory the enclosed block allocated on top of what
+    was already in use.
+
+    On CPU this resets the kernel's peak RSS counter (Linux
+    /proc/self/clear_refs) and reads VmHWM afterwards; on CUDA it uses
+    torch's peak allocator statistics. Nested or concurrent blocks in the
+    same process are not measured.
+
+        with track_peak() as peak:
+            pipe(...)
+        peak.bytes
+    """
+    result = PeakMemory()
+    if not _peak_lock.acquire(blocking=False):
+        yield result
+        return
+    try:
+        if device.startswith("cuda"):
+            import torch
+            start = torch.cuda.memory_allocated()
+            torch.cuda.reset_peak_memory_stats()
+            yield result
+            result.bytes = max(0, torch.cuda.max_memory_allocated() - start)
+            return
+
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            start = _vm_hwm_bytes()
+        except (OSError, ValueError):
+            yield result
+            return
+        yield result
+        result.bytes = max(0, _vm_hwm_bytes() - start)
+    finally:
+        _peak_lock.release()
+
+
+class MemoryEstimator:
+    """
+    Peak activation memory model, calibrated from measured peaks.
+
+    Estimates are `estimate_batch_bytes()` times a per-resolution
+    calibration factor: the largest recent observed/estimated ratio at
+    that resolution, plus `SAFETY_MARGIN`. Activation memory per pixel
+    grows with resolution (attention is quadratic), so a resolution that
+    has not been measured borrows the factor of a measured larger one,
+    and otherwise falls back to the conservative uncalibrated estimate.
+
+    The estimator holds no locks or handles, so it can be passed to
+    worker processes (each copy then calibrates on its own).
+    """
+
+    def __init__(self, dtype_bytes: int = 4, device: str = "cpu", window: int = 16):
+        """
+        Args:
+            dtype_bytes: Default bytes per element of the pipeline dtype
+            device: Where activations live ('cpu' or 'cuda')
+            window: Observations kept per resolution
+
+        SDTurboGenerator sets `dtype_bytes` and `device` to its own.
+        """
+        self.dtype_bytes = dtype_bytes
+        self.device = device
+        self.window = window
+        self._ratios = {}
+
+    def factor(self, width: int, height: int) -> float:
+        """Calibration factor applied to the uncalibrated estimate."""
+        ratios = self._ratios.get((width, height))
+        if ratios:
+            return max(max(ratios) * SAFETY_MARGIN, MIN_FACTOR)
+
+        pixels = width * height
+        observed = {size: max(r) * SAFETY_MARGIN for size, r in list(self._ratios.items()) if r}
+        larger = [f for (w, h), f in observed.items() if w * h >= pixels]
+        if larger:
+            return max(max(larger), MIN_FACTOR)
+        return max([1.0] + list(observed.values()))
+
+    def estimate(
+        self,
+        width: int,
+        height: int,
+        batch_size: int = 1,
+        dtype_bytes: int = None,
+    ) -> int:
+        """Estimated peak activation bytes of one pipeline call."""
+        dtype_bytes = dtype_bytes or self.dtype_bytes
+        prior = estimate_batch_bytes(width, height, batch_size, dtype_bytes)
+        return int(prior * self.factor(width, height))
+
+    def max_batch_size(
+        self,
+        memory_budget: int,
+        width: int,
+        height: int,
+        dtype_bytes: int = None,
+        limit: int = 16,
+    ) -> int:
+        """Largest batch whose estimated peak fits in `memory_budget` (0 if none)."""
+        per_image = max(1, self.estimate(width, height, 1, dtype_bytes))
+        return max(0, min(limit, memory_budget // per_image))
+
+    def observe(
+        self,
+        width: int,
+        height: int,
+        batch_size: int,
+        peak_bytes: int,
+        dtype_bytes: int = None,
+    ):
+        """Record the measured peak of one pipeline call (empty peaks are ignored)."""
+        if peak_bytes <= 0:
+            return
+        dtype_bytes = dtype_bytes or self.dtype_bytes
+        prior = estimate_batch_bytes(width, height, batch_size, dtype_bytes)
+        ratios = self._ratios.setdefault((width, height), deque(maxlen=self.window))
+        ratios.append(peak_bytes / prior)
+
+    def calibration(self) -> dict:
+        """Current factor per measured resolution, e.g. {'512x512': 0.41}."""
+        return {
+            f"{w}x{h}": round(self.factor(w, h), 3)
+            for (w, h), r in sorted(list(self._ratios.items())) if r
+        }
+
+
+class MemoryAdmission:
+    """
+    Admission control for pipeline calls against the available memory.
+
+    Running calls reserve their estimated peak. A new call is admitted
+    while the reservations plus its own estimate stay within
+    `budget_fraction` of the memory available right now; otherwise it
+    waits for running calls to finish, and raises `MemoryBusy` after
+    `timeout` seconds. Reserved bytes are assumed not yet allocated, so
+    this errs on the side of waiting.
+    """
+
+    def __init__(
+        self,
+        estimator: MemoryEstimator,
+        budget_fraction: float = DEFAULT_BUDGET_FRACTION,
+        max_bytes: int = None,
+        timeout: float = 30.0,
+    ):
+        """
+        Args:
+            estimator: MemoryEstimator (shared with the generator so its
+                calibration is used)
+            budget_fraction: Share of the available memory activations may use
+            max_bytes: Optional fixed cap on activation memory
+            timeout: Seconds a call may wait for memory before MemoryBusy
+        """
+        self.estimator = estimator
+        self.budget_fraction = budget_fraction
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+
+        self.reserved = 0
+        self.running = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._cond = threading.Condition()
+
+    def _budget(self, include_reserved: bool) -> int:
+        budget = available_memory_bytes(self.estimator.device) * self.budget_fraction
+        if include_reserved:
+            budget += self.reserved
+        if self.max_bytes is not None:
+            budget = min(budget, self.max_bytes)
+        return int(budget)
+
+    def capacity(self) -> int:
+        """Activation bytes available with nothing else running."""
+        with self._cond:
+            return self._budget(include_reserved=True)
+
+    def fits(self, width: int, height: int, batch_size: int = 1) -> bool:
+        """
+        False if the call could not run even on an otherwise idle server
+        (it should be rejected, not queued).
+        """
+        return self.estimator.estimate(width, height, batch_size) <= self.capacity()
+
+    def reject(self):
+        """Count a call that was refused because it can never fit."""
+        with self._cond:
+            self.rejected += 1
+
+    def max_batch_size(self, width: int, height: int, limit: int = 16) -> int:
+        """Largest batch that fits on an idle server (at least 1)."""
+        return max(1, self.estimator.max_batch_size(self.capacity(), width, height, limit=limit))
+
+    @contextmanager
+    def reserve(self, width: int, height: int, batch_size: int = 1, timeout: float = None):
+        """
+        Hold the estimated peak of one call for the duration of the block,
+        waiting until it fits.
+
+        Raises:
+            MemoryBusy: Still no room after `timeout` seconds
+        """
+        needed = self.estimator.estimate(width, height, batch_size)
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # A lone call always runs if it fits at all (checked by fits())
+            while self.running and self.reserved + needed > self._budget(include_reserved=False):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise MemoryBusy(
+                        f"No memory for a {batch_size}x{width}x{height} batch "
+                        f"(~{needed / 1024 ** 2:.0f} MiB) within {timeout:g}s"
+                    )
+                # Available memory also changes outside this process: re-check
+                self._cond.wait(min(remaining, 0.5))
+            self.reserved += needed
+            self.running += 1
+        try:
+            yield needed
+        finally:
+            with self._cond:
+                self.reserved -= needed
+                self.running -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Budget, reservations and calibration, for status endpoints."""
+        with self._cond:
+            return {
+                'capacity_bytes': self._budget(include_reserved=True),
+                'reserved_bytes': self.reserved,
+                'running': self.running,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'calibration': self.estimator.calibration(),
+            }
@@ -0,0 +1,236 @@
+"""
+Hot-Path Metrics
+----------------
+Timing spans, counters and gauges rendered in the Prometheus text
+exposition format for `GET /metrics`.
+
+This is a small dependency-free implementation of the parts of the
+Prometheus data model the server needs. Recording is a dict update
+under a lock (a few microseconds), so spans can wrap every request
+stage:
+
+    with span("image_encode"):
+        data = encode_image(image)
+
+Pipeline stages (text encode, each denoising step, VAE decode) are
+timed with forward hooks, see `instrument_pipeline()`. In WorkerPool
+mode they run in other processes and are not recorded here.
+"""
+
+import bisect
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets (seconds): sub-millisecond stages up to long batches
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Base class: a named family of samples keyed by label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), registry=None):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """Yield (suffix, label string, value) for rendering."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", _format_labels(self.labels, key), value
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram with sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, description, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield "_bucket", _format_labels(self.labels, key, le), cumulative
+            labels = _format_labels(self.labels, key)
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+class CallbackMetric(Metric):
+    """
+    Metric read from a callback at scrape time, for values that already
+    live elsewhere (queue depth, cache counters, RSS).
+
+    The callback returns a number, or a dict of label-value tuples ->
+    number when `labels` is set.
+    """
+
+    def __init__(self, name, description, fn, kind: str = "gauge", labels=(), registry=None):
+        super().__init__(name, description, labels, registry)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is None:
+            return
+        values = value if isinstance(value, dict) else {(): value}
+        for key, sample in values.items():
+            yield "", _format_labels(self.labels, key), sample
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "sdturbo_stage_seconds",
+    "Time spent in each generation stage",
+    labels=("stage",),
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block into `sdturbo_stage_seconds{stage=...}`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument_pipeline(pipe):
+    """
+    Time text encoding, every denoising step and VAE decode with forward
+    hooks on the pipeline's modules (no changes to the diffusers code).
+    """
+    started = threading.local()
+
+    def hooks(stage):
+        def before(module, args):
+            setattr(started, stage, time.perf_counter())
+
+        def after(module, args, output):
+            STAGE_SECONDS.observe(time.perf_counter() - getattr(started, stage), stage=stage)
+
+        return before, after
+
+    for stage, module in (
+        ("text_encode", pipe.text_encoder),
+        ("denoise_step", pipe.unet),
+        ("vae_decode", pipe.vae.decoder),
+    ):
+        before, after = hooks(stage)
+        module.register_forward_pre_hook(before)
+        module.register_forward_hook(after)
+
+
+def process_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS if /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+CallbackMetric(
+    "process_resident_memory_bytes",
+    "Resident memory size in bytes",
+    process_rss_bytes,
+)
@@ -0,0 +1,160 @@
+"""
+Lazy Model Loading
+------------------
+`ModelLoader` builds the generator on a background thread, optionally
+runs a warm-up generation, and then forwards attribute access to it.
+
+Importing the web app (tests, tooling, `flask routes`) therefore costs
+nothing, the server can answer `/ready` while the model loads, and the
+first real request never pays first-call overhead. Time-to-ready and
+first-request latency are measured and printed.
+
+The `export` command writes pre-converted weights (fp16 on CUDA) to a
+local directory. Passing that directory as the model id loads it with
+no Hub lookups:
+
+    python model_loader.py export models/sd-turbo --device cuda
+"""
+
+import argparse
+import threading
+import time
+
+from metrics import span
+
+NOT_STARTED = "not_started"
+LOADING = "loading"
+WARMING_UP = "warming_up"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelLoadError(RuntimeError):
+    """The generator could not be built (the original error is chained)."""
+
+
+class ModelLoader:
+    """
+    Background loader and proxy for a generator.
+
+    Any attribute other than the loader's own (e.g. `generate_batch`,
+    `cached_result`) blocks until the generator is ready, then resolves
+    on it - so the loader can be handed to the micro-batcher in place of
+    the generator itself.
+    """
+
+    def __init__(self, factory, warmup: dict = None):
+        """
+        Args:
+            factory: Zero-argument callable that builds the generator
+            warmup: Keyword arguments for `generator.warmup()` (None skips
+                the warm-up pass)
+        """
+        self._factory = factory
+        self._warmup = warmup
+        self._generator = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._thread = None
+        self.state = NOT_STARTED
+        self.timings = {}
+
+    @property
+    def ready(self) -> bool:
+        """True once the generator is loaded and warmed up."""
+        return self.state == READY
+
+    def start(self):
+        """Start loading in the background (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = time.perf_counter()
+            self.state = LOADING
+            self._thread = threading.Thread(
+                target=self._load, name="model-loader", daemon=True
+            )
+            self._thread.start()
+
+    def wait(self, timeout: float = None):
+        """
+        Start loading if needed and block until the generator is ready.
+
+        Raises:
+            ModelLoadError: If loading failed
+            TimeoutError: If not ready within `timeout` seconds
+        """
+        self.start()
+        if not self._loaded.wait(timeout):
+            raise TimeoutError(f"Model not ready after {timeout}s ({self.state})")
+        if self._error is not None:
+            raise ModelLoadError(f"Model failed to load: {self._error}") from self._error
+        return self._generator
+
+    def record_request(self, generate_ms: float):
+        """Record the first served request's generation latency (once)."""
+        with self._lock:
+            if 'first_request_ms' in self.timings:
+                return
+            self.timings['first_request_ms'] = round(generate_ms, 1)
+        print(f"First request generated in {generate_ms:.0f} ms")
+
+    def status(self) -> dict:
+        """Loading state and startup timings (JSON-serialisable)."""
+        status = {'ready': self.ready, 'state': self.state, **self.timings}
+        if self._error is not None:
+            status['error'] = f"{type(self._error).__name__}: {self._error}"
+        return status
+
+    def __getattr__(self, name):
+        # Only called for attributes the loader itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.wait(), name)
+
+    def _load(self):
+        try:
+            load_start = time.perf_counter()
+            with span("model_load"):
+                generator = self._factory()
+            self.timings['load_s'] = round(time.perf_counter() - load_start, 2)
+
+            if self._warmup is not None:
+                self.state = WARMING_UP
+                with span("warmup"):
+                    self.timings['warmup_ms'] = round(generator.warmup(**self._warmup), 1)
+
+            self._generator = generator
+            self.timings['time_to_ready_s'] = round(time.perf_counter() - self._started_at, 2)
+            self.state = READY
+            detail = f"load {self.timings['load_s']:.2f}s"
+            if 'warmup_ms' in self.timings:
+                detail += f", warm-up {self.timings['warmup_ms']:.0f} ms"
+            print(f"Model ready in {self.timings['time_to_ready_s']:.2f}s ({detail})")
+        except Exception as e:
+            self._error = e
+            self.state = FAILED
+            print(f"ERROR: model failed to load: {type(e).__name__}: {e}")
+        finally:
+            self._loaded.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model weight tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Save pre-converted weights to a local directory")
+    export.add_argument("output_dir")
+    export.add_argument("--model-id", default="stabilityai/sd-turbo")
+    export.add_argument("--device", default="cuda",
+                        help="cuda exports fp16 weights, cpu exports fp32")
+    args = parser.parse_args()
+
+    from generate_image import SDTurboGenerator
+    generator = SDTurboGenerator(model_id=args.model_id, device=args.device)
+    generator.save_weights(args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Multi-Model Registry
+--------------------
+Serves several checkpoints from one process. Pipelines are loaded on
+first use, identical components are shared between them, and the least
+recently used pipeline is evicted when a weights budget is exceeded.
+
+Fine-tunes of one base model usually change only the UNet, so the text
+encoder and VAE of a second checkpoint are byte-for-byte copies of the
+first's. After a pipeline loads, each of its large components is
+compared with the components already loaded: a cheap structural
+signature (parameter names, shapes, dtypes) finds candidates, and a
+content hash of the weights confirms them. A match replaces the new
+copy with the loaded one, so it is held in memory once.
+
+`ModelRegistry` exposes the generator interface (`generate_batch`,
+`generate`, `cached_result`, `img2img`, `variations`, `warmup`) with an
+extra `model` argument,
+so it can stand in for a single generator in the micro-batcher.
+Attributes it does not define resolve on the default model.
+`cached_result` never loads or evicts a model: it probes the result
+cache of models loaded at some point in this process and answers None
+for the rest, so loading happens only where generation runs.
+
+Calls made through the registry are counted per generator. Budget
+eviction skips models with calls in flight, and an explicit `evict()`
+of a busy model only unregisters it: the last running call closes it.
+
+Components are only shared between in-process SDTurboGenerators; a
+WorkerPool keeps its weights in its worker processes.
+"""
+
+import gc
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from quantization import module_bytes
+
+# Pipeline components worth sharing (the tokenizer is small and the
+# scheduler holds per-call state)
+SHARED_COMPONENTS = ("text_encoder", "vae", "unet")
+
+
+def component_signature(module) -> tuple:
+    """Cheap structural fingerprint: class, parameter names, shapes and dtypes."""
+    return (type(module).__name__,) + tuple(
+        (name, tuple(value.shape), str(value.dtype))
+        for name, value in module.state_dict().items()
+        if hasattr(value, "shape")
+    )
+
+
+def component_hash(module) -> str:
+    """Content hash of a module's weights (blake2b over every tensor's bytes)."""
+    import torch
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(type(module).__name__.encode())
+
+    def update(value):
+        if isinstance(value, torch.Tensor):
+            if value.is_quantized:
+                per_channel = value.qscheme() in (torch.per_channel_affine, torch.per_channel_symmetric)
+                update((value.int_repr(), value.q_per_channel_scales() if per_channel else value.q_scale()))
+                return
+            tensor = value.detach().cpu().contiguous()
+            digest.update(f"{tensor.dtype}{tuple(tensor.shape)}".encode())
+            digest.update(tensor.reshape(-1).view(torch.uint8).numpy())
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                update(item)
+        else:
+            digest.update(repr(value).encode())
+
+    for name, value in module.state_dict().items():
+        digest.update(name.encode())
+        update(value)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    On-demand pipelines keyed by model id, with component sharing and
+    LRU eviction.
+    """
+
+    def __init__(
+        self,
+        factory,
+        default_model: str,
+        max_bytes: int = None,
+        max_models: int = None,
+    ):
+        """
+        Load the default model.
+
+        Args:
+            factory: fn(model_id) -> generator (SDTurboGenerator or WorkerPool)
+            default_model: Model used when a call names none; never evicted
+            max_bytes: Budget for the weights of all loaded models (shared
+                components counted once); None for no limit
+            max_models: Maximum number of loaded models; None for no limit
+        """
+        self.factory = factory
+        self.default_model = default_model
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+
+        self._models = OrderedDict()  # model id -> generator, least recently used first
+        self._last_used = {}
+        self._cache_probes = {}  # model id -> (result cache, namespace), kept after eviction
+        self._calls = {}  # generator -> calls in flight through the registry
+        self._retired = []  # evicted generators left for their last running call to close
+        self._hashes = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        self.loads = 0
+        self.evictions = 0
+        self.shared_components = 0
+
+        self.get(default_model)
+
+    def get(self, model: str = None):
+        """
+        Generator for `model` (default model if None), loading it if needed.
+
+        Calls made on the returned generator directly are not counted, so
+        eviction does not wait for them; use the registry's own methods.
+        """
+        model = model or self.default_model
+        with self._lock:
+            generator = self._models.get(model)
+            if generator is not None:
+                self._touch(model)
+                return generator
+
+        # One load at a time; calls for loaded models are not held up
+        with self._load_lock:
+            with self._lock:
+                generator = self._models.get(model)
+                if generator is not None:
+                    self._touch(model)
+                    return generator
+                # Make room first, assuming the newcomer is as big as the largest loaded model
+                sizes = [self._model_bytes(g) for g in self._models.values()]
+                self._evict_to_fit(incoming_bytes=max(sizes, default=0), incoming_models=1)
+
+            start = time.perf_counter()
+            generator = self.factory(model)
+            shared = self._share_components(generator)
+
+            with self._lock:
+                self._models[model] = generator
+                self._cache_probes[model] = (
+                    getattr(generator, "result_cache", None),
+                    getattr(generator, "cache_namespace", None),
+                )
+                self._touch(model)
+                self.loads += 1
+                self._evict_to_fit(keep=model)
+            print(f"Loaded model {model} in {time.perf_counter() - start:.1f}s"
+                  + (f" (sharing {', '.join(shared)})" if shared else ""))
+            return generator
+
+    def loaded(self) -> list[str]:
+        """Loaded model ids, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def evict(self, model: str) -> bool:
+        """
+        Drop a loaded model; False if not loaded.
+
+        New calls load it again. Calls already running on it finish first:
+        the last one closes it.
+        """
+        if model == self.default_model:
+            raise ValueError("The default model cannot be evicted")
+        with self._lock:
+            return self._evict(model)
+
+    def stats(self) -> dict:
+        """Loaded models, weight bytes and sharing/eviction counters."""
+        with self._lock:
+            models = [
+                {
+                    'model': model,
+                    'bytes': self._model_bytes(generator),
+                    'idle_s': round(time.monotonic() - self._last_used[model], 1),
+                    'running': self._calls.get(generator, 0),
+                }
+                for model, generator in self._models.items()
+            ]
+            total = self._total_bytes()
+        return {
+            'default_model': self.default_model,
+            'models': models,
+            'total_bytes': total,
+            'max_bytes': self.max_bytes,
+            'shared_bytes': sum(m['bytes'] for m in models) - total,
+            'shared_components': self.shared_components,
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
+
+    # Generator interface, routed by `model`
+
+    def generate_batch(self, prompts: list[str], model: str = None, **kwargs):
+        with self._using(model) as generator:
+            return generator.generate_batch(prompts, **kwargs)
+
+    def generate(self, prompt: str, model: str = None, **kwargs):
+        with self._using(model) as generator:
+            return generator.generate(prompt, **kwargs)
+
+    def cached_result(
+        self,
+        prompt: str,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: int = None,
+        model: str = None,
+    ):
+        """Cached image for these settings, without loading the model (None if unknown)."""
+        if seed is None:
+            return None
+        with self._lock:
+            result_cache, namespace = self._cache_probes.get(model or self.default_model, (None, None))
+        if result_cache is None or namespace is None:
+            return None
+        key = result_cache.make_key(
+            namespace, prompt, num_inference_steps, guidance_scale, width, height, seed
+        )
+        return result_cache.get(key)
+
+    def img2img(self, image, prompt: str, model: str = None, **kwargs):
+        with self._using(model) as generator:
+            return generator.img2img(image, prompt, **kwargs)
+
+    def variations(self, prompt: str, model: str = None, **kwargs):
+        with self._using(model) as generator:
+            return generator.variations(prompt, **kwargs)
+
+    def warmup(self, **kwargs) -> float:
+        with self._using(None) as generator:
+            return generator.warmup(**kwargs)
+
+    def __getattr__(self, name):
+        # Only called for attributes the registry itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    # Internals (callers hold self._lock unless noted)
+
+    @contextmanager
+    def _using(self, model: str):
+        """Generator for `model`, counted as in use until the block exits (no lock needed)."""
+        model = model or self.default_model
+        while True:
+            with self._lock:
+                generator = self._models.get(model)
+                if generator is not None:
+                    self._touch(model)
+                    self._calls[generator] = self._calls.get(generator, 0) + 1
+                    break
+            # Load outside the lock; if evicted again before use, retry
+            self.get(model)
+
+        try:
+            yield generator
+        finally:
+            with self._lock:
+                self._calls[generator] -= 1
+                if not self._calls[generator]:
+                    del self._calls[generator]
+                    if any(g is generator for g in self._retired):
+                        self._retired = [g for g in self._retired if g is not generator]
+                        self._close(generator)
+
+    def _touch(self, model: str):
+        self._models.move_to_end(model)
+        self._last_used[model] = time.monotonic()
+
+    @staticmethod
+    def _modules(generator) -> list:
+        """Weight-holding modules of an in-process generator (none for a pool)."""
+        pipe = getattr(generator, "pipe", None)
+        if pipe is None:
+            return []
+        return [
+            component for component in pipe.components.values()
+            if hasattr(component, "state_dict") and hasattr(component, "parameters")
+        ]
+
+    def _model_bytes(self, generator) -> int:
+        return sum(module_bytes(module) for module in self._modules(generator))
+
+    def _total_bytes(self) -> int:
+        unique = {}
+        for generator in self._models.values():
+            for module in self._modules(generator):
+                unique[id(module)] = module
+        return sum(module_bytes(module) for module in unique.values())
+
+    def _hash(self, module) -> str:
+        if module not in self._hashes:
+            self._hashes[module] = component_hash(module)
+        return self._hashes[module]
+
+    def _share_components(self, generator) -> list[str]:
+        """Swap the new pipeline's components for identical loaded ones (no lock needed)."""
+        pipe = getattr(generator, "pipe", None)
+        if pipe is None:
+            return []
+        with self._lock:
+            loaded = [getattr(g.pipe, name, None) for g in self._models.values()
+                      if hasattr(g, "pipe") for name in SHARED_COMPONENTS]
+        candidates = {}
+        for module in loaded:
+            if module is not None:
+                candidates.setdefault(component_signature(module), []).append(module)
+
+        shared = []
+        for name in SHARED_COMPONENTS:
+            module = getattr(pipe, name, None)
+            if module is None:
+                continue
+            for other in candidates.get(component_signature(module), []):
+                if other is not module and self._hash(other) == self._hash(module):
+                    setattr(pipe, name, other)
+                    shared.append(name)
+                    self.shared_components += 1
+                    break
+        if shared:
+            gc.collect()
+        return shared
+
+    def _evict_to_fit(self, keep: str = None, incoming_bytes: int = 0, incoming_models: int = 0):
+        """Evict least recently used models until the budgets hold."""
+        while True:
+            over_count = (
+                self.max_models is not None
+                and len(self._models) + incoming_models > self.max_models
+            )
+            over_bytes = (
+                self.max_bytes is not None
+                and self._total_bytes() + incoming_bytes > self.max_bytes
+            )
+            if not (over_count or over_bytes):
+                return
+            # Models with calls in flight stay until they are idle
+            victims = [
+                m for m, generator in self._models.items()
+                if m not in (keep, self.default_model) and not self._calls.get(generator)
+            ]
+            if not victims:
+                return
+            self._evict(victims[0])
+
+    def _evict(self, model: str) -> bool:
+        generator = self._models.pop(model, None)
+        if generator is None:
+            return False
+        self._last_used.pop(model, None)
+        self.evictions += 1
+        running = self._calls.get(generator, 0)
+        if running:
+            self._retired.append(generator)
+            print(f"Evicted model {model} (closing after {running} running calls)")
+        else:
+            print(f"Evicted model {model}")
+            self._close(generator)
+        return True
+
+    @staticmethod
+    def _close(generator):
+        if hasattr(generator, "close"):
+            generator.close()
+        del generator
+        gc.collect()
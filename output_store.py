@@ -0,0 +1,327 @@
+"""
+Indexed Output Store
+--------------------
+Stores generated images in sharded subdirectories with a SQLite index
+of their metadata (prompt, seed, steps, size, timings).
+
+Ids come from an AUTOINCREMENT primary key, so allocation is atomic and
+unique even with concurrent requests or several server processes, and
+naming, lookup and listing never scan the directory:
+
+    <root>/index.sqlite
+    <root>/000/001/anime_1042.png      id 1042 -> 000/001/
+    <root>/thumbs/000/001/anime_1042.webp
+
+Stored files never change, so each gets a content hash at write time for
+use as a strong ETag. Thumbnails are written by a background thread as
+images are saved (off the request path) and on demand for images stored
+before they existed.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from PIL import Image
+
+FILES_PER_SHARD = 1000
+
+# Thumbnails: longest side in pixels, and where they live under the root
+THUMBNAIL_SIZE = 256
+THUMBNAIL_DIR = "thumbs"
+THUMBNAIL_QUALITY = 80
+
+
+def content_hash(data: bytes) -> str:
+    """Strong ETag value for stored bytes (blake2b, 128 bits)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class OutputStore:
+    """
+    Append-only store of generated images with an O(log n) metadata index.
+    """
+
+    def __init__(
+        self,
+        root: str = "web_outputs",
+        prefix: str = "anime",
+        thumbnail_size: int = THUMBNAIL_SIZE,
+        background_thumbnails: bool = True,
+    ):
+        """
+        Args:
+            root: Directory holding the index and image shards
+            prefix: Filename prefix for stored images
+            thumbnail_size: Longest side of thumbnails in pixels
+            background_thumbnails: Write each thumbnail as its image is
+                saved (otherwise on first request)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.index_path = self.root / "index.sqlite"
+        self.thumbnail_size = thumbnail_size
+        self.background_thumbnails = background_thumbnails
+
+        self._local = threading.local()
+        self._thumbnailer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="thumbnailer"
+        )
+        self._pending: dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " filename TEXT UNIQUE,"
+                " mimetype TEXT NOT NULL,"
+                " bytes INTEGER,"
+                " prompt TEXT,"
+                " seed INTEGER,"
+                " steps INTEGER,"
+                " width INTEGER,"
+                " height INTEGER,"
+                " timings TEXT,"
+                " created_at REAL NOT NULL,"
+                " etag TEXT,"
+                " thumbnail TEXT)"
+            )
+            # Indexes created before ETags and thumbnails existed
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(images)")}
+            if "etag" not in columns:
+                conn.execute("ALTER TABLE images ADD COLUMN etag TEXT")
+            if "thumbnail" not in columns:
+                conn.execute("ALTER TABLE images ADD COLUMN thumbnail TEXT")
+                ids = [row['id'] for row in conn.execute("SELECT id FROM images")]
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "UPDATE images SET thumbnail = ? WHERE id = ?",
+                    [(self.thumbnail_for(image_id), image_id) for image_id in ids],
+                )
+                conn.execute("COMMIT")
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS images_thumbnail ON images (thumbnail)"
+            )
+
+    def save(
+        self,
+        data: bytes,
+        extension: str = "png",
+        mimetype: str = "image/png",
+        prompt: str = None,
+        seed: int = None,
+        steps: int = None,
+        width: int = None,
+        height: int = None,
+        timings: dict = None,
+    ) -> dict:
+        """
+        Store encoded image bytes and index their metadata.
+
+        Args:
+            data: Encoded image
+            extension: File extension (without dot)
+            mimetype: MIME type of `data`
+            prompt, seed, steps, width, height: Generation settings
+            timings: Optional stage durations in milliseconds
+
+        Returns:
+            Index record of the stored image (see `get()`); its thumbnail
+            is written in the background
+        """
+        with self._connect() as conn:
+            image_id = conn.execute(
+                "INSERT INTO images (mimetype, prompt, seed, steps, width, height,"
+                " timings, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (mimetype, prompt, seed, steps, width, height,
+                 json.dumps(timings) if timings else None, time.time()),
+            ).lastrowid
+
+        filename = self.filename_for(image_id, extension)
+        try:
+            self._write_file(self.root / filename, data)
+        except BaseException:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+            raise
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE images SET filename = ?, bytes = ?, etag = ?, thumbnail = ? WHERE id = ?",
+                (filename, len(data), content_hash(data), self.thumbnail_for(image_id), image_id),
+            )
+        if self.background_thumbnails:
+            with self._pending_lock:
+                self._pending[image_id] = self._thumbnailer.submit(
+                    self._make_thumbnail, image_id, data
+                )
+        return self.get(image_id)
+
+    def filename_for(self, image_id: int, extension: str = "png") -> str:
+        """Relative path of an image: two shard levels of FILES_PER_SHARD."""
+        outer, inner = divmod(image_id // FILES_PER_SHARD, FILES_PER_SHARD)
+        return f"{outer:03d}/{inner:03d}/{self.prefix}_{image_id}.{extension}"
+
+    def thumbnail_for(self, image_id: int) -> str:
+        """Relative path of an image's thumbnail (always WebP)."""
+        return f"{THUMBNAIL_DIR}/{self.filename_for(image_id, 'webp')}"
+
+    def thumbnail(self, image_id: int) -> Path:
+        """
+        Path of an image's thumbnail, waiting for a background write in
+        progress or making it now if there is none (older images).
+        """
+        with self._pending_lock:
+            future = self._pending.get(image_id)
+        if future is not None:
+            future.result()
+            return self.root / self.thumbnail_for(image_id)
+
+        path = self.root / self.thumbnail_for(image_id)
+        if not path.exists():
+            record = self.get(image_id)
+            if record is None or record['filename'] is None:
+                raise KeyError(image_id)
+            self._make_thumbnail(image_id, (self.root / record['filename']).read_bytes())
+        return path
+
+    def flush_thumbnails(self):
+        """Wait until every queued thumbnail is written."""
+        with self._pending_lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result()
+
+    def resolve(self, filename: str):
+        """
+        Look up a stored image or thumbnail by relative path.
+
+        Returns:
+            Dict with `path`, `mimetype` and a strong `etag`, or None for
+            files the index does not know or is still saving (the
+            thumbnail is made if needed)
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, filename, mimetype, etag FROM images"
+                " WHERE (filename = ? OR thumbnail = ?) AND filename IS NOT NULL",
+                (filename, filename),
+            ).fetchone()
+        if row is None:
+            return None
+        if row['filename'] == filename:
+            return {'path': self.root / filename, 'mimetype': row['mimetype'], 'etag': row['etag']}
+        return {
+            'path': self.thumbnail(row['id']),
+            'mimetype': 'image/webp',
+            # Thumbnails are derived from the image, so its hash plus the
+            # thumbnail settings identify their bytes
+            'etag': f"{row['etag']}-t{self.thumbnail_size}q{THUMBNAIL_QUALITY}" if row['etag'] else None,
+        }
+
+    def get(self, image_id: int):
+        """Index record for one image, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM images WHERE id = ?", (image_id,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def get_by_filename(self, filename: str):
+        """Index record for a stored relative path, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM images WHERE filename = ?", (filename,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def list(self, limit: int = 50, before: int = None) -> list[dict]:
+        """
+        Newest-first page of stored images.
+
+        Args:
+            limit: Maximum number of records
+            before: Only return images with an id below this (cursor paging)
+        """
+        query = "SELECT * FROM images WHERE filename IS NOT NULL"
+        args = []
+        if before is not None:
+            query += " AND id < ?"
+            args.append(before)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        return [self._record(row) for row in rows]
+
+    def count(self) -> int:
+        """Number of stored images."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM images WHERE filename IS NOT NULL"
+            ).fetchone()[0]
+
+    def close(self):
+        """Finish queued thumbnails and stop the background thread."""
+        self._thumbnailer.shutdown(wait=True)
+
+    def _make_thumbnail(self, image_id: int, data: bytes):
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.draft("RGB", (self.thumbnail_size, self.thumbnail_size))  # JPEG: decode at reduced size
+                image = image.convert("RGB")
+            image.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+            self._write_file(self.root / self.thumbnail_for(image_id), buffer.getvalue())
+        finally:
+            with self._pending_lock:
+                self._pending.pop(image_id, None)
+
+    @staticmethod
+    def _write_file(path: Path, data: bytes):
+        # Write to a temp file and rename so readers never see partial images
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> dict:
+        record = dict(row)
+        record['timings'] = json.loads(record['timings']) if record['timings'] else None
+        return record
+
+    @contextmanager
+    def _connect(self):
+        # One long-lived connection per thread: closing the last connection
+        # to a WAL database checkpoints and fsyncs it (~40 ms per close).
+        # The timeout waits out other processes holding the write lock.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
@@ -0,0 +1,91 @@
+"""
+Prompt Embedding Cache
+----------------------
+Bounded LRU cache for CLIP text-encoder outputs.
+
+SD-Turbo spends a noticeable share of a 1-step generation in the text
+encoder. Prompts are reused constantly (fixed use-case dictionaries,
+web UI retries), so caching `prompt_embeds` skips that work entirely.
+Entries are evicted by count and by total tensor memory.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+def tensor_nbytes(tensor) -> int:
+    """Memory held by a tensor's elements, in bytes."""
+    return tensor.element_size() * tensor.nelement()
+
+
+class PromptEmbeddingCache:
+    """
+    Thread-safe LRU mapping of prompt string -> prompt embedding tensor.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 ** 2):
+        """
+        Args:
+            max_entries: Maximum number of prompts kept (0 disables caching)
+            max_bytes: Maximum total size of cached tensors in bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, prompt: str):
+        """Return the cached embedding for `prompt`, or None on a miss."""
+        with self._lock:
+            embeds = self._entries.get(prompt)
+            if embeds is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(prompt)
+            self.hits += 1
+            return embeds
+
+    def put(self, prompt: str, embeds):
+        """Insert an embedding, evicting least recently used entries to fit."""
+        size = tensor_nbytes(embeds)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(prompt, None)
+            if old is not None:
+                self.nbytes -= tensor_nbytes(old)
+
+            self._entries[prompt] = embeds
+            self.nbytes += size
+
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= tensor_nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached embedding (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,100 @@
+"""
+Prompt Domain Classifier
+------------------------
+Compiles the domain keyword lists into one regular expression with a
+named group per category, so a lowercased prompt is classified in a
+single pass. (Matching lowercased text is markedly faster than
+re.IGNORECASE; the case-insensitive pattern is only used to rewrite
+blocked prompts into suggestions.)
+
+Keywords match whole words only ("real" no longer fires inside
+"realistic"), with an optional plural "s"/"es" ("photos", "heroes").
+Multi-word keywords also match across hyphens and extra spaces
+("cel-shaded", "magical  girl").
+"""
+
+import re
+
+# Categories in match priority order (see PromptClassifier.classify)
+CATEGORIES = ("realistic", "non_anime", "anime")
+
+
+def _alternation(keywords) -> str:
+    """Regex alternation of keywords, longest first so the longest wins."""
+    patterns = []
+    for keyword in sorted({k.lower() for k in keywords}, key=len, reverse=True):
+        words = [re.escape(word) for word in keyword.split()]
+        patterns.append(r"[\s\-]+".join(words))
+    return "|".join(patterns) or r"(?!)"
+
+
+class PromptClassifier:
+    """
+    Single-pass anime / out-of-domain prompt classifier.
+    """
+
+    def __init__(self, anime_keywords, realistic_keywords, non_anime_indicators):
+        """
+        Args:
+            anime_keywords: Words that mark a prompt as anime-themed
+            realistic_keywords: Words that always block a prompt
+                (photographic requests)
+            non_anime_indicators: Words that block a prompt unless it
+                also has an anime keyword
+        """
+        groups = {
+            'realistic': realistic_keywords,
+            'non_anime': non_anime_indicators,
+            'anime': anime_keywords,
+        }
+        alternatives = "|".join(
+            f"(?P<{category}>{_alternation(groups[category])})" for category in CATEGORIES
+        )
+        source = rf"\b(?:{alternatives})(?:e?s)?\b"
+        self.pattern = re.compile(source)
+        self._pattern_ignorecase = re.compile(source, re.IGNORECASE)
+
+    def matches(self, prompt: str) -> dict[str, list]:
+        """Keyword matches in `prompt` (lowercased), grouped by category."""
+        found = {category: [] for category in CATEGORIES}
+        for match in self.pattern.finditer(prompt.lower()):
+            found[match.lastgroup].append(match)
+        return found
+
+    def classify(self, prompt: str) -> tuple[bool, str]:
+        """
+        Check if a prompt is within the anime/animated domain.
+
+        Returns:
+            (is_valid, suggestion) - is_valid=True if anime-related,
+                                     suggestion provides anime alternative
+        """
+        found = self.matches(prompt)
+
+        # Explicit realistic requests: drop those words from the suggestion
+        if found['realistic']:
+            anime_version = self._pattern_ignorecase.sub(
+                lambda m: "" if m.lastgroup == 'realistic' else m.group(0), prompt
+            )
+            anime_version = " ".join(anime_version.split()).strip(" ,;") or "an anime scene"
+            return False, f"anime style, {anime_version}"
+
+        has_anime_keyword = bool(found['anime'])
+
+        # Non-anime terms without anything anime-themed
+        if found['non_anime'] and not has_anime_keyword:
+            return False, f"anime style, {prompt}"
+
+        # Neutral prompt: allow but suggest anime enhancement
+        if not has_anime_keyword:
+            return True, f"anime style, {prompt}"
+
+        return True, prompt
+
+    def classify_many(self, prompts) -> list[dict]:
+        """Classify a list of prompts (order preserved)."""
+        results = []
+        for prompt in prompts:
+            is_valid, suggestion = self.classify(prompt)
+            results.append({'prompt': prompt, 'is_anime': is_valid, 'suggestion': suggestion})
+        return results
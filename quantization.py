@@ -0,0 +1,101 @@
+"""
+Int8 Dynamic Quantization
+-------------------------
+Opt-in CPU mode that swaps every `nn.Linear` in the UNet (attention
+projections, feed-forward and time-embedding layers) and in the CLIP
+text encoder for a dynamically quantized int8 version. Weights are
+stored as int8; activations are quantized on the fly per call.
+
+Converting takes a while, so quantized components are pickled to
+`quantized_cache/<key>/` and handed straight to `from_pretrained` on
+later startups (the fp32 UNet and text encoder are then never loaded).
+The key covers the model id, the torch version and the quantization
+config. The cache holds pickled modules: only point it at a directory
+you trust.
+
+Quality/latency/memory tradeoff vs fp32:
+
+    python benchmark.py profile --profile baseline --quantize
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+QUANT_CACHE_DIR = Path("quantized_cache")
+QUANTIZED_COMPONENTS = ("unet", "text_encoder")
+QUANT_CONFIG = "dynamic-qint8-linear"
+
+
+def quantize_module(module):
+    """Replace the module's Linear layers with dynamic int8 ones (in place)."""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def module_bytes(module) -> int:
+    """Bytes held by a module's weights, including packed int8 parameters."""
+    import torch
+
+    def size(value):
+        if isinstance(value, torch.Tensor):
+            return value.nelement() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size(item) for item in value)
+        return 0
+
+    return sum(size(value) for value in module.state_dict().values())
+
+
+def cache_dir_for(model_id: str, cache_root=QUANT_CACHE_DIR) -> Path:
+    """Cache directory for one model under the current torch / config."""
+    import torch
+
+    key = hashlib.sha256(
+        json.dumps([str(model_id), torch.__version__, QUANT_CONFIG]).encode()
+    ).hexdigest()[:16]
+    return Path(cache_root) / key
+
+
+def load_quantized(model_id: str, cache_root=QUANT_CACHE_DIR) -> dict:
+    """
+    Quantized components from the cache, as `from_pretrained` overrides.
+
+    Returns:
+        {'unet': ..., 'text_encoder': ...}, or {} on a cache miss
+    """
+    import torch
+
+    cache_dir = cache_dir_for(model_id, cache_root)
+    paths = {name: cache_dir / f"{name}.pt" for name in QUANTIZED_COMPONENTS}
+    if not all(path.exists() for path in paths.values()):
+        return {}
+
+    print(f"Loading int8 components from {cache_dir}")
+    return {
+        name: torch.load(path, map_location="cpu", weights_only=False)
+        for name, path in paths.items()
+    }
+
+
+def quantize_pipeline(pipe, model_id: str, cache_root=QUANT_CACHE_DIR):
+    """Quantize the pipeline's UNet and text encoder and cache them on disk."""
+    import torch
+
+    before = sum(module_bytes(getattr(pipe, name)) for name in QUANTIZED_COMPONENTS)
+    for name in QUANTIZED_COMPONENTS:
+        quantize_module(getattr(pipe, name))
+    after = sum(module_bytes(getattr(pipe, name)) for name in QUANTIZED_COMPONENTS)
+    print(f"Quantized UNet + text encoder to int8: "
+          f"{before / 1024 ** 2:.0f} MiB -> {after / 1024 ** 2:.0f} MiB")
+
+    cache_dir = cache_dir_for(model_id, cache_root)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name in QUANTIZED_COMPONENTS:
+        # Write then rename so a crash never leaves a truncated cache entry
+        tmp_path = cache_dir / f"{name}.pt.tmp"
+        torch.save(getattr(pipe, name), tmp_path)
+        tmp_path.replace(cache_dir / f"{name}.pt")
+    print(f"Cached int8 components in {cache_dir}")
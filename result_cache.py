@@ -0,0 +1,187 @@
+"""
+Content-Addressed Result Cache
+------------------------------
+Persistent on-disk cache of generated images.
+
+A seeded request with the same (model_id, prompt, steps, guidance, width,
+height, seed) always produces the same image, so the PNG is stored under
+a hash of those parameters and served back in milliseconds next time.
+
+Layout:
+    <cache_dir>/index.sqlite        key -> file, size, last access
+    <cache_dir>/ab/abcdef....png    images sharded by key prefix
+
+Files are written to a temporary name and atomically renamed, and the
+SQLite index serialises eviction, so several processes can share one
+cache directory.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from PIL import Image
+
+
+class ResultCache:
+    """
+    Size-limited LRU cache of generated PNG images on disk.
+    """
+
+    def __init__(self, cache_dir: str = "result_cache", max_bytes: int = 1024 ** 3):
+        """
+        Args:
+            cache_dir: Directory holding the index and cached images
+            max_bytes: Total size of cached PNGs before LRU eviction kicks in
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / "index.sqlite"
+
+        self.hits = 0
+        self.misses = 0
+
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)"
+            )
+
+    @staticmethod
+    def make_key(
+        model_id: str,
+        prompt: str,
+        num_inference_steps: int,
+        guidance_scale: float,
+        width: int,
+        height: int,
+        seed: int,
+    ) -> str:
+        """Hash the parameters that fully determine a generated image."""
+        params = [
+            model_id, prompt, int(num_inference_steps), float(guidance_scale),
+            int(width), int(height), int(seed),
+        ]
+        payload = json.dumps(params, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a cached image.
+
+        Returns:
+            PIL Image on a hit, None on a miss
+        """
+        path = self._path(key)
+        with self._connect() as conn:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+
+        try:
+            with Image.open(path) as cached:
+                image = cached.convert("RGB")
+        except (FileNotFoundError, OSError):
+            # Evicted (or half-written) by another process - treat as a miss
+            with self._connect() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return image
+
+    def put(self, key: str, image: Image.Image):
+        """Store an image under `key` and evict old entries past `max_bytes`."""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        # Write to a temp file in the same directory, then rename atomically
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="PNG")
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+                (key, path.stat().st_size, time.time()),
+            )
+        self._evict()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and on-disk occupancy."""
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': total,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits `max_bytes`."""
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so only one process evicts
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                for key, size in conn.execute(
+                    "SELECT key, size FROM entries ORDER BY last_access"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(key)
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in victims])
+            conn.execute("COMMIT")
+
+        for key in victims:
+            self._path(key).unlink(missing_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.png"
+
+    @contextmanager
+    def _connect(self):
+        # One long-lived connection per thread: closing the last connection
+        # to a WAL database checkpoints and fsyncs it (~40 ms per close).
+        # The timeout waits out other processes holding the write lock.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
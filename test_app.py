@@ -0,0 +1,295 @@
+"""
+Web App Tests
+-------------
+Flask routes on the tiny random-weight pipeline (see conftest.py). The
+app's caches and outputs go to a temporary working directory.
+"""
+
+import io
+import json
+import threading
+
+import pytest
+from PIL import Image
+
+from batching import MicroBatcher
+from model_loader import ModelLoader
+from output_store import OutputStore
+
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def web(tiny_model, tmp_path_factory):
+    """The Flask app on the tiny model, with outputs in a temporary store."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("web"))
+        import app as web
+
+        output_dir = tmp_path_factory.mktemp("web_outputs")
+        patch.setattr(web, "MODEL_ID", tiny_model)
+        patch.setattr(web.generator, "_warmup", None)
+        patch.setattr(web, "OUTPUT_DIR", output_dir)
+        patch.setattr(web, "output_store", OutputStore(output_dir))
+        web.app.test_client().get('/ready')
+        web.generator.wait()
+        yield web
+
+
+def png_bytes(color, size=(SIZE, SIZE)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def read_events(response):
+    """Parse a Server-Sent Events response into (event, payload) pairs."""
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith(":"):
+            continue
+        lines = dict(line.split(": ", 1) for line in text.strip().splitlines())
+        yield lines['event'], json.loads(lines['data'])
+
+
+def test_gallery_pages_with_a_cursor(web):
+    stored = [
+        web.output_store.save(png_bytes((40 * i, 0, 0)), prompt=f"gallery {i}", seed=i)
+        for i in range(5)
+    ]
+    client = web.app.test_client()
+
+    ids, cursor = [], None
+    while True:
+        query = f"?limit=2&before={cursor}" if cursor is not None else "?limit=2"
+        page = client.get(f"/gallery{query}").get_json()
+        assert len(page['images']) <= 2
+        ids += [image['id'] for image in page['images']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert ids[:5] == sorted((record['id'] for record in stored), reverse=True)
+    assert ids == sorted(ids, reverse=True)
+    assert client.get("/gallery?limit=abc").status_code == 400
+
+
+def test_outputs_are_immutable_and_revalidate(web):
+    record = web.output_store.save(png_bytes("blue"), prompt="etag check")
+    client = web.app.test_client()
+
+    response = client.get(f"/outputs/{record['filename']}")
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{record["etag"]}"'
+    assert "immutable" in response.headers['Cache-Control']
+    assert "max-age=31536000" in response.headers['Cache-Control']
+
+    revalidated = client.get(
+        f"/outputs/{record['filename']}", headers={'If-None-Match': response.headers['ETag']}
+    )
+    assert revalidated.status_code == 304
+
+    thumbnail = client.get(f"/outputs/{record['thumbnail']}")
+    assert thumbnail.status_code == 200
+    assert thumbnail.mimetype == "image/webp"
+    assert "immutable" in thumbnail.headers['Cache-Control']
+
+
+def test_job_events_stream_progress_then_done(web, monkeypatch):
+    # Hold the worker after every step until the stream has reported it
+    seen = threading.Event()
+    generate_batch = web.generator.generate_batch
+
+    def paced_generate_batch(prompts, step_callback=None, **kwargs):
+        def on_step(step, total_steps, latents):
+            step_callback(step, total_steps, latents)
+            assert seen.wait(5)
+            seen.clear()
+        return generate_batch(prompts, step_callback=on_step, **kwargs)
+
+    monkeypatch.setattr(web.generator, "generate_batch", paced_generate_batch)
+    client = web.app.test_client()
+    created = client.post('/jobs', json={
+        'prompt': "anime cat", 'steps': 2, 'width': SIZE, 'height': SIZE, 'previews': True,
+    })
+    assert created.status_code == 202
+
+    events = []
+    stream = client.get(created.get_json()['events_url'], buffered=False)
+    for event, payload in read_events(stream):
+        events.append((event, payload))
+        if event == 'progress' and payload['progress']:
+            seen.set()
+        if event == 'done':
+            break
+
+    steps = [payload for event, payload in events if event == 'progress' and payload['progress']]
+    assert [payload['progress'] for payload in steps] == [
+        {'step': 1, 'total': 2}, {'step': 2, 'total': 2}
+    ]
+    assert all(payload['preview'].startswith("data:image/jpeg;base64,") for payload in steps)
+    event, payload = events[-1]
+    assert event == 'done'
+    assert payload['status'] == "succeeded"
+    assert client.get(payload['url']).status_code == 200
+
+
+def test_unknown_job_events_return_404(web):
+    assert web.app.test_client().get('/jobs/nope/events').status_code == 404
+
+
+@pytest.mark.parametrize("accept, fmt", [
+    ("image/webp", "WEBP"),
+    ("image/png", "PNG"),
+    ("image/jpeg;q=0.9, application/json;q=0.5", "JPEG"),
+])
+def test_accept_header_returns_the_encoded_image(web, accept, fmt):
+    client = web.app.test_client()
+    response = client.post(
+        '/generate', json={'prompt': "anime cat", 'width': SIZE, 'height': SIZE},
+        headers={'Accept': accept},
+    )
+    assert response.status_code == 200
+    assert response.headers['Vary'] == "Accept"
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.format == fmt
+        assert image.size == (SIZE, SIZE)
+
+    # The same bytes were stored
+    stored = client.get(response.headers['Content-Location'])
+    assert stored.data == response.data
+
+
+def test_default_response_is_json_with_a_url(web):
+    client = web.app.test_client()
+    response = client.post('/generate', json={'prompt': "anime cat", 'width': SIZE, 'height': SIZE})
+    body = response.get_json()
+    assert body['success']
+    assert 'image' not in body
+    assert client.get(body['url']).mimetype == "image/png"
+
+
+def test_requests_wait_for_the_model(web, monkeypatch):
+    release = threading.Event()
+    loaded = web.generator.wait()
+
+    def slow_factory():
+        assert release.wait(5)
+        return loaded
+
+    monkeypatch.setattr(web, "generator", ModelLoader(slow_factory))
+    client = web.app.test_client()
+    response = client.post('/generate', json={'prompt': "anime cat"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "5"
+    assert client.get('/ready').get_json()['state'] == "loading"
+
+    release.set()
+    web.generator.wait(5)
+    assert client.get('/ready').status_code == 200
+
+
+def test_validate_bulk_classifies_in_order(web):
+    client = web.app.test_client()
+    response = client.post('/validate_bulk', json={'prompts': ["anime cat", "photo of a car"]})
+    body = response.get_json()
+    assert [result['is_anime'] for result in body['results']] == [True, False]
+    assert (body['valid'], body['blocked']) == (1, 1)
+
+    assert client.post('/validate_bulk', json={'prompts': "anime cat"}).status_code == 400
+    too_many = ["anime cat"] * (web.MAX_BULK_PROMPTS + 1)
+    assert client.post('/validate_bulk', json={'prompts': too_many}).status_code == 413
+
+
+def test_sizes_that_cannot_fit_return_413(web, monkeypatch):
+    monkeypatch.setattr(web.admission, "max_bytes", 1)
+    rejected = web.admission.rejected
+    response = web.app.test_client().post(
+        '/generate', json={'prompt': "anime cat", 'width': SIZE, 'height': SIZE}
+    )
+    assert response.status_code == 413
+    assert response.get_json()['required_mb'] >= 0
+    assert web.admission.rejected == rejected + 1
+
+
+def test_busy_memory_returns_503(web, monkeypatch):
+    needed = web.memory_estimator.estimate(SIZE, SIZE)
+    monkeypatch.setattr(web.admission, "max_bytes", int(1.5 * needed))
+    monkeypatch.setattr(web.admission, "timeout", 0.1)
+
+    with web.admission.reserve(SIZE, SIZE):
+        response = web.app.test_client().post(
+            '/generate', json={'prompt': "anime cat", 'width': SIZE, 'height': SIZE}
+        )
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "5"
+
+
+@pytest.mark.parametrize("field, value", [
+    ('steps', "x"), ('steps', 0), ('steps', 2.5), ('width', 60), ('height', 4096), ('seed', -1),
+    ('quality', 101), ('quality', "abc"), ('timeout', 0), ('timeout', -1), ('timeout', "nan"),
+    ('timeout', "inf"),
+])
+def test_invalid_settings_return_400(web, field, value, monkeypatch):
+    # Rejected before anything is queued
+    monkeypatch.setattr(web.batcher, "generate", None)
+    response = web.app.test_client().post(
+        '/generate', json={'prompt': "anime cat", field: value}
+    )
+    assert response.status_code == 400
+    assert field in response.get_json()['message']
+
+
+def test_full_queue_returns_429(web, monkeypatch):
+    batcher = MicroBatcher(web.generator, max_queue={'interactive': 0, 'bulk': 0})
+    monkeypatch.setattr(web, "batcher", batcher)
+    try:
+        response = web.app.test_client().post(
+            '/generate', json={'prompt': "anime cat", 'width': SIZE, 'height': SIZE}
+        )
+    finally:
+        batcher.close()
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_unknown_models_return_400(web):
+    client = web.app.test_client()
+    response = client.post('/generate', json={'prompt': "anime cat", 'model': "nope"})
+    assert response.status_code == 400
+    assert response.get_json()['models'] == sorted(web.MODELS)
+    assert client.get('/models').get_json()['registry']['default_model'] == web.MODEL_ID
+
+
+def test_seed_variations(web):
+    response = web.app.test_client().post('/variations', json={
+        'prompt': "anime cat", 'seed': 5, 'count': 3, 'steps': 1, 'width': SIZE, 'height': SIZE,
+    })
+    body = response.get_json()
+    assert body['mode'] == "seed"
+    assert [image['seed'] for image in body['images']] == [5, 5, 5]
+    assert [image['variation_seed'] for image in body['images']] == [6, 7, 8]
+
+
+def test_image_variations_keep_the_source_size(web):
+    client = web.app.test_client()
+    source = web.output_store.save(png_bytes("red", (72, 48)), prompt="source")
+    response = client.post('/variations', json={
+        'prompt': "anime cat", 'seed': 5, 'count': 2, 'source': f"/outputs/{source['filename']}",
+    })
+    body = response.get_json()
+    assert body['mode'] == "img2img"
+    assert [image['seed'] for image in body['images']] == [5, 6]
+    with Image.open(io.BytesIO(client.get(body['images'][0]['url']).data)) as image:
+        assert image.size == (72, 48)
+
+
+@pytest.mark.parametrize("field, value", [
+    ('count', 0), ('count', 9), ('count', 2.5), ('count', "2.5"), ('strength', 0),
+    ('seed', 2 ** 63 - 1),
+])
+def test_invalid_variation_settings_return_400(web, field, value):
+    response = web.app.test_client().post(
+        '/variations', json={'prompt': "anime cat", field: value}
+    )
+    assert response.status_code == 400
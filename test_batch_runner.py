@@ -0,0 +1,109 @@
+"""
+Batch Runner Tests
+------------------
+Manifest parsing, sharding, seeding and checkpointed resume of
+run_manifest, on a stand-in generator.
+"""
+
+import json
+
+import pytest
+from PIL import Image
+
+from batch_runner import load_checkpoint, output_filename, read_manifest, run_manifest
+
+SIZE = 64
+
+
+class RecordingGenerator:
+    """Stand-in generator: records calls, optionally failing on one of them."""
+
+    dtype_bytes = 4
+
+    def __init__(self, fail_on_call: int = None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    def generate_batch(self, prompts, seeds=None, **kwargs):
+        self.calls.append((list(prompts), list(seeds)))
+        if len(self.calls) == self.fail_on_call:
+            raise RuntimeError("worker crashed")
+        return [Image.new("RGB", (SIZE, SIZE)) for _ in prompts]
+
+
+def write_manifest(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return write_manifest(tmp_path / "prompts.jsonl", [
+        {'id': f"item-{i}", 'prompt': f"anime cat {i}"} for i in range(5)
+    ])
+
+
+def test_csv_and_jsonl_records_are_normalised(tmp_path):
+    csv_path = tmp_path / "prompts.csv"
+    csv_path.write_text("id,prompt,seed,filename\na,anime cat,7,\n,anime dog,,dog.png\n")
+    assert list(read_manifest(csv_path)) == [
+        {'index': 0, 'id': "a", 'prompt': "anime cat", 'seed': 7, 'filename': None},
+        {'index': 1, 'id': "1", 'prompt': "anime dog", 'seed': None, 'filename': "dog.png"},
+    ]
+
+    bad = write_manifest(tmp_path / "bad.jsonl", [{'id': "x"}])
+    with pytest.raises(ValueError):
+        list(read_manifest(bad))
+
+
+def test_output_filenames_are_filesystem_safe():
+    assert output_filename({'id': "a/b c", 'filename': None}) == "a_b_c.png"
+    assert output_filename({'id': "a", 'filename': "custom.png"}) == "custom.png"
+
+
+def test_interrupted_run_resumes_where_it_stopped(manifest, tmp_path):
+    output_dir = tmp_path / "out"
+    with pytest.raises(RuntimeError):
+        run_manifest(RecordingGenerator(fail_on_call=2), manifest, output_dir, batch_size=2)
+
+    checkpoint = output_dir / "checkpoint-0-of-1.jsonl"
+    assert load_checkpoint(checkpoint) == {"item-0", "item-1"}
+    assert sorted(path.name for path in output_dir.glob("*.png")) == ["item-0.png", "item-1.png"]
+
+    generator = RecordingGenerator()
+    summary = run_manifest(generator, manifest, output_dir, batch_size=2)
+    assert (summary['generated'], summary['skipped']) == (3, 2)
+    assert [prompts for prompts, _ in generator.calls] == [
+        ["anime cat 2", "anime cat 3"], ["anime cat 4"]
+    ]
+    assert len(load_checkpoint(checkpoint)) == 5
+    assert len(list(output_dir.glob("*.png"))) == 5
+
+
+def test_torn_checkpoint_lines_are_ignored(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text('{"id": "a"}\n{"id": "b"}\n{"id": "c')
+    assert load_checkpoint(checkpoint) == {"a", "b"}
+
+
+def test_shards_are_disjoint_and_seeds_stable(tmp_path):
+    manifest = write_manifest(tmp_path / "prompts.jsonl", [
+        {'id': f"item-{i}", 'prompt': f"anime cat {i}", **({'seed': 5} if i == 4 else {})}
+        for i in range(7)
+    ])
+
+    seen = []
+    for shard in range(3):
+        generator = RecordingGenerator()
+        run_manifest(
+            generator, manifest, tmp_path / "out", shard=shard, num_shards=3,
+            batch_size=8, seed_base=100,
+        )
+        seen += generator.calls
+        assert (tmp_path / "out" / f"checkpoint-{shard}-of-3.jsonl").exists()
+
+    assert seen == [
+        (["anime cat 0", "anime cat 3", "anime cat 6"], [100, 103, 106]),
+        (["anime cat 1", "anime cat 4"], [101, 5]),
+        (["anime cat 2", "anime cat 5"], [102, 105]),
+    ]
@@ -0,0 +1,224 @@
+"""
+Micro-Batcher Tests
+-------------------
+Batch formation, priorities, deadlines, queue bounds and error
+propagation, run against a stand-in generator that records each
+`generate_batch` call.
+"""
+
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher, QueueFull, QueueTimeout
+
+
+class BlockingGenerator:
+    """Stand-in generator: records batches, holds each until released."""
+
+    def __init__(self):
+        self.batches = []
+        self.settings = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = None
+
+    def generate_batch(self, prompts, **kwargs):
+        self.started.set()
+        assert self.release.wait(5)
+        self.batches.append(list(prompts))
+        self.settings.append(kwargs)
+        if self.error:
+            raise self.error
+        return [f"image of {prompt}" for prompt in prompts]
+
+    def describe(self, prompt, width, height):
+        self.batches.append([f"describe {prompt}"])
+        return f"{prompt} at {width}x{height}"
+
+    def cached_result(self, prompt, *settings):
+        seed = settings[-1]
+        return f"cached image of {prompt}" if seed == 0 else None
+
+
+def blocked(generator, **kwargs):
+    """A batcher whose worker is busy with a "blocker" request."""
+    batcher = MicroBatcher(generator, batch_window=0.0, **kwargs)
+    blocker = batcher.submit("blocker")
+    assert generator.started.wait(5)
+    return batcher, blocker
+
+
+def test_compatible_requests_share_a_batch():
+    generator = BlockingGenerator()
+    batcher, blocker = blocked(generator)
+    same = [batcher.submit(f"cat {i}", width=256, height=256) for i in range(3)]
+    other = batcher.submit("dog", width=512, height=512)
+
+    generator.release.set()
+    assert [future.result(5) for future in same] == [f"image of cat {i}" for i in range(3)]
+    assert other.result(5) == "image of dog"
+    batcher.close()
+
+    assert generator.batches == [["blocker"], ["cat 0", "cat 1", "cat 2"], ["dog"]]
+    assert generator.settings[1]['width'] == 256
+    assert batcher.stats()['avg_batch_size'] == 1.67
+
+
+def test_batches_are_split_at_max_batch_size():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator, max_batch_size=2)
+    futures = [batcher.submit(f"cat {i}") for i in range(5)]
+
+    generator.release.set()
+    for future in futures:
+        future.result(5)
+    batcher.close()
+    assert [len(batch) for batch in generator.batches] == [1, 2, 2, 1]
+
+
+def test_seeded_requests_share_batches_and_use_the_cache():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator)
+    futures = [batcher.submit("cat", seed=seed) for seed in (0, 1, None)]
+
+    generator.release.set()
+    assert [future.result(5) for future in futures] == [
+        "cached image of cat", "image of cat", "image of cat"
+    ]
+    batcher.close()
+    assert generator.batches[1:] == [["cat", "cat"]]
+    assert generator.settings[1]['seeds'] == [1, None]
+
+
+def test_requests_for_different_models_never_share_a_batch():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator)
+    futures = [batcher.submit("cat", model=model) for model in ("a", "b", "a", None)]
+
+    generator.release.set()
+    for future in futures:
+        future.result(5)
+    batcher.close()
+    assert generator.batches[1:] == [["cat", "cat"], ["cat"], ["cat"]]
+    assert [settings.get('model') for settings in generator.settings[1:]] == ["a", "b", None]
+
+
+def test_other_calls_run_alone_in_queue_order():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator)
+    first = batcher.submit("cat")
+    call = batcher.submit_call("describe", width=64, height=64, prompt="dog")
+    second = batcher.submit("cat")
+
+    generator.release.set()
+    assert call.result(5) == "dog at 64x64"
+    second.result(5)
+    batcher.close()
+    assert generator.batches[1:] == [["cat", "cat"], ["describe dog"]]
+
+
+def test_workers_run_batches_concurrently():
+    generator = BlockingGenerator()
+    batcher = MicroBatcher(generator, batch_window=0.0, workers=2)
+    first = batcher.submit("cat", width=256, height=256)
+    assert generator.started.wait(5)
+    generator.started.clear()
+    second = batcher.submit("dog", width=512, height=512)
+
+    # The second batch starts while the first is still held
+    assert generator.started.wait(5)
+    generator.release.set()
+    assert first.result(5) == "image of cat"
+    assert second.result(5) == "image of dog"
+    batcher.close()
+
+
+def test_requests_queued_past_max_wait_are_dropped_unrun():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator, max_wait=0.05)
+    late = batcher.submit("late")
+    time.sleep(0.1)
+
+    generator.release.set()
+    with pytest.raises(QueueTimeout):
+        late.result(5)
+    batcher.close()
+    assert ["late"] not in generator.batches
+    assert batcher.requests_expired == 1
+
+
+def test_interactive_requests_run_before_bulk():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator, max_batch_size=1)
+    bulk = [batcher.submit(f"bulk {i}", priority="bulk") for i in range(2)]
+    interactive = batcher.submit("interactive", priority="interactive")
+
+    generator.release.set()
+    for future in bulk + [interactive]:
+        future.result(5)
+    batcher.close()
+    assert generator.batches == [["blocker"], ["interactive"], ["bulk 0"], ["bulk 1"]]
+
+
+
+def test_requests_without_a_priority_are_bulk():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator, max_batch_size=1)
+    unlabelled = batcher.submit("unlabelled")
+    call = batcher.submit_call("describe", width=64, height=64, prompt="call")
+    interactive = batcher.submit("interactive", priority="interactive")
+    assert batcher.queue_depth("bulk") == 2
+
+    generator.release.set()
+    for future in (unlabelled, call, interactive):
+        future.result(5)
+    batcher.close()
+    assert generator.batches[1] == ["interactive"]
+
+
+def test_requests_past_their_deadline_are_dropped_unrun():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator)
+    late = batcher.submit("late", deadline=time.monotonic() + 0.05)
+    on_time = batcher.submit("on time", width=256, height=256, deadline=time.monotonic() + 60)
+    time.sleep(0.1)
+
+    generator.release.set()
+    with pytest.raises(QueueTimeout):
+        late.result(5)
+    assert on_time.result(5) == "image of on time"
+    batcher.close()
+    assert ["late"] not in generator.batches
+
+
+def test_full_queues_reject_with_a_retry_estimate():
+    generator = BlockingGenerator()
+    batcher, _ = blocked(generator, max_queue={'bulk': 2})
+    queued = [batcher.submit(f"bulk {i}", priority="bulk") for i in range(2)]
+
+    with pytest.raises(QueueFull) as error:
+        batcher.submit("one too many", priority="bulk")
+    assert error.value.retry_after >= 1
+    assert batcher.stats()['requests_rejected'] == 1
+    # Other classes have their own bound
+    queued.append(batcher.submit("interactive", priority="interactive"))
+
+    generator.release.set()
+    for future in queued:
+        future.result(5)
+    batcher.close()
+
+
+def test_pipeline_errors_fail_every_request_in_the_batch():
+    generator = BlockingGenerator()
+    batcher, blocker = blocked(generator)
+    futures = [batcher.submit(f"cat {i}") for i in range(2)]
+    generator.error = RuntimeError("out of memory")
+
+    generator.release.set()
+    for future in futures:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(5)
+    batcher.close()
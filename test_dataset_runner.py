@@ -0,0 +1,92 @@
+"""
+Dataset Runner Tests
+--------------------
+Batching, seeds and output filenames of run_dataset, on a stand-in
+generator that paints each image in a color derived from its prompt.
+"""
+
+from concurrent.futures import Future
+
+import numpy as np
+from PIL import Image
+
+from dataset_runner import run_dataset
+from memory import estimate_batch_bytes
+
+SIZE = 64
+
+
+class RecordingGenerator:
+    """Stand-in generator: records each batch's prompts and seeds."""
+
+    dtype_bytes = 4
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_batch(self, prompts, seeds=None, **kwargs):
+        self.calls.append((list(prompts), list(seeds), kwargs))
+        return [Image.new("RGB", (SIZE, SIZE), (len(prompt), 0, 0)) for prompt in prompts]
+
+
+class PoolGenerator(RecordingGenerator):
+    """Stand-in worker pool: resolves `submit_batch` futures immediately."""
+
+    num_workers = 2
+
+    def submit_batch(self, prompts, **kwargs):
+        future = Future()
+        future.set_result(self.generate_batch(prompts, **kwargs))
+        return future
+
+
+PROMPTS = {
+    "knight": "anime knight",
+    "mage": "anime mage, glowing staff",
+    "thief": "anime thief",
+    "bard": "anime bard with a lute",
+    "monk": "anime monk",
+}
+
+
+def test_every_item_is_saved_under_its_name(tmp_path):
+    summary = run_dataset(
+        RecordingGenerator(), PROMPTS, tmp_path, width=SIZE, height=SIZE,
+        filename="hero_{name}.png",
+    )
+
+    assert summary['images'] == len(PROMPTS)
+    for name, prompt in PROMPTS.items():
+        with Image.open(tmp_path / f"hero_{name}.png") as image:
+            assert np.asarray(image)[0, 0, 0] == len(prompt)
+
+
+def test_batches_fit_the_memory_budget_and_keep_seeds(tmp_path):
+    generator = RecordingGenerator()
+    budget = 2 * estimate_batch_bytes(SIZE, SIZE)
+    summary = run_dataset(
+        generator, PROMPTS, tmp_path, seeds={"knight": 1, "thief": 3, "monk": 5},
+        num_inference_steps=1, width=SIZE, height=SIZE, memory_budget=budget,
+    )
+
+    assert summary['batch_size'] == 2
+    assert [(prompts, seeds) for prompts, seeds, _ in generator.calls] == [
+        (["anime knight", "anime mage, glowing staff"], [1, None]),
+        (["anime thief", "anime bard with a lute"], [3, None]),
+        (["anime monk"], [5]),
+    ]
+    assert generator.calls[0][2] == {'num_inference_steps': 1, 'width': SIZE, 'height': SIZE}
+
+
+def test_pool_budget_is_split_between_workers(tmp_path):
+    generator = PoolGenerator()
+    summary = run_dataset(
+        generator, PROMPTS, tmp_path, width=SIZE, height=SIZE,
+        memory_budget=4 * estimate_batch_bytes(SIZE, SIZE),
+    )
+
+    assert summary['batch_size'] == 2
+    assert [len(prompts) for prompts, _, _ in generator.calls] == [2, 2, 1]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{name}.png" for name in PROMPTS
+    )
@@ -0,0 +1,167 @@
+"""
+Generator Tests
+---------------
+SDTurboGenerator on the tiny random-weight pipeline (see conftest.py).
+"""
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+import generate_image
+from generate_image import slerp
+from memory import DEFAULT_BUDGET_FRACTION, InsufficientMemory
+
+SIZE = 64
+
+
+def test_prompt_cache_matches_pipeline_encoding(tiny_generator):
+    prompt = "anime girl, prompt cache check"
+    expected, _ = tiny_generator.pipe.encode_prompt(
+        prompt, device="cpu", num_images_per_prompt=1, do_classifier_free_guidance=False
+    )
+
+    hits = tiny_generator.prompt_cache.hits
+    first = tiny_generator.encode_prompts([prompt])
+    second = tiny_generator.encode_prompts([prompt])
+    assert tiny_generator.prompt_cache.hits == hits + 1
+    assert torch.equal(first, expected)
+    assert torch.equal(second, expected)
+
+
+def test_prompt_cache_gives_identical_images(tiny_generator):
+    prompt = "anime fox spirit, prompt cache check"
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE, seed=3)
+    hits = tiny_generator.prompt_cache.hits
+    first = tiny_generator.generate(prompt, **kwargs)
+    second = tiny_generator.generate(prompt, **kwargs)
+    assert tiny_generator.prompt_cache.hits > hits
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+
+
+def test_step_callback_sees_every_step(tiny_generator):
+    steps = []
+    tiny_generator.generate(
+        "anime cat", num_inference_steps=2, width=SIZE, height=SIZE,
+        step_callback=lambda step, total, latents: steps.append((step, total, latents.shape)),
+    )
+    assert steps == [(1, 2, (1, 4, SIZE // 8, SIZE // 8)), (2, 2, (1, 4, SIZE // 8, SIZE // 8))]
+
+
+def test_seeded_batches_are_reproducible(tiny_generator):
+    prompts = ["anime cat", "anime dog"]
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE)
+    first = tiny_generator.generate_batch(prompts, seeds=[1, 2], **kwargs)
+    second = tiny_generator.generate_batch(prompts, seeds=[1, 2], **kwargs)
+    other = tiny_generator.generate_batch(prompts, seeds=[1, 3], **kwargs)
+
+    assert all(np.array_equal(np.asarray(a), np.asarray(b)) for a, b in zip(first, second))
+    assert np.array_equal(np.asarray(first[0]), np.asarray(other[0]))
+    assert not np.array_equal(np.asarray(first[1]), np.asarray(other[1]))
+
+
+def test_seed_count_must_match_prompts(tiny_generator):
+    with pytest.raises(ValueError):
+        tiny_generator.generate_batch(["anime cat"], seeds=[1, 2])
+
+
+def test_batch_matches_single_seeded_generation(tiny_generator):
+    prompts = ["anime cat mascot", "anime dragon, colorful scales", "anime cat mascot"]
+    seeds = [42, 7, 8]
+    batch = tiny_generator.generate_batch(
+        prompts, num_inference_steps=1, width=SIZE, height=SIZE, seeds=seeds
+    )
+
+    for prompt, seed, batch_image in zip(prompts, seeds, batch):
+        single = tiny_generator.generate(
+            prompt, num_inference_steps=1, width=SIZE, height=SIZE, seed=seed
+        )
+        diff = np.abs(np.asarray(single, dtype=np.int16) - np.asarray(batch_image, dtype=np.int16))
+        # Batched matmuls may round differently from batch-of-one calls
+        assert diff.max() <= 2
+
+
+def test_batches_are_split_to_fit_free_memory(tiny_generator, monkeypatch):
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE, seeds=[1, 2, 3])
+    prompts = ["anime cat", "anime dog", "anime fox"]
+    whole = tiny_generator.generate_batch(prompts, **kwargs)
+
+    room = 2.5 * tiny_generator.memory_estimator.estimate(SIZE, SIZE) / DEFAULT_BUDGET_FRACTION
+    monkeypatch.setattr(generate_image, "available_memory_bytes", lambda device: int(room))
+    calls = []
+    split = tiny_generator.generate_batch(
+        prompts, step_callback=lambda step, total, latents: calls.append(latents.shape[0]), **kwargs
+    )
+
+    assert calls == [2, 1]
+    for a, b in zip(whole, split):
+        diff = np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16))
+        assert diff.max() <= 2
+
+
+def test_generation_is_refused_without_memory(tiny_generator, monkeypatch):
+    monkeypatch.setattr(generate_image, "available_memory_bytes", lambda device: 0)
+    with pytest.raises(InsufficientMemory):
+        tiny_generator.generate("anime cat", width=SIZE, height=SIZE)
+
+
+def test_warmup_does_not_calibrate_the_estimator(tiny_generator, monkeypatch):
+    observed = []
+    monkeypatch.setattr(
+        tiny_generator.memory_estimator, "observe", lambda *args, **kwargs: observed.append(args)
+    )
+    tiny_generator.warmup(width=SIZE, height=SIZE)
+    assert observed == []
+
+
+def test_slerp_endpoints_and_norm():
+    a, b = torch.randn(2, 1, 4, 8, 8, generator=torch.Generator().manual_seed(0))
+    assert torch.allclose(slerp(a, b, 0.0), a, atol=1e-5)
+    assert torch.allclose(slerp(a, b, 1.0), b, atol=1e-5)
+
+    middle = slerp(a, b, 0.5)
+    assert middle.norm() == pytest.approx(((a.norm() + b.norm()) / 2).item(), rel=0.05)
+    # Parallel inputs fall back to a straight lerp
+    assert torch.allclose(slerp(a, 2 * a, 0.5), 1.5 * a, atol=1e-5)
+
+
+def test_img2img_keeps_the_source_size_and_seed(tiny_generator):
+    source = tiny_generator.generate("anime cat", width=SIZE, height=SIZE, seed=1).resize((70, 60))
+    first = tiny_generator.img2img(source, "anime cat, night", strength=0.5, seed=2)
+    second = tiny_generator.img2img(source, "anime cat, night", strength=0.5, seed=2)
+
+    assert first.size == (72, 64)
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    with pytest.raises(ValueError):
+        tiny_generator.img2img(source, "anime cat", strength=0.2, num_inference_steps=2)
+
+
+def test_seed_variations_keep_the_base_image(tiny_generator):
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE)
+    base = np.asarray(tiny_generator.generate("anime cat", seed=5, **kwargs), dtype=np.int16)
+    unchanged = tiny_generator.variations("anime cat", 5, num_images=2, variation_strength=0.0, **kwargs)
+    varied = tiny_generator.variations("anime cat", 5, num_images=3, variation_strength=0.5, **kwargs)
+
+    assert len(unchanged) == 2
+    for image in unchanged:
+        assert np.abs(np.asarray(image, dtype=np.int16) - base).max() <= 2
+    assert len(varied) == 3
+    assert all(np.abs(np.asarray(image, dtype=np.int16) - base).max() > 2 for image in varied)
+
+
+def test_image_variations_are_img2img_per_seed(tiny_generator):
+    source = tiny_generator.generate("anime cat", width=SIZE, height=SIZE, seed=1)
+    images = tiny_generator.variations(
+        "anime cat", 10, num_images=2, image=source, width=SIZE, height=SIZE
+    )
+    for k, image in enumerate(images):
+        single = tiny_generator.img2img(source, "anime cat", seed=10 + k)
+        diff = np.abs(np.asarray(image, dtype=np.int16) - np.asarray(single, dtype=np.int16))
+        assert diff.max() <= 2
+
+
+def test_image_variations_keep_the_source_size(tiny_generator):
+    source = Image.new("RGB", (72, 48), "red")
+    images = tiny_generator.variations("anime cat", 10, num_images=1, image=source, num_inference_steps=2)
+    assert images[0].size == (72, 48)
@@ -0,0 +1,71 @@
+"""
+Grid Tests
+----------
+Prompt x seed grids and contact sheets on the tiny random-weight
+pipeline (see conftest.py).
+"""
+
+import numpy as np
+from PIL import Image
+
+from grid import CELL_SIZE, LABEL_HEIGHT, LABEL_WIDTH, PADDING, contact_sheet, generate_grid, run_grid
+from prompt_cache import PromptEmbeddingCache
+
+SIZE = 64
+KWARGS = dict(num_inference_steps=1, width=SIZE, height=SIZE)
+
+
+def test_cells_match_single_generation(tiny_generator):
+    prompts, seeds = ["anime cat", "anime dog"], [3, 4, 5]
+    grid = generate_grid(tiny_generator, prompts, seeds, **KWARGS)
+
+    assert [len(row) for row in grid] == [3, 3]
+    for prompt, row in zip(prompts, grid):
+        for seed, cell in zip(seeds, row):
+            still = tiny_generator.generate(prompt, seed=seed, **KWARGS)
+            diff = np.abs(np.asarray(cell, dtype=np.int16) - np.asarray(still, dtype=np.int16))
+            assert diff.max() <= 2
+
+
+def test_each_prompt_is_encoded_once(tiny_generator, monkeypatch):
+    # With the embedding cache disabled, repeats within a call still share one encode
+    monkeypatch.setattr(tiny_generator, "prompt_cache", PromptEmbeddingCache(max_entries=0))
+    encoded = []
+    encode_prompt = tiny_generator.pipe.encode_prompt
+
+    def counting_encode_prompt(prompt, *args, **kwargs):
+        # The pipeline also calls it with prompt=None to pass embeddings through
+        if prompt is not None:
+            encoded.append(prompt)
+        return encode_prompt(prompt, *args, **kwargs)
+
+    monkeypatch.setattr(tiny_generator.pipe, "encode_prompt", counting_encode_prompt)
+    generate_grid(tiny_generator, ["anime cat", "anime dog"], [1, 2, 3, 4], **KWARGS)
+    assert sorted(encoded) == ["anime cat", "anime dog"]
+
+
+def test_contact_sheet_has_a_cell_per_image():
+    grid = [[Image.new("RGB", (SIZE, SIZE // 2), "red")] * 3] * 2
+    sheet = contact_sheet(grid, ["a", "b"], ["1", "2", "3"])
+
+    cell_width, cell_height = CELL_SIZE, CELL_SIZE // 2
+    assert sheet.size == (
+        LABEL_WIDTH + 3 * (cell_width + PADDING) + PADDING,
+        LABEL_HEIGHT + 2 * (cell_height + PADDING) + PADDING,
+    )
+    # Top-left pixel of the last cell is the image, not the background
+    left = LABEL_WIDTH + 2 * (cell_width + PADDING) + PADDING
+    top = LABEL_HEIGHT + (cell_height + PADDING) + PADDING
+    assert sheet.getpixel((left + 1, top + 1)) == (255, 0, 0)
+
+
+def test_run_grid_saves_every_cell_and_the_sheet(tiny_generator, tmp_path):
+    summary = run_grid(
+        tiny_generator, {"cat": "anime cat", "dog": "anime dog"}, [1, 2], tmp_path, **KWARGS
+    )
+
+    assert summary['images'] == 4
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "cat_seed1.png", "cat_seed2.png", "contact_sheet.png", "dog_seed1.png", "dog_seed2.png"
+    ]
+    assert summary['sheet'] == tmp_path / "contact_sheet.png"
@@ -0,0 +1,120 @@
+"""
+Job Manager Tests
+-----------------
+Job lifecycle and cancellation, on a real MicroBatcher in front of a
+stand-in generator that reports denoising steps.
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+from jobs import CANCELLED, FAILED, SUCCEEDED, TERMINAL_STATES, JobManager
+
+
+class SteppingGenerator:
+    """Stand-in generator: runs `steps` callbacks once released."""
+
+    def __init__(self, steps: int = 3):
+        self.steps = steps
+        self.prompts = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def generate_batch(self, prompts, step_callback=None, **kwargs):
+        self.started.set()
+        assert self.release.wait(5)
+        self.prompts += prompts
+        latents = np.zeros((len(prompts), 4, 8, 8))
+        for step in range(1, self.steps + 1):
+            if step_callback is not None:
+                step_callback(step, self.steps, latents)
+        return [f"image of {prompt}" for prompt in prompts]
+
+
+def wait_for(job, timeout: float = 5.0):
+    """Block until the job reaches a terminal state."""
+    deadline = time.monotonic() + timeout
+    while job.status not in TERMINAL_STATES:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def jobs():
+    generator = SteppingGenerator()
+    batcher = MicroBatcher(generator, batch_window=0.0)
+    saved = []
+
+    def save_result(image, job):
+        saved.append(image)
+        return {'filename': f"{job.id}.png"}
+
+    manager = JobManager(batcher, save_result)
+    yield manager, generator, saved
+    generator.release.set()
+    batcher.close()
+
+
+def test_finished_job_carries_the_saved_result(jobs):
+    manager, generator, saved = jobs
+    job = manager.submit(prompt="anime cat")
+    generator.release.set()
+
+    wait_for(job)
+    assert job.status == SUCCEEDED
+    assert saved == ["image of anime cat"]
+    assert job.to_dict()['filename'] == f"{job.id}.png"
+    assert manager.get(job.id) is job
+
+
+def test_cancelled_queued_job_never_runs(jobs):
+    manager, generator, saved = jobs
+    running = manager.submit(prompt="blocker")
+    assert generator.started.wait(5)
+    queued = manager.submit(prompt="queued", width=256, height=256)
+
+    assert manager.cancel(queued.id)
+    generator.release.set()
+    assert wait_for(queued).status == CANCELLED
+    assert wait_for(running).status == SUCCEEDED
+    assert "queued" not in generator.prompts
+
+
+def test_cancelled_running_job_is_aborted(jobs):
+    manager, generator, saved = jobs
+    job = manager.submit(prompt="anime cat")
+    assert generator.started.wait(5)
+    assert job.to_dict()['status'] == "running"
+
+    assert manager.cancel(job.id)
+    generator.release.set()
+    assert wait_for(job).status == CANCELLED
+    assert saved == []
+
+
+def test_finished_jobs_cannot_be_cancelled(jobs):
+    manager, generator, _ = jobs
+    generator.release.set()
+    job = wait_for(manager.submit(prompt="anime cat"))
+
+    assert not manager.cancel(job.id)
+    assert not manager.cancel("no-such-job")
+    assert manager.counts() == {SUCCEEDED: 1}
+
+
+def test_save_errors_fail_the_job(jobs):
+    manager, generator, _ = jobs
+
+    def broken_save(image, job):
+        raise OSError("disk full")
+
+    manager.save_result = broken_save
+    generator.release.set()
+    job = wait_for(manager.submit(prompt="anime cat"))
+    assert job.status == FAILED
+    assert "disk full" in job.error
@@ -0,0 +1,99 @@
+"""
+Memory Estimation Tests
+-----------------------
+Peak-memory estimates, their calibration, and memory admission.
+"""
+
+import threading
+import time
+
+import pytest
+
+from memory import (
+    BYTES_PER_512_IMAGE_FP32, MIN_FACTOR, SAFETY_MARGIN, MemoryAdmission, MemoryBusy, MemoryEstimator,
+    estimate_batch_bytes, max_batch_size,
+)
+
+
+def test_estimate_scales_with_pixels_batch_and_dtype():
+    assert estimate_batch_bytes(512, 512) == BYTES_PER_512_IMAGE_FP32
+    assert estimate_batch_bytes(1024, 1024) == 4 * BYTES_PER_512_IMAGE_FP32
+    assert estimate_batch_bytes(512, 512, batch_size=3) == 3 * BYTES_PER_512_IMAGE_FP32
+    assert estimate_batch_bytes(512, 512, dtype_bytes=2) == BYTES_PER_512_IMAGE_FP32 // 2
+
+
+def test_max_batch_size_is_bounded_by_budget_and_limit():
+    per_image = estimate_batch_bytes(512, 512)
+    assert max_batch_size(3 * per_image + 1, 512, 512) == 3
+    assert max_batch_size(100 * per_image, 512, 512, limit=8) == 8
+    # A single image always runs, even over budget
+    assert max_batch_size(0, 512, 512) == 1
+
+
+def test_estimator_calibrates_from_observed_peaks():
+    estimator = MemoryEstimator()
+    prior = estimate_batch_bytes(512, 512)
+    assert estimator.estimate(512, 512) == prior
+
+    estimator.observe(512, 512, 1, prior // 2)
+    assert estimator.estimate(512, 512) == int(prior * 0.5 * SAFETY_MARGIN)
+    # Smaller sizes borrow the factor of a measured larger one
+    assert estimator.factor(256, 256) == pytest.approx(0.5 * SAFETY_MARGIN)
+    # Larger unmeasured sizes keep the conservative estimate
+    assert estimator.factor(1024, 1024) == 1.0
+    assert estimator.calibration() == {'512x512': 0.6}
+
+
+def test_tiny_or_empty_peaks_never_zero_the_estimate():
+    estimator = MemoryEstimator()
+    prior = estimate_batch_bytes(512, 512)
+    estimator.observe(512, 512, 1, 0)
+    assert estimator.calibration() == {}
+
+    estimator.observe(512, 512, 1, 1)
+    assert estimator.factor(512, 512) == MIN_FACTOR
+    assert estimator.factor(256, 256) == MIN_FACTOR
+    assert estimator.estimate(512, 512) == int(prior * MIN_FACTOR)
+    assert estimator.max_batch_size(10 * prior, 512, 512) == 16
+
+
+@pytest.fixture
+def admission():
+    """Admission with room for 1.5 images of 512x512."""
+    estimator = MemoryEstimator()
+    return MemoryAdmission(
+        estimator, max_bytes=int(1.5 * estimator.estimate(512, 512)), timeout=0.1
+    )
+
+
+def test_calls_that_can_never_fit_are_refused(admission):
+    assert admission.fits(512, 512)
+    assert not admission.fits(512, 512, batch_size=2)
+    assert admission.max_batch_size(512, 512) == 1
+    # Checking is not rejecting: only refused calls are counted
+    assert admission.stats()['rejected'] == 0
+
+
+def test_reservations_wait_for_running_calls(admission):
+    order = []
+    with admission.reserve(512, 512):
+        def second_call():
+            with admission.reserve(512, 512, timeout=5):
+                order.append("second")
+
+        thread = threading.Thread(target=second_call)
+        thread.start()
+        time.sleep(0.1)
+        order.append("first done")
+    thread.join(5)
+
+    assert order == ["first done", "second"]
+    assert admission.stats()['reserved_bytes'] == 0
+
+
+def test_reservations_time_out_with_memory_busy(admission):
+    with admission.reserve(512, 512):
+        with pytest.raises(MemoryBusy):
+            with admission.reserve(512, 512):
+                pass
+    assert admission.timeouts == 1
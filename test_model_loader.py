@@ -0,0 +1,54 @@
+"""
+Model Loader Tests
+------------------
+Background loading, warm-up and error reporting of ModelLoader.
+"""
+
+import threading
+
+import pytest
+
+from model_loader import ModelLoadError, ModelLoader
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.warmups = []
+
+    def warmup(self, **kwargs):
+        self.warmups.append(kwargs)
+        return 12.5
+
+    def generate(self, prompt):
+        return f"image of {prompt}"
+
+
+def test_attributes_resolve_on_the_loaded_generator():
+    release = threading.Event()
+    generator = FakeGenerator()
+
+    def factory():
+        assert release.wait(5)
+        return generator
+
+    loader = ModelLoader(factory, warmup={'num_inference_steps': 1})
+    assert loader.status() == {'ready': False, 'state': "not_started"}
+    loader.start()
+    assert loader.state == "loading"
+
+    release.set()
+    assert loader.generate("anime cat") == "image of anime cat"
+    assert loader.ready
+    assert generator.warmups == [{'num_inference_steps': 1}]
+    assert loader.status()['warmup_ms'] == 12.5
+
+
+def test_load_errors_are_reported():
+    def factory():
+        raise OSError("weights not found")
+
+    loader = ModelLoader(factory)
+    with pytest.raises(ModelLoadError):
+        loader.wait(5)
+    assert loader.status()['state'] == "failed"
+    assert "weights not found" in loader.status()['error']
@@ -0,0 +1,183 @@
+"""
+Model Registry Tests
+--------------------
+Component sharing and LRU eviction of ModelRegistry, on tiny pipelines:
+a "fine-tune" that only changes the UNet of the default model, and an
+unrelated model with different weights throughout. Eviction of models
+with calls in flight uses stand-in generators that hold each call.
+"""
+
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from generate_image import SDTurboGenerator
+from model_registry import ModelRegistry
+from result_cache import ResultCache
+from tiny_pipeline import build_tiny_pipeline
+
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def models(tiny_model, tmp_path_factory):
+    """Model ids: the default tiny model, a UNet fine-tune of it, and an unrelated one."""
+    root = tmp_path_factory.mktemp("registry")
+    other = build_tiny_pipeline(root / "other", seed=1)
+    finetune = root / "finetune"
+    shutil.copytree(tiny_model, finetune)
+    shutil.rmtree(finetune / "unet")
+    shutil.copytree(other / "unet", finetune / "unet")
+    return {'default': tiny_model, 'finetune': str(finetune), 'other': str(other)}
+
+
+@pytest.fixture
+def registry(models, tiny_generator):
+    def factory(model_id):
+        if model_id == models['default']:
+            return tiny_generator
+        return SDTurboGenerator(model_id=model_id, device="cpu")
+
+    return ModelRegistry(factory, default_model=models['default'], max_models=2)
+
+
+def test_identical_components_are_shared(registry, models, tiny_generator):
+    finetune = registry.get(models['finetune'])
+
+    assert finetune.pipe.text_encoder is tiny_generator.pipe.text_encoder
+    assert finetune.pipe.vae is tiny_generator.pipe.vae
+    assert finetune.pipe.unet is not tiny_generator.pipe.unet
+    stats = registry.stats()
+    assert stats['shared_components'] == 2
+    assert stats['shared_bytes'] > 0
+    assert stats['total_bytes'] < sum(model['bytes'] for model in stats['models'])
+
+
+def test_shared_components_do_not_change_results(registry, models):
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE, seed=9)
+    shared = registry.generate("anime cat", model=models['finetune'], **kwargs)
+    standalone = SDTurboGenerator(model_id=models['finetune'], device="cpu").generate("anime cat", **kwargs)
+    assert np.array_equal(np.asarray(shared), np.asarray(standalone))
+
+
+def test_unrelated_models_share_nothing(registry, models):
+    registry.get(models['other'])
+    assert registry.stats()['shared_components'] == 0
+
+
+def test_least_recently_used_model_is_evicted(registry, models):
+    registry.get(models['finetune'])
+    registry.get(models['other'])
+
+    assert registry.loaded() == [models['default'], models['other']]
+    assert registry.evictions == 1
+    assert registry.evict(models['other'])
+    assert not registry.evict(models['other'])
+    with pytest.raises(ValueError):
+        registry.evict(models['default'])
+
+
+def test_cache_probes_never_load_or_evict(models, tiny_generator, tmp_path):
+    def factory(model_id):
+        if model_id == models['default']:
+            return tiny_generator
+        return SDTurboGenerator(model_id=model_id, device="cpu", result_cache=ResultCache(tmp_path))
+
+    registry = ModelRegistry(factory, default_model=models['default'], max_models=2)
+    settings = dict(num_inference_steps=1, width=SIZE, height=SIZE, seed=9)
+    loaded = registry.loaded()
+    assert registry.cached_result("anime cat", model=models['finetune'], **settings) is None
+    assert registry.loaded() == loaded
+
+    image = registry.generate("anime cat", model=models['finetune'], **settings)
+    registry.get(models['other'])
+    assert models['finetune'] not in registry.loaded()
+
+    # Still answered from the evicted model's cache, without reloading it
+    loads = registry.loads
+    cached = registry.cached_result("anime cat", model=models['finetune'], **settings)
+    assert np.array_equal(np.asarray(cached), np.asarray(image))
+    assert registry.cached_result("anime cat", model=models['finetune'], seed=None) is None
+    assert registry.loads == loads
+
+
+class HeldGenerator:
+    """Stand-in generator whose calls wait for `release`; records close()."""
+
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def generate(self, prompt, **kwargs):
+        self.started.set()
+        assert self.release.wait(5)
+        assert not self.closed
+        return f"{self.model_id}: {prompt}"
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def held():
+    """Registry of HeldGenerators (max 2 loaded) and every generator it built."""
+    built = []
+
+    def factory(model_id):
+        built.append(HeldGenerator(model_id))
+        return built[-1]
+
+    return ModelRegistry(factory, default_model="base", max_models=2), built
+
+
+def in_flight(registry, model):
+    """Start a registry call on `model` in a thread; returns (thread, results)."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(registry.generate("cat", model=model)))
+    thread.start()
+    return thread, results
+
+
+def test_models_with_running_calls_are_not_evicted_to_fit(held):
+    registry, built = held
+    thread, results = in_flight(registry, "a")
+    assert built[1].started.wait(5)
+
+    registry.get("b")
+    assert registry.loaded() == ["base", "a", "b"]
+    assert registry.stats()['models'][1]['running'] == 1
+
+    built[1].release.set()
+    thread.join(5)
+    assert results == ["a: cat"]
+    assert not built[1].closed
+
+    # Once idle it is the first to go
+    registry.get("c")
+    assert "a" not in registry.loaded()
+    assert built[1].closed
+
+
+def test_evicting_a_busy_model_closes_it_after_its_last_call(held):
+    registry, built = held
+    thread, results = in_flight(registry, "a")
+    assert built[1].started.wait(5)
+
+    assert registry.evict("a")
+    assert registry.loaded() == ["base"]
+    assert not built[1].closed
+
+    built[1].release.set()
+    thread.join(5)
+    assert results == ["a: cat"]
+    assert built[1].closed
+
+    # New calls load it again
+    built_before = len(built)
+    registry.get("a").release.set()
+    assert registry.generate("dog", model="a") == "a: dog"
+    assert len(built) == built_before + 1
@@ -0,0 +1,113 @@
+"""
+Output Store Tests
+------------------
+Naming, indexing, paging and thumbnails of OutputStore, including
+concurrent saves.
+"""
+
+import io
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from output_store import OutputStore, content_hash
+
+
+def test_concurrent_saves_get_unique_ids_and_files(tmp_path):
+    store = OutputStore(tmp_path)
+    saved, errors = [], []
+
+    def save_many(worker: int):
+        try:
+            for i in range(5):
+                data = f"{worker}-{i}".encode()
+                saved.append((data, store.save(data)))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_many, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len({record['id'] for _, record in saved}) == 40
+    assert len({record['filename'] for _, record in saved}) == 40
+    assert store.count() == 40
+    for data, record in saved:
+        assert (tmp_path / record['filename']).read_bytes() == data
+
+
+def test_filenames_are_sharded_by_id(tmp_path):
+    store = OutputStore(tmp_path)
+    assert store.filename_for(7) == "000/000/anime_7.png"
+    assert store.filename_for(1_234_567, "webp") == "001/234/anime_1234567.webp"
+
+
+def test_records_hold_metadata_and_resolve_by_filename(tmp_path):
+    store = OutputStore(tmp_path)
+    record = store.save(
+        b"data", extension="webp", mimetype="image/webp", prompt="anime cat",
+        seed=4, steps=2, width=64, height=64, timings={'encode_ms': 1.5},
+    )
+    assert store.get_by_filename(record['filename']) == record
+    assert record['bytes'] == 4
+    assert record['timings'] == {'encode_ms': 1.5}
+    assert store.get(record['id'] + 1) is None
+
+
+def test_list_pages_newest_first(tmp_path):
+    store = OutputStore(tmp_path)
+    ids = [store.save(b"data")['id'] for _ in range(5)]
+
+    first = store.list(limit=2)
+    second = store.list(limit=2, before=first[-1]['id'])
+    assert [record['id'] for record in first + second] == ids[::-1][:4]
+
+
+def test_thumbnails_resolve_with_their_own_etag(tmp_path):
+    store = OutputStore(tmp_path, thumbnail_size=32)
+    buffer = io.BytesIO()
+    Image.new("RGB", (128, 64), "blue").save(buffer, format="PNG")
+    record = store.save(buffer.getvalue())
+    store.flush_thumbnails()
+
+    image = store.resolve(record['filename'])
+    assert image['etag'] == record['etag'] == content_hash(buffer.getvalue())
+
+    thumbnail = store.resolve(record['thumbnail'])
+    assert thumbnail['mimetype'] == "image/webp"
+    assert thumbnail['etag'] not in (None, record['etag'])
+    with Image.open(thumbnail['path']) as small:
+        assert small.format == "WEBP"
+        assert small.size == (32, 16)
+    assert store.resolve("000/000/unknown.png") is None
+    store.close()
+
+
+def test_images_still_being_saved_do_not_resolve(tmp_path):
+    store = OutputStore(tmp_path, background_thumbnails=False)
+    record = store.save(b"data")
+    # As between the index insert and the file write
+    with store._connect() as conn:
+        conn.execute("UPDATE images SET filename = NULL WHERE id = ?", (record['id'],))
+    assert store.resolve(record['thumbnail']) is None
+    assert store.resolve(record['filename']) is None
+
+
+def test_failed_writes_leave_no_record(tmp_path, monkeypatch):
+    store = OutputStore(tmp_path)
+
+    def disk_full(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", disk_full)
+    with pytest.raises(OSError):
+        store.save(b"data")
+    monkeypatch.undo()
+
+    assert store.count() == 0
+    assert list(tmp_path.rglob("*.tmp")) == []
@@ -0,0 +1,55 @@
+"""
+Prompt Embedding Cache Tests
+----------------------------
+LRU behaviour of PromptEmbeddingCache, bounded by entries and bytes.
+"""
+
+import torch
+
+from prompt_cache import PromptEmbeddingCache
+
+
+def embedding(value: float = 0.0) -> torch.Tensor:
+    """A (1, 4, 8) float32 embedding: 128 bytes."""
+    return torch.full((1, 4, 8), value)
+
+
+def test_hits_and_misses_are_counted():
+    cache = PromptEmbeddingCache()
+    assert cache.get("cat") is None
+    cache.put("cat", embedding(1.0))
+    assert torch.equal(cache.get("cat"), embedding(1.0))
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entry_is_evicted_by_count():
+    cache = PromptEmbeddingCache(max_entries=2)
+    cache.put("cat", embedding())
+    cache.put("dog", embedding())
+    cache.get("cat")
+    cache.put("fox", embedding())
+
+    assert cache.get("dog") is None
+    assert cache.get("cat") is not None
+    assert cache.evictions == 1
+
+
+def test_entries_are_evicted_to_fit_max_bytes():
+    cache = PromptEmbeddingCache(max_bytes=300)
+    for prompt in ("cat", "dog", "fox"):
+        cache.put(prompt, embedding())
+
+    assert len(cache) == 2
+    assert cache.nbytes == 256
+    assert cache.get("cat") is None
+
+
+def test_oversized_and_disabled_entries_are_not_stored():
+    cache = PromptEmbeddingCache(max_bytes=64)
+    cache.put("cat", embedding())
+    assert len(cache) == 0
+
+    disabled = PromptEmbeddingCache(max_entries=0)
+    disabled.put("cat", embedding())
+    assert len(disabled) == 0
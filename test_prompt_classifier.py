@@ -0,0 +1,54 @@
+"""
+Prompt Classifier Tests
+-----------------------
+Whole-word keyword matching and the suggestions built from it.
+"""
+
+import pytest
+
+from prompt_classifier import PromptClassifier
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return PromptClassifier(
+        anime_keywords=["elf", "hero", "magical girl"],
+        realistic_keywords=["photo"],
+        non_anime_indicators=["real"],
+    )
+
+
+@pytest.mark.parametrize("prompt, category", [
+    ("an elf archer", "anime"),
+    ("heroes of the valley", "anime"),
+    ("magical-girl transformation", "anime"),
+    ("magical   girl", "anime"),
+    ("photos of a cat", "realistic"),
+    ("a real cat", "non_anime"),
+])
+def test_keywords_match_whole_words(classifier, prompt, category):
+    assert classifier.matches(prompt)[category]
+
+
+@pytest.mark.parametrize("prompt", [
+    "a bookshelf in a library",
+    "photon torpedo",
+    "surreal landscape",
+    "superhero-ish",
+])
+def test_keywords_do_not_match_inside_words(classifier, prompt):
+    found = classifier.matches(prompt)
+    assert not any(found.values())
+    assert classifier.classify(prompt) == (True, f"anime style, {prompt}")
+
+
+def test_realistic_words_are_removed_from_suggestions(classifier):
+    assert classifier.classify("Photo of an elf") == (False, "anime style, of an elf")
+    assert classifier.classify("real elf")[0] is True
+    assert classifier.classify("real cat")[0] is False
+
+
+def test_classify_many_keeps_input_order(classifier):
+    results = classifier.classify_many(["real cat", "an elf archer"])
+    assert [result['prompt'] for result in results] == ["real cat", "an elf archer"]
+    assert [result['is_anime'] for result in results] == [False, True]
@@ -0,0 +1,96 @@
+"""
+Result Cache Tests
+------------------
+Hits, misses and LRU eviction of ResultCache, and its use by
+SDTurboGenerator for seeded requests.
+"""
+
+import time
+
+import numpy as np
+from PIL import Image
+
+from result_cache import ResultCache
+
+SIZE = 64
+
+
+def noise_image(seed: int) -> Image.Image:
+    """Incompressible image, so every PNG has about the same size."""
+    pixels = np.random.default_rng(seed).integers(0, 256, (SIZE, SIZE, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def key(seed: int) -> str:
+    return ResultCache.make_key("tiny", "anime cat", 1, 0.0, SIZE, SIZE, seed)
+
+
+def test_put_then_get_round_trips_the_image(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get(key(1)) is None
+
+    cache.put(key(1), noise_image(1))
+    cached = cache.get(key(1))
+    assert np.array_equal(np.asarray(cached), np.asarray(noise_image(1)))
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['entries'] == 1
+
+
+def test_every_parameter_changes_the_key():
+    base = ("tiny", "anime cat", 1, 0.0, SIZE, SIZE, 1)
+    keys = {ResultCache.make_key(*base)}
+    for i, value in enumerate(("other", "anime dog", 2, 1.0, 128, 128, 2)):
+        changed = list(base)
+        changed[i] = value
+        keys.add(ResultCache.make_key(*changed))
+    assert len(keys) == len(base) + 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put(key(1), noise_image(1))
+    size = cache.stats()['bytes']
+    cache.max_bytes = int(size * 2.5)
+
+    time.sleep(0.01)
+    cache.put(key(2), noise_image(2))
+    time.sleep(0.01)
+    assert cache.get(key(1)) is not None
+    time.sleep(0.01)
+    cache.put(key(3), noise_image(3))
+
+    assert cache.get(key(2)) is None
+    assert cache.get(key(1)) is not None
+    assert cache.get(key(3)) is not None
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert len(list(tmp_path.glob("*/*.png"))) == 2
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put(key(1), noise_image(1))
+    cache._path(key(1)).unlink()
+
+    assert cache.get(key(1)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_seeded_generation_is_served_from_the_cache(tiny_generator, tmp_path, monkeypatch):
+    monkeypatch.setattr(tiny_generator, "result_cache", ResultCache(tmp_path))
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE, seed=5)
+    first = tiny_generator.generate("anime cat, result cache check", **kwargs)
+
+    def no_pipeline(*args, **kwargs):
+        raise AssertionError("the pipeline ran on a cache hit")
+
+    monkeypatch.setattr(tiny_generator, "pipe", no_pipeline)
+    second = tiny_generator.generate("anime cat, result cache check", **kwargs)
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    assert tiny_generator.result_cache.hits == 1
+
+
+def test_unseeded_generation_is_not_cached(tiny_generator, tmp_path, monkeypatch):
+    monkeypatch.setattr(tiny_generator, "result_cache", ResultCache(tmp_path))
+    tiny_generator.generate("anime cat", num_inference_steps=1, width=SIZE, height=SIZE)
+    assert tiny_generator.result_cache.stats()['entries'] == 0
@@ -82,6 +82,29 @@ except Exception as e:
     print(f"✗ Generation failed: {e}")
     sys.exit(1)
 
+# Test 5b: Seeded batches reproduce single generations
+print("\n📋 Test 5b: Batch Reproducibility")
+try:
+    import numpy as np
+    
+    prompts = ["anime cat mascot, cute style", "anime dragon, colorful scales"]
+    seeds = [42, 7]
+    batch_images = generator.generate_batch(prompts, num_inference_steps=1, seeds=seeds)
+    
+    max_diff = 0
+    for prompt, seed, batch_image in zip(prompts, seeds, batch_images):
+        single = generator.generate(prompt, num_inference_steps=1, seed=seed)
+        diff = np.abs(np.asarray(single, dtype=np.int16) - np.asarray(batch_image, dtype=np.int16))
+        max_diff = max(max_diff, int(diff.max()))
+    
+    # Batched matmuls may round differently from batch-of-one calls
+    assert max_diff <= 2, f"batch image differs from single generation by {max_diff}"
+    print(f"✓ generate_batch matches generate() per seed (max pixel diff {max_diff})")
+    
+except Exception as e:
+    print(f"✗ Batch reproducibility failed: {e}")
+    sys.exit(1)
+
 # Test 6: Domain validation
 print("\n📋 Test 6: Domain Validation Logic")
 try:
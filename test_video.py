@@ -0,0 +1,110 @@
+"""
+Video Tests
+-----------
+Keyframe interpolation, the streaming frame writers, and clips from the
+tiny random-weight pipeline (see conftest.py).
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from video import (
+    FrameSequenceWriter, GifWriter, Keyframe, ThreadedWriter, VideoGenerator, WebPWriter,
+    create_writer, interpolation_plan,
+)
+
+SIZE = 64
+
+
+def frames(count: int):
+    return [Image.new("RGB", (SIZE, SIZE), (30 * i, 100, 200)) for i in range(count)]
+
+
+def test_interpolation_plan_spans_the_keyframes():
+    assert interpolation_plan(3, 5) == [(0, 0.0), (0, 0.5), (1, 0.0), (1, 0.5), (1, 1.0)]
+    # Closed clips stop one step short of the repeated first keyframe
+    assert interpolation_plan(3, 4, closed=True) == [(0, 0.0), (0, 0.5), (1, 0.0), (1, 0.5)]
+    assert interpolation_plan(1, 3) == [(0, 0.0)] * 3
+
+
+@pytest.mark.parametrize("writer_class, suffix", [(GifWriter, ".gif"), (WebPWriter, ".webp")])
+def test_animation_writers_store_every_frame(tmp_path, writer_class, suffix):
+    writer = writer_class(tmp_path / f"clip{suffix}", fps=10)
+    for frame in frames(6):
+        writer.write(frame)
+    path = writer.close()
+
+    with Image.open(path) as clip:
+        assert clip.n_frames == 6
+        assert clip.size == (SIZE, SIZE)
+        clip.seek(5)
+        clip.load()
+        assert clip.info['duration'] == 100
+        # The last frame is the last one written, not a neighbour
+        expected = np.asarray(frames(6)[5], dtype=np.int16)
+        assert np.abs(np.asarray(clip.convert("RGB"), dtype=np.int16) - expected).max() <= 16
+
+
+def test_frame_sequences_are_numbered(tmp_path):
+    writer = create_writer(tmp_path / "frames")
+    assert isinstance(writer, FrameSequenceWriter)
+    for frame in frames(3):
+        writer.write(frame)
+    assert sorted(path.name for path in writer.close().iterdir()) == [
+        "frame_00000.png", "frame_00001.png", "frame_00002.png"
+    ]
+
+
+def test_threaded_writer_reports_write_errors(tmp_path):
+    class BrokenWriter:
+        def write(self, image):
+            raise OSError("disk full")
+
+        def close(self):
+            return tmp_path
+
+    writer = ThreadedWriter(BrokenWriter())
+    writer.write(frames(1)[0])
+    with pytest.raises(OSError, match="disk full"):
+        writer.close()
+
+
+def test_generation_errors_are_not_masked_by_the_writer(tiny_generator, tmp_path, monkeypatch):
+    class BrokenWriter:
+        def write(self, image):
+            pass
+
+        def close(self):
+            raise OSError("disk full")
+
+    def failing_frames(*args, **kwargs):
+        raise RuntimeError("out of memory")
+        yield
+
+    monkeypatch.setattr("video.create_writer", lambda output, fps: BrokenWriter())
+    video = VideoGenerator(tiny_generator)
+    monkeypatch.setattr(video, "frames", failing_frames)
+    with pytest.raises(RuntimeError, match="out of memory"):
+        video.generate([Keyframe("anime cat", 1)], tmp_path / "clip.gif")
+
+
+def test_clip_passes_through_its_keyframes(tiny_generator):
+    keyframes = [Keyframe("anime cat", 1), Keyframe("anime dog", 2)]
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE)
+    clip = list(VideoGenerator(tiny_generator, batch_size=2).frames(keyframes, num_frames=5, **kwargs))
+
+    assert len(clip) == 5
+    for frame, keyframe in ((clip[0], keyframes[0]), (clip[-1], keyframes[1])):
+        still = tiny_generator.generate(keyframe.prompt, seed=keyframe.seed, **kwargs)
+        diff = np.abs(np.asarray(frame, dtype=np.int16) - np.asarray(still, dtype=np.int16))
+        assert diff.max() <= 2
+
+
+def test_clips_are_written_to_the_output(tiny_generator, tmp_path):
+    path = VideoGenerator(tiny_generator).generate(
+        [Keyframe("anime cat", 1), Keyframe("anime dog", 2)], tmp_path / "clip.gif",
+        num_frames=6, num_inference_steps=1, width=SIZE, height=SIZE, loop=True,
+    )
+    with Image.open(path) as clip:
+        assert clip.n_frames == 6
@@ -0,0 +1,86 @@
+"""
+Worker Pool Tests
+-----------------
+Core partitioning, a two-process WorkerPool on the tiny pipeline, and
+recovery from workers that die.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from memory import InsufficientMemory
+from worker_pool import WorkerError, WorkerPool, core_sets
+
+SIZE = 64
+
+
+def test_core_sets_are_contiguous_and_disjoint():
+    assert core_sets(2, list(range(8))) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert core_sets(3, list(range(8))) == [[0, 1], [2, 3], [4, 5]]
+    # More workers than cores: the extra workers share the last core
+    assert core_sets(3, [0, 1]) == [[0], [1], [1]]
+
+
+@pytest.fixture(scope="module")
+def pool(tiny_model):
+    with WorkerPool(num_workers=2, model_id=tiny_model, device="cpu") as pool:
+        yield pool
+
+
+def test_pool_results_match_in_process_generation(pool, tiny_generator):
+    kwargs = dict(num_inference_steps=1, width=SIZE, height=SIZE)
+    futures = [
+        pool.submit_batch(["anime cat", "anime dog"], seeds=[seed, seed + 1], **kwargs)
+        for seed in (1, 3)
+    ]
+    images = [image for future in futures for image in future.result(60)]
+    expected = tiny_generator.generate_batch(
+        ["anime cat", "anime dog"] * 2, seeds=[1, 2, 3, 4], **kwargs
+    )
+
+    for image, reference in zip(images, expected):
+        diff = np.abs(np.asarray(image, dtype=np.int16) - np.asarray(reference, dtype=np.int16))
+        assert diff.max() <= 2
+    assert pool.dtype_bytes == tiny_generator.dtype_bytes
+
+
+def test_worker_exceptions_are_reported(pool):
+    with pytest.raises(WorkerError, match="ValueError"):
+        pool.generate_batch(["anime cat"], seeds=[1, 2])
+
+
+def test_worker_memory_errors_keep_their_type(pool):
+    with pytest.raises(InsufficientMemory) as error:
+        pool.generate("anime cat", num_inference_steps=1, width=16384, height=16384)
+    assert error.value.required > error.value.available
+
+
+class ExitOnUnpickle:
+    """Task argument that kills the worker process unpickling it."""
+
+    def __reduce__(self):
+        return os._exit, (3,)
+
+
+def test_dead_workers_fail_their_task_and_are_restarted(tiny_model):
+    with WorkerPool(num_workers=1, max_restarts=1, model_id=tiny_model, device="cpu") as pool:
+        with pytest.raises(WorkerError, match="exited with code 3"):
+            pool.submit("generate", prompt=ExitOnUnpickle()).result(30)
+
+        # Queued work runs on the replacement
+        image = pool.generate("anime cat", num_inference_steps=1, width=SIZE, height=SIZE, seed=1)
+        assert image.size == (SIZE, SIZE)
+        assert pool.restarts == 1
+
+        # With no restarts left, queued tasks fail and new ones are refused
+        killed = pool.submit("generate", prompt=ExitOnUnpickle())
+        queued = pool.submit("generate", prompt="anime cat")
+        with pytest.raises(WorkerError, match="exited with code 3"):
+            killed.result(30)
+        with pytest.raises(WorkerError, match="Every inference worker has exited"):
+            queued.result(30)
+        with pytest.raises(WorkerError):
+            pool.submit("generate", prompt="anime cat")
+        assert pool.alive_workers() == 0
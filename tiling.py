@@ -0,0 +1,220 @@
+"""
+Tiled Generation
+----------------
+Peak activation memory of the UNet and the VAE grows quadratically with
+the image size, so print-sized output (2048px+) does not fit on CPU
+nodes when generated in one piece. These helpers split the work into
+overlapping tiles of a fixed size and blend the overlaps, so peak
+activation memory depends on the tile size, not the output size:
+
+    tiled_denoise      each denoising step runs the UNet tile by tile and
+                       blends the noise predictions (MultiDiffusion-style),
+                       then steps the scheduler on the full latent
+    tiled_vae_decode   decodes latent tiles and blends the pixel tiles
+    tiled_vae_encode   encodes pixel tiles and blends the latent tiles
+                       (used by the upscale path)
+
+Overlaps are blended with linear ramps, which hides the seams. Tiles
+see only their own region, so very large outputs can repeat motifs
+across tiles. Use `SDTurboGenerator.generate_tiled()` and
+`SDTurboGenerator.upscale()` rather than calling these directly.
+"""
+
+import torch
+from PIL import Image
+
+# Tile size and overlap in latent pixels (x8 in image pixels): 512px tiles,
+# SD-Turbo's native resolution, overlapping by 128px
+LATENT_TILE = 64
+LATENT_OVERLAP = 16
+
+
+def tile_starts(length: int, tile: int, overlap: int) -> list[int]:
+    """Start offsets of overlapping tiles covering `length` (last tile flush with the end)."""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    if stride <= 0:
+        raise ValueError(f"Tile overlap {overlap} must be smaller than the tile size {tile}")
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tiles(height: int, width: int, tile: int, overlap: int):
+    """Yield (top, left, tile_height, tile_width) regions covering a height x width grid."""
+    for top in tile_starts(height, tile, overlap):
+        for left in tile_starts(width, tile, overlap):
+            yield top, left, min(tile, height), min(tile, width)
+
+
+def blend_mask(height: int, width: int, overlap: int, device=None) -> torch.Tensor:
+    """
+    (1, 1, height, width) weights that ramp up linearly over `overlap`
+    pixels from every edge. Accumulated tiles are divided by the summed
+    weights, so pixels covered by a single tile keep their value.
+    """
+    def ramp(n):
+        position = torch.arange(n, device=device, dtype=torch.float32)
+        distance = torch.minimum(position + 1, n - position)
+        return (distance / (overlap + 1)).clamp(max=1.0)
+
+    return (ramp(height)[:, None] * ramp(width)[None, :])[None, None]
+
+
+def _vae_scale(vae) -> int:
+    return 2 ** (len(vae.config.block_out_channels) - 1)
+
+
+def tiled_vae_decode(
+    vae,
+    latents: torch.Tensor,
+    tile: int = LATENT_TILE,
+    overlap: int = LATENT_OVERLAP,
+) -> torch.Tensor:
+    """
+    Decode scaled latents tile by tile.
+
+    Args:
+        vae: AutoencoderKL of the pipeline
+        latents: (B, C, h, w) latents, as produced by the denoising loop
+        tile: Tile size in latent pixels
+        overlap: Overlap between tiles in latent pixels
+
+    Returns:
+        (B, 3, h * scale, w * scale) float32 image tensor in [-1, 1]
+    """
+    scale = _vae_scale(vae)
+    batch, _, height, width = latents.shape
+    output = torch.zeros(batch, 3, height * scale, width * scale, device=latents.device)
+    weights = torch.zeros(1, 1, height * scale, width * scale, device=latents.device)
+
+    for top, left, tile_height, tile_width in tiles(height, width, tile, overlap):
+        z = latents[:, :, top:top + tile_height, left:left + tile_width]
+        decoded = vae.decode(z.to(vae.dtype) / vae.config.scaling_factor).sample.float()
+        mask = blend_mask(tile_height * scale, tile_width * scale, overlap * scale, latents.device)
+        region = (
+            slice(None), slice(None),
+            slice(top * scale, (top + tile_height) * scale),
+            slice(left * scale, (left + tile_width) * scale),
+        )
+        output[region] += decoded * mask
+        weights[region] += mask
+
+    return output.div_(weights)
+
+
+def to_pil(images: torch.Tensor) -> list[Image.Image]:
+    """
+    Convert a (B, 3, H, W) tensor in [-1, 1] to PIL images, in place: at
+    print sizes the float copies of the usual postprocessing would cost
+    more memory than the tiles themselves.
+    """
+    images.mul_(0.5).add_(0.5).clamp_(0, 1).mul_(255).round_()
+    pixels = images.to(torch.uint8).permute(0, 2, 3, 1).cpu().numpy()
+    return [Image.fromarray(image) for image in pixels]
+
+
+def tiled_vae_encode(
+    vae,
+    images: torch.Tensor,
+    tile: int = LATENT_TILE,
+    overlap: int = LATENT_OVERLAP,
+) -> torch.Tensor:
+    """
+    Encode images tile by tile (deterministic: the latent distribution mean).
+
+    Args:
+        vae: AutoencoderKL of the pipeline
+        images: (B, 3, H, W) image tensor in [-1, 1], H and W multiples of the VAE scale
+        tile: Tile size in latent pixels
+        overlap: Overlap between tiles in latent pixels
+
+    Returns:
+        (B, C, H / scale, W / scale) latents, scaled for the UNet
+    """
+    scale = _vae_scale(vae)
+    batch, _, height, width = images.shape
+    height, width = height // scale, width // scale
+    channels = vae.config.latent_channels
+    output = torch.zeros(batch, channels, height, width, device=images.device)
+    weights = torch.zeros(1, 1, height, width, device=images.device)
+
+    for top, left, tile_height, tile_width in tiles(height, width, tile, overlap):
+        pixels = images[
+            :, :,
+            top * scale:(top + tile_height) * scale,
+            left * scale:(left + tile_width) * scale,
+        ]
+        encoded = vae.encode(pixels.to(vae.dtype)).latent_dist.mode().float()
+        mask = blend_mask(tile_height, tile_width, overlap, images.device)
+        region = (slice(None), slice(None), slice(top, top + tile_height), slice(left, left + tile_width))
+        output[region] += encoded * mask
+        weights[region] += mask
+
+    return output.div_(weights).mul_(vae.config.scaling_factor)
+
+
+def tiled_denoise(
+    unet,
+    scheduler,
+    latents: torch.Tensor,
+    prompt_embeds: torch.Tensor,
+    timesteps,
+    guidance_scale: float = 0.0,
+    negative_prompt_embeds: torch.Tensor = None,
+    tile: int = LATENT_TILE,
+    overlap: int = LATENT_OVERLAP,
+    step_callback=None,
+) -> torch.Tensor:
+    """
+    Denoising loop that runs the UNet on overlapping latent tiles.
+
+    Args:
+        unet: UNet of the pipeline
+        scheduler: Scheduler with `set_timesteps()` already called
+        latents: (1, C, h, w) noisy latents (already scaled by the
+            scheduler's init_noise_sigma, or noised with add_noise)
+        prompt_embeds: (1, tokens, dim) text embeddings
+        timesteps: Timesteps to run
+        guidance_scale: Classifier-free guidance scale (> 1 enables CFG
+            and needs `negative_prompt_embeds`)
+        tile: Tile size in latent pixels
+        overlap: Overlap between tiles in latent pixels
+        step_callback: Optional fn(step, total_steps, latents) run after
+            each denoising step; raise from it to abort
+
+    Returns:
+        Denoised latents
+    """
+    do_cfg = guidance_scale > 1.0
+    embeds = prompt_embeds
+    if do_cfg:
+        embeds = torch.cat([negative_prompt_embeds, prompt_embeds])
+    embeds = embeds.to(unet.dtype)
+    _, _, height, width = latents.shape
+    regions = list(tiles(height, width, tile, overlap))
+
+    for step, t in enumerate(timesteps, 1):
+        model_input = scheduler.scale_model_input(latents, t)
+        noise_pred = torch.zeros_like(latents, dtype=torch.float32)
+        weights = torch.zeros(1, 1, height, width, device=latents.device)
+
+        for top, left, tile_height, tile_width in regions:
+            region = (slice(None), slice(None), slice(top, top + tile_height), slice(left, left + tile_width))
+            tile_input = model_input[region].to(unet.dtype)
+            if do_cfg:
+                tile_input = torch.cat([tile_input] * 2)
+            pred = unet(tile_input, t, encoder_hidden_states=embeds).sample.float()
+            if do_cfg:
+                uncond, cond = pred.chunk(2)
+                pred = uncond + guidance_scale * (cond - uncond)
+            mask = blend_mask(tile_height, tile_width, overlap, latents.device)
+            noise_pred[region] += pred * mask
+            weights[region] += mask
+
+        latents = scheduler.step(noise_pred / weights, t, latents).prev_sample
+        if step_callback is not None:
+            step_callback(step, len(timesteps), latents)
+
+    return latents
@@ -0,0 +1,121 @@
+"""
+Tiny Random-Weight Pipeline
+---------------------------
+Builds a Stable Diffusion pipeline with SD-Turbo's architecture - CLIP
+text encoder, cross-attention UNet, 8x AutoencoderKL, Euler scheduler
+with trailing timesteps - but tiny random weights and a byte-level
+tokenizer, so it can be created and run fully offline in seconds.
+
+It produces noise, not pictures: use it to benchmark and test code
+paths, not image quality.
+
+Usage:
+    python tiny_pipeline.py /tmp/tiny-sd
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Default location used by the benchmark suite
+TINY_PIPELINE_DIR = Path("bench_cache") / "tiny-sd"
+
+
+def _byte_vocab() -> dict[str, int]:
+    """CLIP-style vocab covering every byte (no merges needed)."""
+    printable = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    chars, extra = printable[:], 0
+    for byte in range(256):
+        if byte not in printable:
+            chars.append(256 + extra)
+            extra += 1
+    symbols = [chr(c) for c in chars]
+
+    vocab = {}
+    for symbol in symbols + [s + "</w>" for s in symbols]:
+        vocab[symbol] = len(vocab)
+    vocab["<|startoftext|>"] = len(vocab)
+    vocab["<|endoftext|>"] = len(vocab)
+    return vocab
+
+
+def build_tiny_pipeline(path=TINY_PIPELINE_DIR, seed: int = 0) -> Path:
+    """
+    Create the tiny pipeline in `path` (skipped if it already exists).
+
+    Returns:
+        The pipeline directory, usable as `SDTurboGenerator(model_id=...)`
+    """
+    path = Path(path)
+    if (path / "model_index.json").exists():
+        return path
+
+    import torch
+    from diffusers import (
+        AutoencoderKL, EulerDiscreteScheduler, StableDiffusionPipeline, UNet2DConditionModel,
+    )
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    torch.manual_seed(seed)
+    tokenizer_dir = path / "tokenizer_files"
+    tokenizer_dir.mkdir(parents=True, exist_ok=True)
+    vocab = _byte_vocab()
+    (tokenizer_dir / "vocab.json").write_text(json.dumps(vocab))
+    (tokenizer_dir / "merges.txt").write_text("#version: 0.2\n")
+
+    tokenizer = CLIPTokenizer(
+        str(tokenizer_dir / "vocab.json"), str(tokenizer_dir / "merges.txt"), model_max_length=77
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        bos_token_id=vocab["<|startoftext|>"],
+        eos_token_id=vocab["<|endoftext|>"],
+        pad_token_id=vocab["<|endoftext|>"],
+        hidden_size=32,
+        intermediate_size=37,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        vocab_size=len(vocab),
+        max_position_embeddings=77,
+    ))
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=1,
+        sample_size=64,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32,
+        attention_head_dim=8,
+    )
+    # Four blocks: the same 8x latent downscale as the real VAE
+    vae = AutoencoderKL(
+        block_out_channels=[16, 16, 32, 32],
+        in_channels=3,
+        out_channels=3,
+        down_block_types=["DownEncoderBlock2D"] * 4,
+        up_block_types=["UpDecoderBlock2D"] * 4,
+        latent_channels=4,
+        norm_num_groups=8,
+    )
+    pipe = StableDiffusionPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        unet=unet,
+        scheduler=EulerDiscreteScheduler(timestep_spacing="trailing"),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipe.save_pretrained(path)
+    print(f"Built tiny pipeline in {path}")
+    return path
+
+
+if __name__ == "__main__":
+    build_tiny_pipeline(sys.argv[1] if len(sys.argv) > 1 else TINY_PIPELINE_DIR)
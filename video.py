@@ -0,0 +1,392 @@
+"""
+Video Generation
+----------------
+Short clips from SD-Turbo: the clip passes through a list of keyframes
+(prompt + seed), and each frame's initial noise and text embeddings are
+interpolated between its two neighbouring keyframes - noise with slerp
+(so every frame starts from valid Gaussian noise), embeddings linearly.
+Nearby frames start from nearby noise, which gives smooth morphs rather
+than a flicker of unrelated images.
+
+Text embeddings are computed once per keyframe, frames are generated in
+batches, and decoded frames are handed to a writer thread that encodes
+them while the next batch runs. Writers encode frame by frame, so memory
+is bounded by the batch size (plus a few queued frames), not the clip
+length:
+
+    GifWriter            animated GIF, one palette per frame
+    WebPWriter           animated WebP
+    FrameSequenceWriter  numbered image files in a directory
+
+    python video.py "anime girl, cherry blossoms" "anime girl, snowfall" --frames 48 -o clip.webp
+"""
+
+import argparse
+import io
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import GifImagePlugin, Image
+
+from generate_image import slerp
+
+# Output formats by file suffix (anything else is a frame-sequence directory)
+VIDEO_FORMATS = {'.gif': 'gif', '.webp': 'webp'}
+
+
+@dataclass
+class Keyframe:
+    """A point the clip passes through."""
+    prompt: str
+    seed: int
+
+
+def interpolation_plan(num_keyframes: int, num_frames: int, closed: bool = False) -> list[tuple[int, float]]:
+    """
+    (keyframe index, weight towards the next keyframe) for every frame.
+    Frames are spread evenly; the first and last frames are the first and
+    last keyframes. With `closed`, the last keyframe is a copy of the first
+    and is left out, so the clip loops without a repeated frame.
+    """
+    if num_keyframes == 1 or num_frames == 1:
+        return [(0, 0.0)] * num_frames
+    plan = []
+    for frame in range(num_frames):
+        position = frame * (num_keyframes - 1) / (num_frames if closed else num_frames - 1)
+        index = min(int(position), num_keyframes - 2)
+        plan.append((index, position - index))
+    return plan
+
+
+class GifWriter:
+    """
+    Animated GIF written frame by frame (Pillow's `save_all` would hold
+    every frame until the end). Each frame gets its own 256-colour palette
+    (fast octree quantization, which keeps up with generation).
+    """
+
+    def __init__(self, path, fps: float = 8.0, loop: int = 0):
+        self.path = Path(path)
+        self.duration = round(1000 / fps)
+        self.loop = loop
+        self.frames = 0
+        self._file = None
+
+    def write(self, image: Image.Image):
+        frame = image.convert("RGB").quantize(256, method=Image.Quantize.FASTOCTREE)
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "wb")
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop})
+            self._file.writelines(header)
+        self._file.writelines(
+            GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True)
+        )
+        self.frames += 1
+
+    def close(self) -> Path:
+        if self._file is not None:
+            self._file.write(b";")  # GIF trailer
+            self._file.close()
+        return self.path
+
+
+class WebPWriter:
+    """
+    Animated WebP written frame by frame (Pillow's `save_all` would hold
+    every frame until the end). Each frame is encoded with Pillow's
+    single-image WebP encoder and appended to the file as an animation
+    frame (ANMF chunk); the RIFF size in the header is filled in at close.
+    """
+
+    def __init__(self, path, fps: float = 8.0, quality: int = 80, lossless: bool = False, loop: int = 0):
+        self.path = Path(path)
+        self.duration = round(1000 / fps)
+        self.quality = quality
+        self.lossless = lossless
+        self.loop = loop
+        self.frames = 0
+        self._file = None
+        self._size = None
+
+    def write(self, image: Image.Image):
+        frame = image.convert("RGB")
+        if self._file is None:
+            self._start(frame.size)
+        elif frame.size != self._size:
+            raise ValueError(f"Frame size {frame.size} differs from the clip's {self._size}")
+
+        buffer = io.BytesIO()
+        frame.save(buffer, format="WEBP", quality=self.quality, lossless=self.lossless)
+        # Keep the bitstream chunks (VP8/VP8L, plus ALPH if any), drop the file header
+        bitstream = b"".join(
+            _riff_chunk(tag, data) for tag, data in _riff_chunks(buffer.getvalue())
+            if tag in (b"ALPH", b"VP8 ", b"VP8L")
+        )
+        width, height = self._size
+        header = (
+            _uint24(0) + _uint24(0) + _uint24(width - 1) + _uint24(height - 1)
+            + _uint24(self.duration) + bytes([0b10])  # no blending, no disposal
+        )
+        self._file.write(_riff_chunk(b"ANMF", header + bitstream))
+        self.frames += 1
+
+    def _start(self, size):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._size = size
+        width, height = size
+        self._file.write(b"RIFF" + bytes(4) + b"WEBP")
+        self._file.write(_riff_chunk(b"VP8X", bytes([0b10, 0, 0, 0]) + _uint24(width - 1) + _uint24(height - 1)))
+        self._file.write(_riff_chunk(b"ANIM", struct.pack("<IH", 0, self.loop)))
+
+    def close(self) -> Path:
+        if self._file is not None:
+            size = self._file.tell() - 8
+            self._file.seek(4)
+            self._file.write(struct.pack("<I", size))
+            self._file.close()
+        return self.path
+
+
+def _uint24(value: int) -> bytes:
+    return value.to_bytes(3, "little")
+
+
+def _riff_chunk(tag: bytes, data: bytes) -> bytes:
+    """A RIFF chunk: tag, little-endian size, data, padded to an even length."""
+    return tag + struct.pack("<I", len(data)) + data + bytes(len(data) & 1)
+
+
+def _riff_chunks(data: bytes):
+    """(tag, data) for each chunk of a RIFF file."""
+    offset = 12
+    while offset + 8 <= len(data):
+        tag = data[offset:offset + 4]
+        size = struct.unpack_from("<I", data, offset + 4)[0]
+        yield tag, data[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+
+
+class FrameSequenceWriter:
+    """Numbered image files (frame_00000.png, ...) in a directory."""
+
+    def __init__(self, directory, extension: str = "png"):
+        self.directory = Path(directory)
+        self.extension = extension
+        self.frames = 0
+
+    def write(self, image: Image.Image):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        image.save(self.directory / f"frame_{self.frames:05d}.{self.extension}")
+        self.frames += 1
+
+    def close(self) -> Path:
+        return self.directory
+
+
+def create_writer(output, fps: float = 8.0):
+    """Writer for an output path: .gif, .webp, or a directory of PNG frames."""
+    output = Path(output)
+    kind = VIDEO_FORMATS.get(output.suffix.lower())
+    if kind == 'gif':
+        return GifWriter(output, fps)
+    if kind == 'webp':
+        return WebPWriter(output, fps)
+    return FrameSequenceWriter(output)
+
+
+class ThreadedWriter:
+    """
+    Runs a writer on its own thread. `write()` blocks once `max_pending`
+    frames are waiting, so a slow encoder holds generation back instead
+    of letting frames pile up in memory.
+    """
+
+    def __init__(self, writer, max_pending: int = 8):
+        self.writer = writer
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="video-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            image = self._queue.get()
+            if image is None:
+                return
+            if self.error is None:
+                try:
+                    self.writer.write(image)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, image: Image.Image):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(image)
+
+    def close(self) -> Path:
+        """Wait for queued frames, finish the file and return its path."""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.writer.close()
+
+
+class VideoGenerator:
+    """
+    Keyframe-interpolated clips on top of an SDTurboGenerator (same
+    pipeline, no extra weights).
+    """
+
+    def __init__(self, generator, batch_size: int = 4):
+        """
+        Args:
+            generator: A loaded SDTurboGenerator
+            batch_size: Frames per pipeline call (also bounds memory)
+        """
+        self.generator = generator
+        self.batch_size = batch_size
+
+    def frames(
+        self,
+        keyframes: list[Keyframe],
+        num_frames: int = 24,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        loop: bool = False,
+    ):
+        """
+        Generate the clip's frames in batches.
+
+        Args:
+            keyframes: Keyframes the clip passes through, in order
+            num_frames: Total number of frames
+            num_inference_steps: Denoising steps per frame
+            guidance_scale: Classifier-free guidance (0.0 for SD-Turbo)
+            width: Frame width
+            height: Frame height
+            loop: Head back towards the first keyframe at the end, for
+                seamless looping
+
+        Yields:
+            PIL Images in order, one batch at a time
+        """
+        import torch
+
+        if not keyframes:
+            raise ValueError("At least one keyframe is needed")
+        loop = loop and len(keyframes) > 1
+        if loop:
+            keyframes = list(keyframes) + [keyframes[0]]
+
+        # Once per keyframe: text embeddings and initial noise
+        embeds = self.generator.encode_prompts([k.prompt for k in keyframes])
+        noise = self.generator.initial_noise([k.seed for k in keyframes], width, height)
+        last = len(keyframes) - 1
+
+        plan = interpolation_plan(len(keyframes), num_frames, closed=loop)
+        for offset in range(0, num_frames, self.batch_size):
+            batch = plan[offset:offset + self.batch_size]
+            start = torch.tensor([index for index, _ in batch])
+            end = (start + 1).clamp(max=last)
+            t = torch.tensor([weight for _, weight in batch])
+
+            latents = slerp(noise[start], noise[end], t)
+            weight = t.to(embeds.dtype).reshape(-1, 1, 1)
+            prompt_embeds = torch.lerp(embeds[start], embeds[end], weight)
+
+            yield from self.generator.generate_from_latents(
+                latents,
+                prompt_embeds,
+                num_inference_steps=num_inference_steps,
+                guidance_scale=guidance_scale,
+            )
+
+    def generate(
+        self,
+        keyframes: list[Keyframe],
+        output,
+        num_frames: int = 24,
+        fps: float = 8.0,
+        **kwargs,
+    ) -> Path:
+        """
+        Generate a clip and write it to `output` (.gif, .webp, or a
+        directory for numbered PNG frames).
+
+        Args:
+            keyframes: Keyframes the clip passes through, in order
+            output: Output path
+            num_frames: Total number of frames
+            fps: Playback frame rate
+            **kwargs: num_inference_steps, guidance_scale, width, height,
+                loop (see `frames()`)
+
+        Returns:
+            Path of the written clip
+        """
+        writer = ThreadedWriter(create_writer(output, fps))
+        start_time = time.time()
+        try:
+            for frame in self.frames(keyframes, num_frames, **kwargs):
+                writer.write(frame)
+        except BaseException:
+            # Stop the writer thread, but report the error that got us here
+            try:
+                writer.close()
+            except Exception:
+                pass
+            raise
+        path = writer.close()
+
+        elapsed = time.time() - start_time
+        print(f"Generated {num_frames} frames in {elapsed:.2f}s "
+              f"({num_frames / elapsed:.1f} fps) -> {path}")
+        return path
+
+
+def main():
+    """Command line: one keyframe per prompt, seeds counting up from --seed."""
+    parser = argparse.ArgumentParser(description="Keyframe-interpolated SD-Turbo clips")
+    parser.add_argument("prompts", nargs="+", help="One prompt per keyframe")
+    parser.add_argument("-o", "--output", default="outputs/clip.webp",
+                        help=".gif, .webp, or a directory for PNG frames")
+    parser.add_argument("--frames", type=int, default=24)
+    parser.add_argument("--fps", type=float, default=8.0)
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the first keyframe (+1 per keyframe)")
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--loop", action="store_true", help="Return to the first keyframe")
+    parser.add_argument("--model-id", default="stabilityai/sd-turbo")
+    parser.add_argument("--device", default="cuda")
+    args = parser.parse_args()
+
+    from generate_image import SDTurboGenerator
+
+    generator = SDTurboGenerator(model_id=args.model_id, device=args.device)
+    keyframes = [Keyframe(prompt, args.seed + i) for i, prompt in enumerate(args.prompts)]
+    VideoGenerator(generator, batch_size=args.batch_size).generate(
+        keyframes,
+        args.output,
+        num_frames=args.frames,
+        fps=args.fps,
+        loop=args.loop,
+        num_inference_steps=args.steps,
+        width=args.width,
+        height=args.height,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Multi-Process Inference Worker Pool
+-----------------------------------
+Runs N worker processes, each owning its own SDTurboGenerator with a
+private torch thread budget pinned to a disjoint set of CPU cores.
+
+torch intra-op parallelism stops scaling well past a handful of cores
+per process, so on large CPU hosts several smaller processes give more
+aggregate images per second than one process using every core. The
+parent hands each task to the next idle worker, so a busy worker never
+holds up the others.
+
+Each worker talks to the parent over its own pipe, so a worker that dies
+(crash, OOM kill) cannot wedge the others. Its running task fails with
+WorkerError and it is restarted, up to `max_restarts` times; queued
+tasks wait for the replacement. Once no worker is left, pending tasks
+fail and new submissions are refused. InsufficientMemory and MemoryBusy
+raised in a worker are re-raised as themselves so callers can act on
+them.
+
+`WorkerPool` exposes the same `generate()` / `generate_batch()` /
+`cached_result()` interface as `SDTurboGenerator`, so it can be dropped
+into the micro-batcher, the job API or the dataset runner. Per-step
+callbacks do not cross process boundaries: progress previews and
+mid-generation cancellation are not available in pool mode.
+"""
+
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from memory import InsufficientMemory, MemoryBusy
+from result_cache import ResultCache
+
+# How often (seconds) the result collector checks whether the pool closed
+HEALTH_CHECK_INTERVAL = 0.5
+
+# Worker exceptions sent back as themselves (picklable, and callers act on
+# their type); any other exception becomes a WorkerError with its message
+PASSTHROUGH_ERRORS = (InsufficientMemory, MemoryBusy)
+
+
+class WorkerError(Exception):
+    """An exception raised inside a worker process (message preserved)."""
+
+
+def core_sets(num_workers: int, cores: list[int] = None) -> list[list[int]]:
+    """
+    Split the available CPU cores into contiguous, disjoint sets.
+
+    Contiguous core ids usually share a socket / L3 cache, so each worker
+    stays local to one socket where possible.
+    """
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cores) // num_workers)
+    return [
+        cores[i * per_worker:(i + 1) * per_worker] or cores[-1:]
+        for i in range(num_workers)
+    ]
+
+
+def _worker_main(worker_id, cores, generator_kwargs, cache_config, conn):
+    """Worker process entry point: load a pipeline and serve tasks until None."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    from generate_image import SDTurboGenerator
+
+    threads = len(cores) if cores else 1
+    torch.set_num_threads(threads)
+
+    result_cache = ResultCache(**cache_config) if cache_config else None
+    try:
+        generator = SDTurboGenerator(result_cache=result_cache, **generator_kwargs)
+    except Exception as e:
+        conn.send(('failed', worker_id, f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', worker_id, {
+        'dtype_bytes': generator.dtype_bytes,
+        'cache_namespace': generator.cache_namespace,
+        'threads': threads,
+    }))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break  # the parent has gone
+        if task is None:
+            break
+        task_id, method, kwargs = task
+        try:
+            output = getattr(generator, method)(**kwargs)
+            conn.send(('result', task_id, output))
+        except PASSTHROUGH_ERRORS as e:
+            conn.send(('raise', task_id, e))
+        except Exception as e:
+            # Exceptions are not always picklable - send the message instead
+            conn.send(('error', task_id, f"{type(e).__name__}: {e}"))
+
+
+class WorkerPool:
+    """
+    Pool of inference processes fed from one parent-side task queue.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 2,
+        cores: list[int] = None,
+        result_cache: ResultCache = None,
+        max_restarts: int = 3,
+        **generator_kwargs,
+    ):
+        """
+        Start the workers and wait until every pipeline is loaded.
+
+        Args:
+            num_workers: Number of worker processes
+            cores: CPU core ids to divide between workers (default: all
+                cores this process may run on)
+            result_cache: Optional ResultCache; workers open the same
+                directory (it is multi-process safe)
+            max_restarts: Workers restarted after dying, over the pool's
+                lifetime; further deaths leave the worker down
+            **generator_kwargs: Passed to each worker's SDTurboGenerator
+                (e.g. model_id, device)
+        """
+        self.num_workers = num_workers
+        self.model_id = generator_kwargs.get("model_id", "stabilityai/sd-turbo")
+        self.result_cache = result_cache
+        self.core_sets = core_sets(num_workers, cores)
+        self.max_restarts = max_restarts
+        self.restarts = 0
+
+        self._generator_kwargs = generator_kwargs
+        self._cache_config = None
+        if result_cache is not None:
+            self._cache_config = {
+                'cache_dir': str(result_cache.cache_dir),
+                'max_bytes': result_cache.max_bytes,
+            }
+
+        # spawn: never fork a process that may already hold torch threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes = {}  # worker id -> Process
+        self._conns = {}  # worker id -> parent end of its pipe
+        self._futures: dict[int, Future] = {}
+        self._pending = deque()  # (task_id, method, kwargs) waiting for an idle worker
+        self._running = {}  # worker id -> id of the task it is running
+        self._idle = set()  # worker ids ready for a task
+        self._failed = set()  # worker ids whose pipeline failed to load
+        self._down = set()  # worker ids that died and were not restarted
+        self._broken = None  # reason new tasks are refused
+        self._closed = False
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._collector = None
+
+        print(f"Starting {num_workers} inference workers...")
+        for worker_id in range(num_workers):
+            self._start_worker(worker_id)
+
+        self.worker_info = {}
+        while len(self.worker_info) < num_workers:
+            messages, dead = self._poll(None)
+            for worker_id, (kind, _, info) in messages:
+                if kind == 'failed':
+                    self.close()
+                    raise WorkerError(f"Worker {worker_id} failed to start: {info}")
+                self.worker_info[worker_id] = info
+                self._idle.add(worker_id)
+            for worker_id in dead - set(self.worker_info):
+                self.close()
+                raise WorkerError(
+                    f"Worker {worker_id} exited while loading "
+                    f"(exit code {self._processes[worker_id].exitcode})"
+                )
+        for worker_id in sorted(self.worker_info):
+            cores_for_worker = self.core_sets[worker_id]
+            print(f"  worker {worker_id}: cores {cores_for_worker[0]}-{cores_for_worker[-1]}, "
+                  f"{self.worker_info[worker_id]['threads']} threads")
+
+        self._collector = threading.Thread(
+            target=self._collect, name="worker-pool-results", daemon=True
+        )
+        self._collector.start()
+
+    @property
+    def dtype_bytes(self) -> int:
+        """Bytes per element of the workers' pipeline dtype."""
+        return self.worker_info[0]['dtype_bytes']
+
+    @property
+    def cache_namespace(self) -> str:
+        """Result-cache namespace of the workers' pipeline."""
+        return self.worker_info[0]['cache_namespace']
+
+    def submit(self, method: str, **kwargs) -> Future:
+        """
+        Queue a generator method call for the next idle worker.
+
+        Raises:
+            WorkerError: If the pool is closed or every worker is down
+        """
+        future = Future()
+        with self._lock:
+            if self._broken:
+                raise WorkerError(self._broken)
+            task_id = next(self._ids)
+            self._futures[task_id] = future
+            self._pending.append((task_id, method, kwargs))
+            failed = self._dispatch()
+        self._fail(failed)
+        return future
+
+    def submit_batch(self, prompts: list[str], **kwargs) -> Future:
+        """Queue a `generate_batch` call; resolves to a list of images."""
+        kwargs.pop("step_callback", None)
+        return self.submit("generate_batch", prompts=prompts, **kwargs)
+
+    def generate_batch(self, prompts: list[str], **kwargs):
+        """Blocking `generate_batch` on one worker (step callbacks are ignored)."""
+        return self.submit_batch(prompts, **kwargs).result()
+
+    def generate(self, prompt: str, **kwargs):
+        """Blocking `generate` on one worker (step callbacks are ignored)."""
+        kwargs.pop("step_callback", None)
+        return self.submit("generate", prompt=prompt, **kwargs).result()
+
+    def img2img(self, image, prompt: str, **kwargs):
+        """Blocking `img2img` on one worker (step callbacks are ignored)."""
+        kwargs.pop("step_callback", None)
+        return self.submit("img2img", image=image, prompt=prompt, **kwargs).result()
+
+    def variations(self, prompt: str, **kwargs):
+        """Blocking `variations` on one worker (step callbacks are ignored)."""
+        kwargs.pop("step_callback", None)
+        return self.submit("variations", prompt=prompt, **kwargs).result()
+
+    def warmup(self, **kwargs) -> float:
+        """Warm up the workers (one task each); returns the slowest in ms."""
+        futures = [self.submit("warmup", **kwargs) for _ in range(self.num_workers)]
+        return max(future.result() for future in futures)
+
+    def cached_result(
+        self,
+        prompt: str,
+        num_inference_steps: int = 1,
+        guidance_scale: float = 0.0,
+        width: int = 512,
+        height: int = 512,
+        seed: int = None,
+    ):
+        """Look up a seeded result in the shared cache without a round trip."""
+        if self.result_cache is None or seed is None:
+            return None
+        key = self.result_cache.make_key(
+            self.cache_namespace, prompt, num_inference_steps, guidance_scale,
+            width, height, seed,
+        )
+        return self.result_cache.get(key)
+
+    def alive_workers(self) -> int:
+        """Number of worker processes currently running."""
+        with self._lock:
+            return sum(process.is_alive() for process in self._processes.values())
+
+    def close(self, timeout: float = 10.0):
+        """Stop all workers; tasks that have not finished fail with WorkerError."""
+        with self._lock:
+            self._closed = True
+            self._broken = "Worker pool is closed"
+            unfinished = list(self._futures.values())
+            self._futures.clear()
+            self._pending.clear()
+        for conn in self._conns.values():
+            try:
+                conn.send(None)
+            except OSError:
+                pass  # already gone
+        for process in self._processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None and self._collector is not threading.current_thread():
+            self._collector.join(timeout)
+        for conn in self._conns.values():
+            conn.close()
+        self._fail([(future, "Worker pool is closed") for future in unfinished])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_worker(self, worker_id: int):
+        """Start (or replace) one worker process with its own pipe."""
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.core_sets[worker_id], self._generator_kwargs,
+                  self._cache_config, child_conn),
+            name=f"sdturbo-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        # Only the worker holds its end, so its death reads as end-of-file
+        child_conn.close()
+        if worker_id in self._conns:
+            self._conns[worker_id].close()
+        self._conns[worker_id] = conn
+        self._processes[worker_id] = process
+
+    def _dispatch(self) -> list:
+        """
+        Hand pending tasks to idle workers (lock held).
+
+        Returns:
+            (future, message) pairs for tasks that could not be sent
+        """
+        failed = []
+        while self._pending and self._idle:
+            worker_id = self._idle.pop()
+            task_id, method, kwargs = task = self._pending.popleft()
+            self._running[worker_id] = task_id
+            try:
+                self._conns[worker_id].send(task)
+            except OSError:
+                pass  # the worker died; the collector fails its task
+            except Exception as e:
+                # Arguments that cannot be pickled fail the task, not the worker
+                del self._running[worker_id]
+                self._idle.add(worker_id)
+                failed.append((self._futures.pop(task_id, None), f"{type(e).__name__}: {e}"))
+        return failed
+
+    def _fail(self, failed: list):
+        """Fail futures with WorkerError (outside the lock: callbacks may submit)."""
+        for future, message in failed:
+            if future is not None:
+                future.set_exception(WorkerError(message))
+
+    def _poll(self, timeout):
+        """
+        Wait for worker messages or exits.
+
+        Returns:
+            ([(worker_id, message), ...], {ids of workers that exited})
+        """
+        with self._lock:
+            live = [worker_id for worker_id in self._conns if worker_id not in self._down]
+            conns = {self._conns[worker_id]: worker_id for worker_id in live}
+            sentinels = {self._processes[worker_id].sentinel: worker_id for worker_id in live}
+        ready = multiprocessing.connection.wait(list(conns) + list(sentinels), timeout)
+
+        messages, dead = [], set()
+        for handle in ready:
+            if handle in sentinels:
+                dead.add(sentinels[handle])
+        for conn, worker_id in conns.items():
+            # Messages a worker sent before exiting still count
+            if conn in ready or worker_id in dead:
+                try:
+                    while conn.poll():
+                        messages.append((worker_id, conn.recv()))
+                except (EOFError, OSError):
+                    dead.add(worker_id)
+        return messages, dead
+
+    def _collect(self):
+        """Resolve futures as results come back, and replace dead workers."""
+        while not self._closed:
+            try:
+                messages, dead = self._poll(HEALTH_CHECK_INTERVAL)
+            except (OSError, ValueError):
+                return  # closed while waiting
+            for worker_id, message in messages:
+                self._handle(worker_id, *message)
+            if dead:
+                self._workers_exited(dead)
+
+    def _handle(self, worker_id: int, kind: str, task_id: int, payload):
+        """Apply one message from a worker."""
+        if kind in ('ready', 'failed'):
+            # A restarted worker finished loading its pipeline (or could not)
+            with self._lock:
+                if kind == 'ready':
+                    self.worker_info[worker_id] = payload
+                    self._idle.add(worker_id)
+                    failed = self._dispatch()
+                else:
+                    self._failed.add(worker_id)
+                    failed = []
+            self._fail(failed)
+            print(f"  worker {worker_id}: "
+                  + ("restarted" if kind == 'ready' else f"failed to restart: {payload}"))
+            return
+
+        with self._lock:
+            future = self._futures.pop(task_id, None)
+            self._running.pop(worker_id, None)
+            self._idle.add(worker_id)
+            failed = self._dispatch()
+        self._fail(failed)
+        if future is None:
+            return
+        if kind == 'result':
+            future.set_result(payload)
+        elif kind == 'raise':
+            future.set_exception(payload)
+        else:
+            future.set_exception(WorkerError(payload))
+
+    def _workers_exited(self, dead: set):
+        """Fail the tasks of dead workers, then restart them or mark them down."""
+        for worker_id in dead:
+            self._processes[worker_id].join(HEALTH_CHECK_INTERVAL)
+
+        lost = []
+        with self._lock:
+            if self._closed:
+                return
+            for worker_id in sorted(dead):
+                error = f"Worker {worker_id} exited with code {self._processes[worker_id].exitcode}"
+                print(f"  {error}")
+                self._idle.discard(worker_id)
+                task_id = self._running.pop(worker_id, None)
+                if task_id is not None:
+                    lost.append((self._futures.pop(task_id, None), error))
+
+                if worker_id not in self._failed and self.restarts < self.max_restarts:
+                    self.restarts += 1
+                    self._start_worker(worker_id)
+                else:
+                    self._down.add(worker_id)
+
+            if len(self._down) == self.num_workers:
+                # Nothing will ever run the queued tasks
+                self._broken = "Every inference worker has exited"
+                lost += [(self._futures.pop(task_id, None), self._broken)
+                         for task_id, _, _ in self._pending]
+                self._pending.clear()
+        self._fail(lost)
+
+
+def create_generator(num_workers: int = 1, **kwargs):
+    """
+    Build the inference backend: a single in-process SDTurboGenerator, or a
+    WorkerPool when `num_workers` > 1. Both expose the same interface.
+    """
+    if num_workers > 1:
+        return WorkerPool(num_workers=num_workers, **kwargs)
+
+    from generate_image import SDTurboGenerator
+    return SDTurboGenerator(**kwargs)